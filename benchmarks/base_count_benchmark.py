@@ -0,0 +1,74 @@
+"""
+Compares the regex based BaseCount with the current BaseCount and BaseCount.batch
+
+usage: python benchmarks/base_count_benchmark.py [--scaffold-length 50000000] [--genes 20000] [--gene-length 2000]
+"""
+import argparse
+import random
+import re
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from galEupy import general_utility  # noqa: E402
+from galEupy.general_utility import BaseCount  # noqa: E402
+
+
+class RegexBaseCount:
+    """ BaseCount before the single pass counting """
+    def __init__(self, sequence):
+        self.sequence = sequence
+        self.A_count = len(re.findall("(?i)a", self.sequence))
+        self.T_count = len(re.findall("(?i)t", self.sequence))
+        self.G_count = len(re.findall("(?i)g", self.sequence))
+        self.C_count = len(re.findall("(?i)c", self.sequence))
+
+    def other_count(self):
+        return len(self.sequence) - self.A_count - self.T_count - self.G_count - self.C_count
+
+    def print_base_count(self):
+        other_count = self.other_count()
+        return '{}\t{}\t{}\t{}\t{}'.format(self.A_count, self.T_count, self.G_count, self.C_count, other_count)
+
+
+def random_sequence(rng, length):
+    return ''.join(rng.choices('ACGTacgtN', weights=[24, 24, 24, 24, 1, 1, 1, 1, 1], k=length))
+
+
+def timed(label, function, base_count):
+    start = time.perf_counter()
+    result = function()
+    elapsed = time.perf_counter() - start
+    print(f"{label:>24}: {elapsed:8.3f} s  {base_count / elapsed / 1e6:10.1f} Mbases/sec")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scaffold-length', type=int, default=50000000, help='length of the scaffold sequence')
+    parser.add_argument('--genes', type=int, default=20000, help='number of gene sequences')
+    parser.add_argument('--gene-length', type=int, default=2000, help='length of each gene sequence')
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    scaffold = random_sequence(rng, args.scaffold_length)
+    genes = [random_sequence(rng, args.gene_length) for _ in range(args.genes)]
+    gene_bases = args.genes * args.gene_length
+    print(f"NumPy: {'available' if general_utility.numpy is not None else 'not installed'}")
+
+    print(f"scaffold ({args.scaffold_length:,} bases)")
+    old = timed('regex BaseCount', lambda: RegexBaseCount(scaffold).print_base_count(), args.scaffold_length)
+    new = timed('BaseCount', lambda: BaseCount(scaffold).print_base_count(), args.scaffold_length)
+    assert old == new
+
+    print(f"genes ({args.genes:,} x {args.gene_length:,} bases)")
+    old = timed('regex BaseCount', lambda: [RegexBaseCount(gene).print_base_count() for gene in genes], gene_bases)
+    new = timed('BaseCount', lambda: [BaseCount(gene).print_base_count() for gene in genes], gene_bases)
+    batch = timed('BaseCount.batch', lambda: [base.print_base_count() for base in BaseCount.batch(genes)],
+                  gene_bases)
+    assert old == new == batch
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Compares writing upload rows with str.format to a text file handle, as the table files were written
+before BulkRowWriter, with BulkRowWriter, and reports rows/sec and bytes of both
+
+usage: python benchmarks/bulk_writer_benchmark.py [--rows 500000] [--quoted 0.0] [--check]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from galEupy.bulk_writer import BulkRowWriter, escaped_line  # noqa: E402
+
+
+def synthetic_rows(row_count, quoted_fraction, seed=1):
+    """ NaFeatureImp like rows, quoted_fraction of them have a product with quotes and a tab """
+    rng = random.Random(seed)
+    rows = []
+    for idx in range(row_count):
+        description = f'hypothetical protein family {idx % 37}'
+        if rng.random() < quoted_fraction:
+            description = f'kinase, "putative"\tfamily {idx % 37}'
+        rows.append((idx, idx // 3, 5, 1, 'mRNA', f'XM_{idx:08d}.1', description, None, 0, '2026-10-18'))
+    return rows
+
+
+def text_handle_writer(file_path, rows):
+    row_format = '\t'.join(['{}'] * len(rows[0])) + '\n'
+    with open(file_path, 'w') as fh:
+        for fields in rows:
+            fh.write(row_format.format(*fields))
+
+
+def bulk_row_writer(file_path, rows):
+    with BulkRowWriter(file_path) as writer:
+        for fields in rows:
+            writer.write_row(fields)
+
+
+def time_writer(label, writer_function, file_path, rows):
+    start = time.perf_counter()
+    writer_function(file_path, rows)
+    elapsed = time.perf_counter() - start
+    size = os.path.getsize(file_path)
+    print(f"{label:>18}: {elapsed:8.2f} s  {len(rows) / elapsed:12,.0f} rows/sec  {size / 2 ** 20:8.1f} MiB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=500000, help='number of rows')
+    parser.add_argument('--quoted', type=float, default=0.0, help='fraction of rows with quotes and tabs')
+    parser.add_argument('--check', action='store_true', help='compare the written file with escaped rows')
+    args = parser.parse_args()
+
+    rows = synthetic_rows(args.rows, args.quoted)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        text_file = Path(tmp_dir) / 'text_handle.tsv'
+        bulk_file = Path(tmp_dir) / 'bulk_writer.tsv'
+        time_writer('text handle', text_handle_writer, text_file, rows)
+        time_writer('BulkRowWriter', bulk_row_writer, bulk_file, rows)
+        if args.check:
+            expected = ''.join(escaped_line(fields) for fields in rows).encode()
+            assert bulk_file.read_bytes() == expected, 'written rows differ'
+            print("written rows match")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Compares the memory held by the nested feature dictionary of StreamGFF3 and by FeatureStore, and the peak
+memory of building each
+
+usage: python benchmarks/feature_store_memory.py [--lines 1000000] [--gff file.gff3]
+"""
+import argparse
+import gc
+import os
+import sys
+import tempfile
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from galEupy.BioFile.gff_parser import StreamGFF3  # noqa: E402
+from galEupy.BioFile.feature_store import FeatureStore  # noqa: E402
+from gff_reader_benchmark import write_synthetic_gff  # noqa: E402
+
+
+def traced_size(build):
+    """ returns (held, peak) bytes allocated by build() and still referenced by its result """
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    gc.collect()
+    held, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, held, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--lines', type=int, default=1000000, help='number of lines in the synthetic GFF3 file')
+    parser.add_argument('--gff', help='measure an existing GFF3 file instead of a synthetic one')
+    args = parser.parse_args()
+
+    tmp_file = None
+    if args.gff:
+        gff_file = args.gff
+    else:
+        tmp_fh, tmp_file = tempfile.mkstemp(suffix='.gff3')
+        os.close(tmp_fh)
+        gff_file = tmp_file
+        line_count = write_synthetic_gff(gff_file, args.lines)
+        print(f"GFF3 file: {gff_file} ({line_count:,} lines)")
+
+    try:
+        dct, dct_held, dct_peak = traced_size(lambda: StreamGFF3(gff_file).reader())
+        del dct
+        store, store_held, store_peak = traced_size(lambda: FeatureStore.from_contigs(StreamGFF3(gff_file).contigs))
+        print(f"{'nested dict':>12}: {dct_held / 2 ** 20:10.1f} MiB held  {dct_peak / 2 ** 20:10.1f} MiB peak")
+        print(f"{'FeatureStore':>12}: {store_held / 2 ** 20:10.1f} MiB held  {store_peak / 2 ** 20:10.1f} MiB peak "
+              f"(built one contig at a time)")
+        print(f"{len(store.parent):,} features, {len(store.starts):,} segments, "
+              f"{store.nbytes / 2 ** 20:.1f} MiB of arrays, {dct_held / store_held:.1f}x smaller")
+    finally:
+        if tmp_file:
+            os.remove(tmp_file)
+
+
+if __name__ == "__main__":
+    main()
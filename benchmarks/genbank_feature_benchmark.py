@@ -0,0 +1,161 @@
+"""
+Compares the features/sec of the regex per line feature tokenizer and the precompiled one
+on the feature table of a synthetic bacterial GenBank file
+
+usage: python benchmarks/genbank_feature_benchmark.py [--features 100000] [--genbank file.gbff] [--check]
+"""
+import argparse
+import os
+import re
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from galEupy.BioFile import genbank_parser  # noqa: E402
+from galEupy.BioFile.genbank_parser import (tokenize_feature_lines, process_single_feature_data,  # noqa: E402
+                                            parse_feature_location, transform_qualifier_dct)
+from genbank_reader_benchmark import write_synthetic_genbank  # noqa: E402
+
+
+def regex_split_features(gene_data):
+    """ feature split of process_single_gene_data before the tokenizer """
+    key_regex = r"^" + " " * 5 + r"\w"
+    feature_key_flag = 0
+    feature = []
+    feature_store = []
+    for i, data in enumerate(gene_data):
+        if re.search(key_regex, data, re.IGNORECASE):
+            if feature_key_flag == 1:
+                feature_store.append(feature)
+                feature = [data]
+                if len(gene_data) == (i + 1):
+                    feature_store.append(feature)
+            else:
+                feature_key_flag = 1
+                feature.append(data)
+        elif len(gene_data) == (i + 1):
+            feature.append(data)
+            feature_store.append(feature)
+        else:
+            feature.append(data)
+    return feature_store
+
+
+def regex_feature_key_qualifier(data_array):
+    feature_key = ''
+    feature_lines = []
+    for line in data_array:
+        match_obj = re.match(r' {5}(\w+)', line, re.M | re.I)
+        if match_obj:
+            feature_key = match_obj.group(1)
+            line = re.sub(r' +\w+ +', '', line)
+            feature_lines.append(line.strip())
+        if line[:21] == " " * 21 and (line != ''):
+            feature_lines.append(line[21:].strip())
+    return feature_key, feature_lines
+
+
+def regex_parse_location(location):
+    location_array = []
+    _re_complement = re.compile(r"complement")
+    _re_join = re.compile(r"join")
+    _re_substitute = re.compile('[^0-9.,]')
+    stand = "-" if _re_complement.search(location) else "+"
+    loc = _re_substitute.sub(r'', location)
+    if _re_join.search(location):
+        for loc in re.split(",", loc):
+            location_array.append(re.split(r"\.\.", loc))
+    else:
+        location_array.append(re.split(r"\.\.", loc))
+    return location_array, stand
+
+
+def regex_tokenizer(gene_blocks):
+    records = []
+    for gene_data in gene_blocks:
+        for feature_data in regex_split_features(gene_data):
+            feature_key, feature_lines = regex_feature_key_qualifier(feature_data)
+            _, location, qualifiers = process_single_feature_data(feature_key, feature_lines)
+            location_list, strand = regex_parse_location(location)
+            location_list = [[int(value) for value in segment] for segment in location_list]
+            records.append((feature_key, location_list, strand, transform_qualifier_dct(qualifiers)))
+    return records
+
+
+def precompiled_tokenizer(gene_blocks):
+    records = []
+    for gene_data in gene_blocks:
+        for feature_key, feature_lines in tokenize_feature_lines(gene_data):
+            _, location, qualifiers = process_single_feature_data(feature_key, feature_lines)
+            feature_location = parse_feature_location(location)
+            location_list = [list(segment) for segment in feature_location.segments]
+            records.append((feature_key, location_list, feature_location.strand,
+                            transform_qualifier_dct(qualifiers)))
+    return records
+
+
+def read_gene_blocks(genbank_file):
+    """ feature table lines of each gene, split at the gene keys as GenBankReader does """
+    gene_blocks = []
+    gene_lines = None
+    with open(genbank_file, 'r') as fh:
+        for line in fh:
+            if line.startswith(genbank_parser.FEATURES_PREFIX):
+                gene_lines = []
+            elif gene_lines is None:
+                continue
+            elif line.startswith(genbank_parser.GENE_PREFIX):
+                gene_blocks.append(gene_lines)
+                gene_lines = [line]
+            elif line.startswith(genbank_parser.ORIGIN_PREFIX):
+                gene_lines.append(line)
+                gene_blocks.append(gene_lines)
+                gene_lines = None
+            else:
+                gene_lines.append(line)
+    return gene_blocks
+
+
+def time_tokenizer(label, tokenizer, gene_blocks):
+    start = time.perf_counter()
+    records = tokenizer(gene_blocks)
+    elapsed = time.perf_counter() - start
+    print(f"{label:>22}: {elapsed:8.2f} s  {len(records) / elapsed:12,.0f} features/sec")
+    return records
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--features', type=int, default=100000, help='number of features in the synthetic file')
+    parser.add_argument('--genbank', help='measure an existing GenBank file instead of a synthetic one')
+    parser.add_argument('--check', action='store_true', help='compare the tokenized features')
+    args = parser.parse_args()
+
+    tmp_file = None
+    if args.genbank:
+        genbank_file = args.genbank
+    else:
+        tmp_fh, tmp_file = tempfile.mkstemp(suffix='.gbff')
+        os.close(tmp_fh)
+        genbank_file = tmp_file
+        # one bacterial chromosome, about 2.2 features per gene
+        feature_count = write_synthetic_genbank(genbank_file, 1, int(args.features / 2.2), eukaryotic=False,
+                                                gene_spacing=1000)
+        print(f"GenBank file: {genbank_file} ({feature_count:,} features)")
+
+    try:
+        gene_blocks = read_gene_blocks(genbank_file)
+        old = time_tokenizer('regex per line', regex_tokenizer, gene_blocks)
+        new = time_tokenizer('precompiled tokenizer', precompiled_tokenizer, gene_blocks)
+        if args.check:
+            assert old == new, 'tokenized features differ'
+            print("tokenized features match")
+    finally:
+        if tmp_file:
+            os.remove(tmp_file)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+"""
+Compares the line buffering GenBank parser with GenBankReader on a synthetic GenBank file
+
+usage: python benchmarks/genbank_reader_benchmark.py [--loci 50] [--genes 250] [--isoforms 1] [--genbank file.gbff]
+                                                     [--check]
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from galEupy.BioFile import genbank_parser  # noqa: E402
+from galEupy.BioFile.genbank_parser import GenBankReader, HeaderScan, process_single_gene_data  # noqa: E402
+
+
+def wrap_qualifier(key, value, width=58):
+    text = f'/{key}="{value}"'
+    return ''.join(f'{" " * 21}{text[i:i + width]}\n' for i in range(0, len(text), width))
+
+
+def feature_lines(key, location, qualifiers):
+    lines = [f'     {key:<16}{location}\n']
+    for qualifier_key, value in qualifiers:
+        lines.append(wrap_qualifier(qualifier_key, value))
+    return ''.join(lines)
+
+
+def write_synthetic_genbank(file_name, locus_count, genes_per_locus, seed=1, eukaryotic=True, gene_spacing=3000,
+                            isoforms=1):
+    """
+    writes a GenBank file of locus_count records, with bacterial (gene, CDS), eukaryotic (gene, mRNA, CDS),
+    tRNA and repeat_region features. Without eukaryotic only the bacterial genes and tRNAs are written.
+    The eukaryotic genes have isoforms mRNA and CDS pairs. Returns the number of features
+    """
+    rng = random.Random(seed)
+    feature_count = 0
+    with open(file_name, 'w') as fh:
+        for locus_idx in range(locus_count):
+            locus_name = f'NZ_SYN{locus_idx:06d}'
+            length = genes_per_locus * gene_spacing + 1000
+            fh.write(f'LOCUS       {locus_name}  {length} bp    DNA     linear   CON 01-JAN-2020\n'
+                     f'DEFINITION  Synthetic organism contig {locus_idx}.\n'
+                     f'ACCESSION   {locus_name}\n'
+                     f'VERSION     {locus_name}.1\n'
+                     f'SOURCE      Synthetic organism\n'
+                     f'FEATURES             Location/Qualifiers\n')
+            fh.write(feature_lines('source', f'1..{length}', [('organism', 'Synthetic organism'),
+                                                               ('mol_type', 'genomic DNA')]))
+            feature_count += 1
+            for gene_idx in range(genes_per_locus):
+                tag = f'SYN{locus_idx}_{gene_idx:05d}'
+                start = gene_idx * gene_spacing + 101
+                end = start + gene_spacing * 4 // 5 - 1
+                complement = gene_idx % 2 == 1
+                kind = gene_idx % 5
+                protein = ''.join(rng.choices('ACDEFGHIKLMNPQRSTVWY', k=120))
+                product = f'hypothetical protein family {gene_idx % 37} domain containing protein'
+                if kind == 4:
+                    location = f'{start}..{start + 75}'
+                    if complement:
+                        location = f'complement({location})'
+                    fh.write(feature_lines('gene', location, [('locus_tag', tag)]))
+                    fh.write(feature_lines('tRNA', location, [('locus_tag', tag), ('product', 'tRNA-Leu')]))
+                    fh.write(feature_lines('repeat_region', f'{start + 100}..{start + 300}',
+                                           [('rpt_family', 'REP')]))
+                    feature_count += 3
+                    continue
+                if kind == 3 and eukaryotic:
+                    exon_length, exon_step = gene_spacing // 5, gene_spacing * 3 // 10
+                    segments = [(start, start + exon_length - 1),
+                                (start + exon_step, start + exon_step + exon_length - 1), (start + 2 * exon_step, end)]
+                    join = 'join(' + ','.join(f'{s}..{e}' for s, e in segments) + ')'
+                    if complement:
+                        join = f'complement({join})'
+                    fh.write(feature_lines('gene', f'{start}..{end}' if not complement
+                                           else f'complement({start}..{end})', [('locus_tag', tag)]))
+                    if isoforms == 1:
+                        fh.write(feature_lines('mRNA', join, [('locus_tag', tag), ('product', product),
+                                                              ('transcript_id', f'XM_{tag}.1')]))
+                        fh.write(feature_lines('CDS', join, [('locus_tag', tag), ('product', product),
+                                                             ('protein_id', f'XP_{tag}.1'),
+                                                             ('translation', protein)]))
+                        feature_count += 3
+                        continue
+                    for isoform in range(1, isoforms + 1):
+                        fh.write(feature_lines('mRNA', join, [('locus_tag', tag),
+                                                              ('product', f'{product}, transcript variant X{isoform}'),
+                                                              ('transcript_id', f'XM_{tag}.{isoform}')]))
+                    for isoform in range(1, isoforms + 1):
+                        fh.write(feature_lines('CDS', join, [('locus_tag', tag),
+                                                             ('product', f'{product} isoform X{isoform}'),
+                                                             ('protein_id', f'XP_{tag}.{isoform}'),
+                                                             ('translation', protein)]))
+                    feature_count += 1 + 2 * isoforms
+                    continue
+                location = f'{start}..{end}'
+                if complement:
+                    location = f'complement({location})'
+                fh.write(feature_lines('gene', location, [('locus_tag', tag)]))
+                fh.write(feature_lines('CDS', location, [('locus_tag', tag), ('product', product),
+                                                         ('protein_id', f'WP_{tag}.1'), ('translation', protein)]))
+                feature_count += 2
+            fh.write('ORIGIN      \n')
+            sequence = ''.join(rng.choices('acgt', k=length))
+            for line_start in range(0, length, 60):
+                blocks = ' '.join(sequence[i:i + 10] for i in range(line_start, min(line_start + 60, length), 10))
+                fh.write(f'{line_start + 1:>9} {blocks}\n')
+            fh.write('//\n')
+    return feature_count
+
+
+def buffered_get_data(fp_in):
+    """ get_data before GenBankReader, it buffered every line of a record and matched each with re """
+    dna_beg_pos = 0
+    data_store = []
+    locus_flag = 0
+    gene_flag = 0
+    sequence_dct = {}
+    dna_array = []
+    locus = None
+    locus_dct = genbank_parser.default_dct_structure()
+    product_dct = genbank_parser.default_dct_structure()
+    transcript_id_dct = {}
+    for data in fp_in:
+        if type(data) == bytes:
+            data = data.decode()
+        if re.match("^LOCUS ", data):
+            data_store = []
+            locus_flag = 1
+        if locus_flag == 1:
+            data_store.append(data)
+        if re.match("^FEATURES ", data):
+            locus_flag = 0
+            locus = HeaderScan(data_store)
+            data_store = []
+        if re.match("^ {5}(gene)", data) and locus:
+            if gene_flag == 0:
+                gene_flag = 1
+            else:
+                locus_dct, transcript_id_dct, product_dct = process_single_gene_data(
+                    data_store, transcript_id_dct, locus_dct, locus.Name, product_dct)
+                data_store = []
+        if gene_flag == 1:
+            data_store.append(data)
+        if re.match("^//\n", data):
+            sequence_dct[locus.Name] = ''.join(dna_array)
+            dna_array = []
+            dna_beg_pos = 0
+        if dna_beg_pos == 1:
+            data = re.sub(r'\d', "", data.rstrip())
+            data = re.sub(r' ', "", data)
+            dna_array.append(data)
+        if re.match("^ORIGIN", data):
+            dna_beg_pos = 1
+            locus_dct, transcript_id_dct, product_dct = process_single_gene_data(
+                data_store, transcript_id_dct, locus_dct, locus.Name, product_dct)
+            data_store = []
+    return locus_dct, sequence_dct
+
+
+def streamed_get_data(fp_in):
+    """ consumes GenBankReader one locus at a time and keeps nothing, as the upload does """
+    bases = 0
+    for locus in GenBankReader(fp_in):
+        bases += len(locus.sequence)
+    return bases
+
+
+def time_parser(label, parser_function, genbank_file, feature_count):
+    with open(genbank_file, 'rb') as fp_in:
+        tracemalloc.start()
+        start = time.perf_counter()
+        result = parser_function(fp_in)
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    print(f"{label:>18}: {elapsed:8.2f} s  {feature_count / elapsed:10,.0f} features/sec  "
+          f"{peak / 2 ** 20:8.1f} MiB peak")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--loci', type=int, default=50, help='number of LOCUS records in the synthetic file')
+    parser.add_argument('--genes', type=int, default=250, help='number of genes per LOCUS record')
+    parser.add_argument('--isoforms', type=int, default=1, help='mRNA and CDS isoforms of the eukaryotic genes')
+    parser.add_argument('--genbank', help='measure an existing GenBank file instead of a synthetic one')
+    parser.add_argument('--check', action='store_true', help='compare the parsed dictionaries')
+    args = parser.parse_args()
+
+    tmp_file = None
+    if args.genbank:
+        genbank_file = args.genbank
+        feature_count = sum(1 for line in open(genbank_file, 'rb') if re.match(rb' {5}\w', line))
+    else:
+        tmp_fh, tmp_file = tempfile.mkstemp(suffix='.gbff')
+        os.close(tmp_fh)
+        genbank_file = tmp_file
+        feature_count = write_synthetic_genbank(genbank_file, args.loci, args.genes, isoforms=args.isoforms)
+        print(f"GenBank file: {genbank_file} ({feature_count:,} features, "
+              f"{os.path.getsize(genbank_file) / 2 ** 20:.1f} MiB)")
+
+    try:
+        old = time_parser('buffered get_data', buffered_get_data, genbank_file, feature_count)
+        time_parser('GenBankReader', streamed_get_data, genbank_file, feature_count)
+        if args.check:
+            with open(genbank_file, 'rb') as fp_in:
+                new = genbank_parser.get_data(fp_in)
+            assert old[1] == new[1], 'sequences differ'
+            assert old[0] == new[0], 'features differ'
+            print("get_data results match")
+    finally:
+        if tmp_file:
+            os.remove(tmp_file)
+
+
+if __name__ == "__main__":
+    main()
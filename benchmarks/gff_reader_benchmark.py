@@ -0,0 +1,103 @@
+"""
+Compares the lines/sec of ReadGFF3.reader and StreamGFF3.reader on a synthetic GFF3 file
+
+usage: python benchmarks/gff_reader_benchmark.py [--lines 5000000] [--gff file.gff3] [--check]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from galEupy.BioFile.gff_parser import ReadGFF3, StreamGFF3  # noqa: E402
+
+
+def write_synthetic_gff(file_name, line_count, exons_per_gene=4, genes_per_contig=2000):
+    """ writes a RefSeq style GFF3 file (gene, mRNA, exon and CDS lines) with about line_count lines """
+    lines_per_gene = 2 + 2 * exons_per_gene
+    gene_count = max(1, line_count // lines_per_gene)
+    with open(file_name, 'w') as fh:
+        fh.write('##gff-version 3\n')
+        for gene_idx in range(gene_count):
+            contig = f'NC_{gene_idx // genes_per_contig:06d}.1'
+            start = (gene_idx % genes_per_contig) * 5000 + 1
+            end = start + 4000
+            strand = '+' if gene_idx % 2 else '-'
+            gene_id = f'gene-G{gene_idx}'
+            rna_id = f'rna-XM_{gene_idx}.1'
+            rows = [
+                (contig, 'gene', start, end, strand, f'ID={gene_id};Name=G{gene_idx};gene_biotype=protein_coding'),
+                (contig, 'mRNA', start, end, strand,
+                 f'ID={rna_id};Parent={gene_id};product=hypothetical protein {gene_idx};transcript_id=XM_{gene_idx}.1')
+            ]
+            for exon_idx in range(exons_per_gene):
+                exon_start = start + exon_idx * 1000
+                exon_end = exon_start + 600
+                rows.append((contig, 'exon', exon_start, exon_end, strand,
+                             f'ID=exon-XM_{gene_idx}.1-{exon_idx + 1};Parent={rna_id}'))
+            for exon_idx in range(exons_per_gene):
+                exon_start = start + exon_idx * 1000
+                exon_end = exon_start + 600
+                rows.append((contig, 'CDS', exon_start, exon_end, strand,
+                             f'ID=cds-XP_{gene_idx}.1;Parent={rna_id};protein_id=XP_{gene_idx}.1'))
+            for row in rows:
+                fh.write(f'{row[0]}\tRefSeq\t{row[1]}\t{row[2]}\t{row[3]}\t.\t{row[4]}\t.\t{row[5]}\n')
+    return gene_count * lines_per_gene + 1
+
+
+def time_reader(reader_class, gff_file, line_count):
+    start = time.perf_counter()
+    dct = reader_class(gff_file).reader()
+    elapsed = time.perf_counter() - start
+    print(f"{reader_class.__name__:>12}: {elapsed:8.2f} s  {line_count / elapsed:12,.0f} lines/sec")
+    return dct
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--lines', type=int, default=5000000, help='number of lines in the synthetic GFF3 file')
+    parser.add_argument('--gff', help='benchmark an existing GFF3 file instead of a synthetic one')
+    parser.add_argument('--check', action='store_true', help='check both readers return the same dictionary')
+    args = parser.parse_args()
+
+    tmp_file = None
+    if args.gff:
+        gff_file = args.gff
+        with open(gff_file) as fh:
+            line_count = sum(1 for _ in fh)
+    else:
+        tmp_fh, tmp_file = tempfile.mkstemp(suffix='.gff3')
+        os.close(tmp_fh)
+        gff_file = tmp_file
+        line_count = write_synthetic_gff(gff_file, args.lines)
+    print(f"GFF3 file: {gff_file} ({line_count:,} lines)")
+
+    try:
+        stream_dct = time_reader(StreamGFF3, gff_file, line_count)
+        if not args.check:
+            stream_dct = None
+        read_dct = time_reader(ReadGFF3, gff_file, line_count)
+        if args.check:
+            same = to_plain_dict(stream_dct) == to_plain_dict(read_dct)
+            print(f"Same feature dictionary: {same}")
+    finally:
+        if tmp_file:
+            os.remove(tmp_file)
+
+
+def to_plain_dict(dct):
+    """ converts the nested defaultdict to plain dictionaries, empty branches are dropped """
+    if isinstance(dct, dict):
+        plain = {}
+        for key, value in dct.items():
+            value = to_plain_dict(value)
+            if value != {}:
+                plain[key] = value
+        return plain
+    return dct
+
+
+if __name__ == "__main__":
+    main()
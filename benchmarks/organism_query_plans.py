@@ -0,0 +1,36 @@
+"""
+Adds the missing organism indexes of a GAL database and checks with EXPLAIN that the organism scoped
+lookups and deletes use them, exits with 1 if a table is still read with a full scan
+
+usage: python benchmarks/organism_query_plans.py -db database.ini [--taxon 4787 --strain 1] [--no-upgrade]
+"""
+import argparse
+import logging
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from galEupy.dbschema import UploadSchema  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-db', '--dbconfig', required=True, help='database configuration file')
+    parser.add_argument('--taxon', type=int, help='taxon ID of the organism, the first uploaded one by default')
+    parser.add_argument('--strain', type=float, default=1, help='strain number of the organism')
+    parser.add_argument('--no-upgrade', action='store_true', help='only check, do not add missing indexes')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+
+    schema = UploadSchema(args.dbconfig)
+    if not args.no_upgrade:
+        schema.upgrade_indexes()
+    strain = args.strain if args.taxon is not None else None
+    indexes_used = schema.check_index_usage(args.taxon, strain)
+    schema.close()
+    print("all organism queries use indexes" if indexes_used else "full table scans found")
+    sys.exit(0 if indexes_used else 1)
+
+
+if __name__ == "__main__":
+    main()
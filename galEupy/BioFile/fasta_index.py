@@ -0,0 +1,276 @@
+"""
+Memory mapped FASTA access through a .fai style index.
+
+The index is kept next to the FASTA file as <fasta>.gal.fai and holds one
+line per contig: name, length, offset, linebases, linewidth, as in the
+samtools .fai format. Names are normalised with fasta_header_name, so they
+are the keys read_fasta_to_dictionary returns. Contigs whose lines are not
+of a fixed width are marked with linebases 0; their linewidth column then
+holds the byte length of the sequence block.
+"""
+from collections import namedtuple
+from collections.abc import Mapping
+import mmap
+import os
+from pathlib import Path
+import logging
+from ..general_utility import fasta_header_name
+_logger = logging.getLogger("galEupy.BioFile.fasta_index")
+
+FastaRecord = namedtuple('FastaRecord', ['length', 'offset', 'linebases', 'linewidth'])
+
+
+class IndexedFasta(Mapping):
+    """
+    Read only {contig name: sequence} mapping over a FASTA file.
+    The values are FastaContig objects which read the sequence from the file when sliced.
+    """
+    index_suffix = '.gal.fai'
+
+    def __init__(self, fasta_file, index_file=None):
+        """
+        parameters
+        ----------
+        fasta_file: str or Path
+            uncompressed FASTA file
+        index_file: str or Path
+            index location, <fasta_file>.gal.fai by default
+        """
+        self.fasta_file = Path(fasta_file)
+        if index_file is None:
+            index_file = self.fasta_file.with_name(self.fasta_file.name + self.index_suffix)
+        self.index_file = Path(index_file)
+        self._fh = None
+        self._mm = None
+        self._irregular = (None, '')
+        self.index = self.load_index()
+        if self.index is None:
+            self.index = self.build_index()
+            self.write_index()
+
+    def index_signature(self):
+        return '#galEupy fasta index\t{}'.format(os.stat(self.fasta_file).st_size)
+
+    def load_index(self):
+        """ returns the saved index, None when it is missing or older than the FASTA file """
+        try:
+            if self.index_file.stat().st_mtime < self.fasta_file.stat().st_mtime:
+                return None
+            with open(self.index_file, 'r', encoding='utf-8') as fh:
+                if fh.readline().rstrip('\n') != self.index_signature():
+                    return None
+                index = {}
+                for line in fh:
+                    name, length, offset, linebases, linewidth = line.rstrip('\n').split('\t')
+                    index[name] = FastaRecord(int(length), int(offset), int(linebases), int(linewidth))
+        except (OSError, ValueError):
+            return None
+        _logger.debug("Using FASTA index: {}".format(self.index_file))
+        return index
+
+    def build_index(self):
+        _logger.debug("Indexing FASTA file: {}".format(self.fasta_file))
+        index = {}
+        layout = None
+        name = None
+        offset = 0
+        with open(self.fasta_file, 'rb') as fh:
+            for line in fh:
+                if line[:1] == b'>':
+                    header_name = fasta_header_name(line.decode('latin-1').rstrip())
+                    if header_name is not None:
+                        if layout is not None:
+                            index[name] = layout.record()
+                        name = header_name
+                        layout = ContigLayout(offset + len(line))
+                        offset += len(line)
+                        continue
+                if layout is not None:
+                    layout.add_line(line)
+                offset += len(line)
+        if layout is not None:
+            index[name] = layout.record()
+        return index
+
+    def write_index(self):
+        try:
+            tmp_file = self.index_file.with_name(self.index_file.name + '.tmp')
+            with open(tmp_file, 'w', encoding='utf-8') as fh:
+                fh.write(self.index_signature() + '\n')
+                for name, record in self.index.items():
+                    fh.write('{}\t{}\t{}\t{}\t{}\n'.format(name, *record))
+            os.replace(tmp_file, self.index_file)
+        except OSError as e:
+            _logger.warning("Could not write the FASTA index {}: {}".format(self.index_file, e))
+
+    @property
+    def mm(self):
+        if self._mm is None:
+            self._fh = open(self.fasta_file, 'rb')
+            if os.fstat(self._fh.fileno()).st_size == 0:
+                self._mm = b''
+            else:
+                self._mm = mmap.mmap(self._fh.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._mm
+
+    def fetch(self, name, start=None, end=None):
+        """
+        sequence[start:end] of a contig, with the indexing rules of a Python string slice
+        """
+        record = self.index[name]
+        start, end, _ = slice(start, end).indices(record.length)
+        if end <= start:
+            return ''
+        if record.linebases == 0:
+            return self.irregular_sequence(name, record)[start:end]
+
+        linebases = record.linebases
+        linewidth = record.linewidth
+        first = record.offset + start // linebases * linewidth + start % linebases
+        last = record.offset + (end - 1) // linebases * linewidth + (end - 1) % linebases + 1
+        data = self.mm[first:last]
+        if linewidth != linebases:
+            data = data.translate(None, b'\r\n')
+        return data.decode('latin-1')
+
+    def fetch_intervals(self, name, intervals):
+        """
+        concatenation of sequence[start:end] for each (start, end) interval of a contig,
+        the intervals are gathered as memoryview slices of the file and decoded once
+        """
+        record = self.index[name]
+        bounds = [slice(start, end).indices(record.length)[:2] for start, end in intervals]
+        if record.linebases == 0:
+            sequence = self.irregular_sequence(name, record)
+            return ''.join([sequence[start:end] for start, end in bounds])
+
+        linebases = record.linebases
+        linewidth = record.linewidth
+        buffer = memoryview(self.mm)
+        pieces = []
+        for start, end in bounds:
+            if end <= start:
+                continue
+            first = record.offset + start // linebases * linewidth + start % linebases
+            last = record.offset + (end - 1) // linebases * linewidth + (end - 1) % linebases + 1
+            pieces.append(buffer[first:last])
+        data = b''.join(pieces)
+        del pieces
+        buffer.release()
+        if linewidth != linebases:
+            data = data.translate(None, b'\r\n')
+        return data.decode('latin-1')
+
+    def irregular_sequence(self, name, record):
+        """ whole sequence of a contig without a fixed line width, the last one is cached """
+        if self._irregular[0] != name:
+            text = self.mm[record.offset:record.offset + record.linewidth].decode('latin-1')
+            lines = text.replace('\r\n', '\n').replace('\r', '\n').split('\n')
+            self._irregular = (name, ''.join(line.rstrip() for line in lines))
+        return self._irregular[1]
+
+    def close(self):
+        if self._mm is not None and not isinstance(self._mm, bytes):
+            self._mm.close()
+        if self._fh is not None:
+            self._fh.close()
+        self._mm = None
+        self._fh = None
+        self._irregular = (None, '')
+
+    def __del__(self):
+        self.close()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.update(_fh=None, _mm=None, _irregular=(None, ''))
+        return state
+
+    def __getitem__(self, name):
+        if name not in self.index:
+            raise KeyError(name)
+        return FastaContig(self, name, self.index[name].length)
+
+    def __iter__(self):
+        return iter(self.index)
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, name):
+        return name in self.index
+
+
+class FastaContig:
+    """ sequence of a contig, read from the file when it is sliced or converted with str() """
+    __slots__ = ('fasta', 'name', 'length')
+
+    def __init__(self, fasta, name, length):
+        self.fasta = fasta
+        self.name = name
+        self.length = length
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            if item.step not in (None, 1):
+                return str(self)[item]
+            return self.fasta.fetch(self.name, item.start, item.stop)
+        if item < 0:
+            item += self.length
+        if not 0 <= item < self.length:
+            raise IndexError('sequence index out of range')
+        return self.fasta.fetch(self.name, item, item + 1)
+
+    def join_intervals(self, intervals):
+        """ concatenation of self[start:end] for each (start, end) interval """
+        return self.fasta.fetch_intervals(self.name, intervals)
+
+    def __str__(self):
+        return self.fasta.fetch(self.name)
+
+    def __repr__(self):
+        return 'FastaContig({!r}, length={})'.format(self.name, self.length)
+
+
+class ContigLayout:
+    """ line layout of a contig, collected while indexing """
+    def __init__(self, offset):
+        self.offset = offset
+        self.end = offset
+        self.length = 0
+        self.linebases = 0
+        self.linewidth = 0
+        self.regular = True
+        self.last_line = False
+
+    def add_line(self, line):
+        self.end += len(line)
+        line_bases = len(line.rstrip())
+        if line_bases == 0:
+            self.last_line = True
+            return
+        self.length += line_bases
+        if not self.regular:
+            return
+
+        terminator = line[line_bases:]
+        if self.linebases == 0 and not self.last_line:
+            self.linebases = line_bases
+            self.linewidth = len(line)
+            self.regular = terminator in (b'\n', b'\r\n', b'')
+            self.last_line = terminator == b''
+        elif self.last_line or line_bases > self.linebases:
+            self.regular = False
+        elif line_bases < self.linebases or terminator != b'' and len(line) != self.linewidth:
+            self.last_line = True
+            self.regular = terminator in (b'\n', b'\r\n', b'')
+        elif terminator == b'':
+            self.last_line = True
+
+    def record(self):
+        if self.regular:
+            return FastaRecord(self.length, self.offset, self.linebases, self.linewidth)
+        return FastaRecord(self.length, self.offset, 0, self.end - self.offset)
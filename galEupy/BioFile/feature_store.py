@@ -0,0 +1,543 @@
+"""
+Columnar storage for the contig -> gene -> rna -> cds/exon feature model.
+
+Every feature (gene, rna, cds, exon, repeat_region, ...) is one row of a set
+of flat arrays (parent, key, name, segments) and every location segment is
+one row of the starts/ends/strands arrays. Feature ids, dictionary keys and
+repeated attribute values (ID, protein_id, product) are interned, the
+interned strings are packed into one UTF-8 buffer.
+
+The store and its views implement the read only mapping protocol of the
+nested dictionaries built by gff_parser and genbank_parser, so
+ModelGFFDict, fix_multiple_splicing_bugs and TableProcessUtility walk it
+the same way they walk the dictionaries. Values assigned to a feature
+(gene_sequence, protein_sequence, product, ...) are kept in a sparse side
+table.
+"""
+from array import array
+from collections.abc import Mapping
+import logging
+_logger = logging.getLogger("galEupy.BioFile.feature_store")
+
+ABSENT = -1
+# string index of a None attribute value
+NONE_STRING = -2
+STRAND_CODES = {'+': 1, '-': 2, '.': 3, '?': 4}
+STRAND_CHARS = (None, '+', '-', '.', '?')
+
+# dictionary keys holding a single feature instead of a {feature_id: feature} group
+DIRECT_FEATURES = frozenset(['cds', 'exon', 'repeat_region'])
+# string attributes stored as interned columns
+COLUMN_ATTRIBUTES = ('ID', 'protein_id', 'product')
+
+
+class FeatureStore(Mapping):
+    def __init__(self):
+        """
+        Empty feature store, use add_contig, from_dict or from_contigs to fill it
+        """
+        self.contig_names = []
+        self.contig_index = {}
+        self.contig_keys = []  # top level keys (gene, pseudogene, repeat_region, ...) of each contig
+        self.contig_first = array('i')
+        self.contig_last = array('i')
+
+        self.key_names = []
+        self.key_index = {}
+        # string i is string_data[string_offsets[i]:string_offsets[i + 1]]
+        self.string_data = bytearray()
+        self.string_offsets = array('q', [0])
+        # interned strings of the contig being added, cleared per contig so only the values stay in memory
+        self.string_index = {}
+
+        # one entry for each feature
+        self.parent = array('i')
+        self.contig = array('i')
+        self.key = array('h')
+        self.name = array('i')
+        self.first_child = array('i')
+        self.next_sibling = array('i')
+        self.segment_offset = array('i')
+        self.segment_count = array('i')
+        self.attributes = {attribute: array('i') for attribute in COLUMN_ATTRIBUTES}
+        self.removed = bytearray()
+
+        # one entry for each location segment, widened to 64 bit by add_segments when a coordinate needs it
+        self.starts = array('i')
+        self.ends = array('i')
+        self.strands = array('b')
+
+        # sparse values: feature index -> {key: value}
+        self.extras = {}
+        # (contig index, key) of the top level feature groups
+        self.group_keys = set()
+        # (contig index, key) -> feature index for the top level single features (repeat_region)
+        self.direct_index = {}
+        # (parent, key index) -> {feature id: feature index} of the groups of one contig, see group_members
+        self.member_index = {}
+        self.member_index_contig = ABSENT
+
+    @classmethod
+    def from_dict(cls, feature_dct, release=True):
+        """
+        Builds a store from the nested feature dictionary
+        parameters
+        ----------
+        feature_dct: dict
+            contig -> feature dictionary from gff_parser or genbank_parser
+        release: bool
+            removes each contig from feature_dct once it is stored, so both copies never coexist
+        """
+        store = cls()
+        for contig_name in list(feature_dct.keys()):
+            contig_dct = feature_dct.pop(contig_name) if release else feature_dct[contig_name]
+            store.add_contig(contig_name, contig_dct)
+        return store
+
+    @classmethod
+    def from_contigs(cls, contig_reader):
+        """
+        Builds a store from a reader yielding the feature dictionary of one contig at a time, e.g.
+        StreamGFF3.contigs. Only the dictionary of the contig being read exists, a contig whose lines continue
+        after another contig is handed back to the reader by pop_contig
+        """
+        store = cls()
+        for contig_name, contig_dct in contig_reader(store.pop_contig):
+            store.add_contig(contig_name, contig_dct)
+        return store
+
+    def intern(self, value):
+        if value is None:
+            return NONE_STRING
+        try:
+            return self.string_index[value]
+        except KeyError:
+            idx = len(self.string_offsets) - 1
+            self.string_data += value.encode()
+            self.string_offsets.append(len(self.string_data))
+            self.string_index[value] = idx
+            return idx
+
+    def string(self, idx):
+        if idx == NONE_STRING:
+            return None
+        return self.string_data[self.string_offsets[idx]:self.string_offsets[idx + 1]].decode()
+
+    def intern_key(self, key):
+        try:
+            return self.key_index[key]
+        except KeyError:
+            idx = len(self.key_names)
+            self.key_names.append(key)
+            self.key_index[key] = idx
+            return idx
+
+    def add_contig(self, contig_name, contig_dct):
+        """ stores the feature dictionary of a contig """
+        if contig_name in self.contig_index:
+            contig_idx = self.contig_index[contig_name]
+        else:
+            contig_idx = len(self.contig_names)
+            self.contig_names.append(contig_name)
+            self.contig_index[contig_name] = contig_idx
+            self.contig_keys.append([])
+            self.contig_first.append(ABSENT)
+            self.contig_last.append(ABSENT)
+
+        self.string_index = {}
+        self.member_index_contig = ABSENT
+        for key, value in contig_dct.items():
+            if not isinstance(value, dict) or not value:
+                continue
+            if key not in self.contig_keys[contig_idx]:
+                self.contig_keys[contig_idx].append(key)
+            if key in DIRECT_FEATURES or not is_feature_group(value):
+                feature = self.add_feature(contig_idx, ABSENT, key, ABSENT, value)
+                self.link_top_level(contig_idx, feature)
+                self.direct_index[(contig_idx, key)] = feature
+            else:
+                self.group_keys.add((contig_idx, key))
+                for feature_id, feature_dct in value.items():
+                    feature = self.add_feature(contig_idx, ABSENT, key, self.intern(feature_id), feature_dct)
+                    self.link_top_level(contig_idx, feature)
+        self.string_index = {}
+
+    def pop_contig(self, contig_name):
+        """
+        removes the features of a contig from the store and returns them as a feature dictionary,
+        None for a contig that is not stored
+        """
+        if contig_name not in self.contig_index:
+            return None
+        contig_idx = self.contig_index[contig_name]
+        contig_dct = to_plain_dict(self[contig_name])
+        features = list(self.top_level(contig_idx))
+        while features:
+            feature = features.pop()
+            features.extend(self.children(feature))
+            self.remove(feature)
+        for key in self.contig_keys[contig_idx]:
+            self.group_keys.discard((contig_idx, key))
+            self.direct_index.pop((contig_idx, key), None)
+        self.contig_keys[contig_idx] = []
+        self.contig_first[contig_idx] = ABSENT
+        self.contig_last[contig_idx] = ABSENT
+        self.member_index_contig = ABSENT
+        return contig_dct
+
+    def link_top_level(self, contig_idx, feature):
+        last = self.contig_last[contig_idx]
+        if last == ABSENT:
+            self.contig_first[contig_idx] = feature
+        else:
+            self.next_sibling[last] = feature
+        self.contig_last[contig_idx] = feature
+
+    def add_feature(self, contig_idx, parent, key, name_idx, feature_dct):
+        feature = len(self.parent)
+        self.parent.append(parent)
+        self.contig.append(contig_idx)
+        self.key.append(self.intern_key(key))
+        self.name.append(name_idx)
+        self.first_child.append(ABSENT)
+        self.next_sibling.append(ABSENT)
+        self.segment_offset.append(len(self.starts))
+        self.segment_count.append(0)
+        for column in self.attributes.values():
+            column.append(ABSENT)
+        self.removed.append(0)
+
+        last_child = ABSENT
+        for sub_key, value in feature_dct.items():
+            if sub_key == 'location':
+                if not self.add_segments(feature, value):
+                    self.set_extra(feature, sub_key, value)
+            elif sub_key in self.attributes and (value is None or isinstance(value, str)):
+                self.attributes[sub_key][feature] = self.intern(value)
+            elif sub_key in DIRECT_FEATURES and isinstance(value, dict):
+                child = self.add_feature(contig_idx, feature, sub_key, ABSENT, value)
+                last_child = self.link_child(feature, last_child, child)
+            elif is_feature_group(value):
+                for child_id, child_dct in value.items():
+                    child = self.add_feature(contig_idx, feature, sub_key, self.intern(child_id), child_dct)
+                    last_child = self.link_child(feature, last_child, child)
+            else:
+                self.set_extra(feature, sub_key, value)
+        return feature
+
+    def link_child(self, feature, last_child, child):
+        if last_child == ABSENT:
+            self.first_child[feature] = child
+        else:
+            self.next_sibling[last_child] = child
+        return child
+
+    def add_segments(self, feature, location_list):
+        """
+        stores [start, end, strand] location segments, end and strand are optional.
+        returns False when the locations are not numeric, those are kept as they are
+        """
+        segments = []
+        try:
+            for segment in location_list:
+                if len(segment) == 1:
+                    segments.append((int(segment[0]), ABSENT, 0))
+                elif len(segment) == 2:
+                    segments.append((int(segment[0]), int(segment[1]), 0))
+                elif len(segment) == 3:
+                    segments.append((int(segment[0]), int(segment[1]), STRAND_CODES[segment[2]]))
+                else:
+                    return False
+        except (TypeError, ValueError, KeyError):
+            return False
+
+        try:
+            for start, end, strand in segments:
+                self.starts.append(start)
+                self.ends.append(end)
+                self.strands.append(strand)
+        except OverflowError:
+            # coordinates past 2 ** 31, the segment arrays are widened once
+            del self.starts[len(self.strands):]
+            del self.ends[len(self.strands):]
+            self.starts = array('q', self.starts)
+            self.ends = array('q', self.ends)
+            return self.add_segments(feature, location_list)
+        self.segment_count[feature] = len(segments)
+        return True
+
+    def set_extra(self, feature, key, value):
+        try:
+            self.extras[feature][key] = value
+        except KeyError:
+            self.extras[feature] = {key: value}
+
+    def locations(self, feature):
+        """
+        locations of a feature in the layout of the feature dictionary, as tuples: the segments are read from the
+        arrays on every access, a changed copy would be lost. A new location is stored by assigning it
+        """
+        location_list = []
+        offset = self.segment_offset[feature]
+        for idx in range(offset, offset + self.segment_count[feature]):
+            segment = [self.starts[idx]]
+            if self.ends[idx] != ABSENT:
+                segment.append(self.ends[idx])
+            if self.strands[idx]:
+                segment.append(STRAND_CHARS[self.strands[idx]])
+            location_list.append(tuple(segment))
+        return tuple(location_list)
+
+    def sorted_segments(self, feature):
+        """
+        (starts, ends) of a feature sorted by start and end, a missing end is the start.
+        returns None when the location is not stored as segments
+        """
+        if feature in self.extras and 'location' in self.extras[feature]:
+            return None
+        offset = self.segment_offset[feature]
+        count = self.segment_count[feature]
+        starts = self.starts[offset:offset + count]
+        ends = self.ends[offset:offset + count]
+        pairs = list(zip(starts, ends))
+        typecode = self.starts.typecode
+        if any(pairs[idx] > pairs[idx + 1] for idx in range(count - 1)):
+            pairs.sort()
+            starts = array(typecode, [start for start, _ in pairs])
+            ends = array(typecode, [end for _, end in pairs])
+        if ABSENT in ends:
+            ends = array(typecode, [start if end == ABSENT else end for start, end in zip(starts, ends)])
+        return starts, ends
+
+    def children(self, feature):
+        child = self.first_child[feature]
+        while child != ABSENT:
+            if not self.removed[child]:
+                yield child
+            child = self.next_sibling[child]
+
+    def top_level(self, contig_idx):
+        feature = self.contig_first[contig_idx]
+        while feature != ABSENT:
+            if not self.removed[feature]:
+                yield feature
+            feature = self.next_sibling[feature]
+
+    def remove(self, feature):
+        self.removed[feature] = 1
+        self.extras.pop(feature, None)
+        if self.contig[feature] == self.member_index_contig and self.name[feature] != ABSENT:
+            group = self.member_index.get((self.parent[feature], self.key[feature]))
+            if group is not None:
+                group.pop(self.string(self.name[feature]), None)
+
+    def group_members(self, contig_idx, parent, key):
+        """
+        {feature id: feature index} of the key group of a contig (parent ABSENT) or of a feature. The groups of
+        a contig are indexed in one pass when the contig is first looked up, only one contig is indexed at a time
+        """
+        if self.member_index_contig != contig_idx:
+            self.member_index = self.index_members(contig_idx)
+            self.member_index_contig = contig_idx
+        return self.member_index.get((parent, self.key_index.get(key, ABSENT)), {})
+
+    def index_members(self, contig_idx):
+        index = {}
+        features = [(ABSENT, feature) for feature in self.top_level(contig_idx)]
+        features.reverse()
+        while features:
+            parent, feature = features.pop()
+            if self.name[feature] != ABSENT:
+                index.setdefault((parent, self.key[feature]), {})[self.string(self.name[feature])] = feature
+            features.extend((feature, child) for child in reversed(list(self.children(feature))))
+        return index
+
+    def __getstate__(self):
+        """ the arrays, names and extras of the store, the lookup dictionaries are built again by __setstate__ """
+        state = dict(self.__dict__)
+        for derived in ('contig_index', 'key_index', 'string_index', 'group_keys', 'direct_index', 'member_index'):
+            del state[derived]
+        state['member_index_contig'] = ABSENT
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.contig_index = {contig_name: idx for idx, contig_name in enumerate(self.contig_names)}
+        self.key_index = {key: idx for idx, key in enumerate(self.key_names)}
+        self.string_index = {}
+        self.member_index = {}
+        self.group_keys = set()
+        self.direct_index = {}
+        for contig_idx in range(len(self.contig_names)):
+            feature = self.contig_first[contig_idx]
+            while feature != ABSENT:
+                key = self.key_names[self.key[feature]]
+                if self.name[feature] == ABSENT:
+                    self.direct_index[(contig_idx, key)] = feature
+                else:
+                    self.group_keys.add((contig_idx, key))
+                feature = self.next_sibling[feature]
+
+    def to_dict(self):
+        """ nested dictionary copy of the store """
+        return {contig: to_plain_dict(contig_view) for contig, contig_view in self.items()}
+
+    @property
+    def nbytes(self):
+        """ size of the feature and segment arrays """
+        columns = [self.parent, self.contig, self.key, self.name, self.first_child, self.next_sibling,
+                   self.segment_offset, self.segment_count, self.starts, self.ends, self.strands, self.string_offsets]
+        columns.extend(self.attributes.values())
+        return sum(column.itemsize * len(column) for column in columns) + len(self.removed) + len(self.string_data)
+
+    def __getitem__(self, contig_name):
+        return ContigView(self, self.contig_index[contig_name])
+
+    def __iter__(self):
+        return iter(self.contig_names)
+
+    def __len__(self):
+        return len(self.contig_names)
+
+    def __contains__(self, contig_name):
+        return contig_name in self.contig_index
+
+
+class ContigView(Mapping):
+    """ feature groups of a contig: {'gene': {...}, 'pseudogene': {...}, 'repeat_region': {...}} """
+    def __init__(self, store, contig_idx):
+        self.store = store
+        self.contig_idx = contig_idx
+
+    def __getitem__(self, key):
+        store = self.store
+        if (self.contig_idx, key) in store.group_keys:
+            return FeatureGroupView(store, self.contig_idx, ABSENT, key)
+        feature = store.direct_index.get((self.contig_idx, key), ABSENT)
+        if feature == ABSENT or store.removed[feature]:
+            raise KeyError(key)
+        return FeatureView(store, feature)
+
+    def __iter__(self):
+        return iter(list(self.store.contig_keys[self.contig_idx]))
+
+    def __len__(self):
+        return len(self.store.contig_keys[self.contig_idx])
+
+
+class FeatureGroupView(Mapping):
+    """ {feature_id: feature} group of a contig (genes) or of a feature (rnas of a gene) """
+    def __init__(self, store, contig_idx, parent, key):
+        self.store = store
+        self.contig_idx = contig_idx
+        self.parent = parent
+        self.key = key
+
+    @property
+    def members(self):
+        """ (feature_id, feature index) pairs of the group """
+        return list(self.store.group_members(self.contig_idx, self.parent, self.key).items())
+
+    def find(self, feature_id):
+        return self.store.group_members(self.contig_idx, self.parent, self.key).get(feature_id, ABSENT)
+
+    def __getitem__(self, feature_id):
+        feature = self.find(feature_id)
+        if feature == ABSENT:
+            raise KeyError(feature_id)
+        return FeatureView(self.store, feature)
+
+    def __delitem__(self, feature_id):
+        feature = self.find(feature_id)
+        if feature == ABSENT:
+            raise KeyError(feature_id)
+        self.store.remove(feature)
+
+    def pop(self, feature_id, *default):
+        try:
+            value = self[feature_id]
+        except KeyError:
+            if default:
+                return default[0]
+            raise
+        del self[feature_id]
+        return value
+
+    def items(self):
+        return [(feature_id, FeatureView(self.store, feature)) for feature_id, feature in self.members]
+
+    def __iter__(self):
+        return iter([feature_id for feature_id, _ in self.members])
+
+    def __len__(self):
+        return len(self.store.group_members(self.contig_idx, self.parent, self.key))
+
+
+class FeatureView(Mapping):
+    """ a single feature: {'location': [...], 'mrna': {...}, 'cds': {...}, 'product': ...} """
+    def __init__(self, store, feature):
+        self.store = store
+        self.feature = feature
+
+    def child_keys(self):
+        store = self.store
+        keys = []
+        for child in store.children(self.feature):
+            key = store.key_names[store.key[child]]
+            if key not in keys:
+                keys.append(key)
+        return keys
+
+    def __getitem__(self, key):
+        store = self.store
+        feature = self.feature
+        extras = store.extras.get(feature)
+        if extras is not None and key in extras:
+            return extras[key]
+        if key == 'location' and store.segment_count[feature]:
+            return store.locations(feature)
+        if key in store.attributes and store.attributes[key][feature] != ABSENT:
+            return store.string(store.attributes[key][feature])
+
+        key_idx = store.key_index.get(key, ABSENT)
+        if key_idx != ABSENT:
+            for child in store.children(feature):
+                if store.key[child] == key_idx:
+                    if store.name[child] == ABSENT:
+                        return FeatureView(store, child)
+                    return FeatureGroupView(store, store.contig[feature], feature, key)
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        self.store.set_extra(self.feature, key, value)
+
+    def sorted_segments(self):
+        return self.store.sorted_segments(self.feature)
+
+    def __iter__(self):
+        store = self.store
+        feature = self.feature
+        keys = []
+        if store.segment_count[feature]:
+            keys.append('location')
+        keys.extend(key for key, column in store.attributes.items() if column[feature] != ABSENT)
+        keys.extend(self.child_keys())
+        keys.extend(key for key in store.extras.get(feature, {}) if key not in keys)
+        return iter(keys)
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+
+def is_feature_group(value):
+    """ True for {feature_id: feature_dct} dictionaries """
+    return isinstance(value, dict) and bool(value) and all(isinstance(sub_value, dict) for sub_value in value.values())
+
+
+def to_plain_dict(dct):
+    """ nested dictionary copy of a view, the location tuples become lists as in the parsed dictionaries """
+    if isinstance(dct, Mapping):
+        return {key: to_plain_dict(value) for key, value in dct.items()}
+    if isinstance(dct, tuple):
+        return [to_plain_dict(value) for value in dct]
+    return dct
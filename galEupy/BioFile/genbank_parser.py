@@ -1,5 +1,9 @@
 import re
-from collections import defaultdict, OrderedDict
+from collections import defaultdict, deque, namedtuple, OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+import io
+import mmap
+import os
 import sys, json
 import logging
 _logger = logging.getLogger("galEupy.BioFile.genbank_parser")
@@ -8,96 +12,256 @@ def default_dct_structure():
     return defaultdict(default_dct_structure)
 
 
+# line prefixes the reader switches state on
+LOCUS_PREFIX = 'LOCUS '
+FEATURES_PREFIX = 'FEATURES '
+ORIGIN_PREFIX = 'ORIGIN'
+END_PREFIX = '//'
+GENE_PREFIX = ' ' * 5 + 'gene'
+
+# characters removed from the ORIGIN lines: base numbers and spaces
+ORIGIN_DELETE = '0123456789 \t\r\n'
+ORIGIN_TABLE = str.maketrans('', '', ORIGIN_DELETE)
+ORIGIN_DELETE_BYTES = ORIGIN_DELETE.encode()
+
+LOCUS_PREFIX_BYTES = LOCUS_PREFIX.encode()
+LOCUS_LINE_BYTES = b'\n' + LOCUS_PREFIX_BYTES
+# bytes of GenBank records a worker process parses at a time
+RANGE_CHUNK_SIZE = 16 * 1024 ** 2
+
+# feature table grammar: a key at column 6, qualifiers and continuation lines at column 22
+FEATURE_KEY_INDENT = ' ' * 5
+FEATURE_QUALIFIER_INDENT = ' ' * 21
+FEATURE_KEY = re.compile(r' {5}(\w+)')
+# a location segment: start..end, start^end or a single base, with the < > partial markers.
+# Segments of other entries (ACCESSION.1:1..100) are not matched
+LOCATION_SEGMENT = re.compile(r'(?<![\w.:])([<>]?)(\d+)(?:(?:\.\.|\^)([<>]?)(\d+))?(?![\w.:])')
+
+# CDS products are matched to the rna products on the text from this word on
+VARIANT = 'variant'
+
+GenBankLocus = namedtuple('GenBankLocus', ['name', 'header', 'features', 'sequence'])
+FeatureLocation = namedtuple('FeatureLocation', ['segments', 'strand', 'partial_start', 'partial_end'])
+
+
+class GenBankReader:
+    """
+    Streams the LOCUS records of a GenBank file. The reader is a state machine over the lines,
+    only the header, the current gene block and the sequence of one record are held in memory.
+    Iterating over it yields a GenBankLocus per record.
+    """
+    OUTSIDE, HEADER, FEATURES, SEQUENCE = range(4)
+
+    def __init__(self, fp_in):
+        """
+        parameters
+        ----------
+        fp_in: file object
+            GenBank file opened with open_input_file, str lines are accepted as well
+        """
+        self.fp_in = fp_in
+        # rna ids and products are matched across records
+        self.transcript_id_dct = TranscriptIndex()
+        self.product_dct = ProductIndex()
+        self.locus_count = 0
+
+    def __iter__(self):
+        return self.loci()
+
+    def loci(self):
+        state = self.OUTSIDE
+        header_lines = []
+        gene_lines = []
+        dna_array = []
+        end_prefix = END_PREFIX
+        header = None
+        locus_dct = None
+        for data in self.fp_in:
+            if state == self.SEQUENCE:
+                # sequence lines stay undecoded until the record is complete
+                if data.startswith(end_prefix):
+                    yield self.locus(header, locus_dct, dna_array)
+                    dna_array = []
+                    state = self.OUTSIDE
+                elif end_prefix is END_PREFIX:
+                    dna_array.append(data.translate(ORIGIN_TABLE))
+                else:
+                    dna_array.append(data.translate(None, ORIGIN_DELETE_BYTES))
+                continue
+
+            raw_data = data
+            if type(data) == bytes:
+                data = data.decode()
+
+            if data.startswith(LOCUS_PREFIX):
+                header_lines = [data]
+                state = self.HEADER
+            elif state == self.HEADER:
+                header_lines.append(data)
+                if data.startswith(FEATURES_PREFIX):
+                    header = HeaderScan(header_lines)
+                    header_lines = []
+                    locus_dct = default_dct_structure()
+                    gene_lines = []
+                    state = self.FEATURES
+            elif state == self.FEATURES:
+                if data.startswith(GENE_PREFIX):
+                    self.process_gene_lines(gene_lines, locus_dct, header.Name)
+                    gene_lines = [data]
+                elif data.startswith(ORIGIN_PREFIX):
+                    # the ORIGIN line closes the last feature of the block
+                    gene_lines.append(data)
+                    self.process_gene_lines(gene_lines, locus_dct, header.Name)
+                    gene_lines = []
+                    end_prefix = END_PREFIX if raw_data is data else END_PREFIX.encode()
+                    state = self.SEQUENCE
+                elif data.startswith(END_PREFIX):
+                    # record without a sequence
+                    gene_lines.append(data)
+                    self.process_gene_lines(gene_lines, locus_dct, header.Name)
+                    gene_lines = []
+                    yield self.locus(header, locus_dct, dna_array)
+                    state = self.OUTSIDE
+                else:
+                    gene_lines.append(data)
+
+    def process_gene_lines(self, gene_lines, locus_dct, locus_name):
+        if gene_lines:
+            _, self.transcript_id_dct, self.product_dct = process_single_gene_data(
+                gene_lines, self.transcript_id_dct, locus_dct, locus_name, self.product_dct)
+
+    def locus(self, header, locus_dct, dna_array):
+        self.locus_count += 1
+        if dna_array and type(dna_array[0]) == bytes:
+            sequence_string = b''.join(dna_array).decode()
+        else:
+            sequence_string = ''.join(dna_array)
+        features = locus_dct[header.Name] if header.Name in locus_dct else {}
+        return GenBankLocus(header.Name, header, features, sequence_string)
+
+
 def get_data(fp_in):
-    dna_beg_pos = 0
-    data_store = []
-    locus_flag = 0
-    gene_flag = 0
-    gene_count = 0
+    """
+    returns the feature dictionary (locus -> features) and the sequence dictionary (locus -> sequence)
+    of a GenBank file
+    """
+    locus_dct = default_dct_structure()
     sequence_dct = {}
-    dna_array = []
+    for locus in GenBankReader(fp_in):
+        if locus.features:
+            locus_dct[locus.name] = locus.features
+        sequence_dct[locus.name] = locus.sequence
+    return locus_dct, sequence_dct
+
+
+def get_data_parallel(input_filename, workers, chunk_size=RANGE_CHUNK_SIZE):
+    """
+    get_data with the LOCUS records parsed by a process pool, the records are stitched back in file order
+    """
     locus_dct = default_dct_structure()
-    product_dct = default_dct_structure()
-    transcript_id_dct = {}
-    for i, data in enumerate(fp_in):
-        # This Part is for header part: start
-        if type(data) == bytes:
-            data = data.decode()
-
-        if re.match("^LOCUS ", data):
-            data_store = []
-            locus_flag = 1
-
-        if locus_flag == 1:
-            data_store.append(data)
-
-        if re.match("^FEATURES ", data):
-            locus_flag = 0
-            locus = HeaderScan(data_store)
-            data_store = []
-
-        # Parsing gene feature start
-        if re.match("^ {5}(gene)", data) and locus:
-            gene_count += 1
-            if gene_flag == 0:
-                gene_flag = 1
-            else:
-                locus_dct, transcript_id_dct, product_dct = process_single_gene_data(data_store, transcript_id_dct,
-                                                                                     locus_dct, locus.Name, product_dct)
-                data_store = []
-        if gene_flag == 1:
-            data_store.append(data)
-        # match the end of dna sequence
-        if re.match("^//\n", data):
-            sequence_string = ''.join(dna_array)
-            sequence_dct[locus.Name] = sequence_string
-            dna_array = []
-            dna_beg_pos = 0
-
-        if dna_beg_pos == 1:
-            data = re.sub(r'\d', "", data.rstrip())
-            data = re.sub(r' ', "", data)
-            dna_array.append(data)
-
-        # match the beginning of dna sequence
-        if re.match("^ORIGIN", data):
-            dna_beg_pos = 1
-            locus_dct, transcript_id_dct, product_dct = process_single_gene_data(data_store, transcript_id_dct,
-                                                                                 locus_dct, locus.Name, product_dct)
-
-            data_store = []
+    sequence_dct = {}
+    for locus in read_loci(input_filename, workers, chunk_size):
+        if locus.features:
+            locus_dct[locus.name] = locus.features
+        sequence_dct[locus.name] = locus.sequence
     return locus_dct, sequence_dct
 
 
-def process_single_gene_data(gene_data, transcript_id_dct, locus_dct, locus_name, product_dct):
-    feature_key_indent = 5
-    feature_qualifier_indent = 21
+def read_loci(input_filename, workers=1, chunk_size=RANGE_CHUNK_SIZE):
+    """
+    yields the GenBankLocus records of a file in file order.
+    parameters
+    ----------
+    input_filename: str or Path
+        uncompressed GenBank file
+    workers: int
+        number of processes, each one parses byte ranges of whole LOCUS records
+    chunk_size: int
+        approximate byte size of a range, a worker holds one range and its parsed records
+    In parallel mode the rna ids and products are matched within a range rather than the whole file,
+    they are only shared between records which reuse gene or transcript ids.
+    """
+    if workers <= 1:
+        file_handler = open_input_file(input_filename)
+        try:
+            yield from GenBankReader(file_handler)
+        finally:
+            file_handler.close()
+        return
+
+    byte_ranges = locus_byte_ranges(input_filename, chunk_size)
+    _logger.info(f"Parsing {len(byte_ranges)} GenBank byte ranges with {workers} processes")
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # a bounded window of ranges, the parsed records of the whole file never wait in memory
+        pending = deque()
+        for start, end in byte_ranges:
+            pending.append(executor.submit(parse_byte_range, input_filename, start, end))
+            if len(pending) >= workers * 2:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+def locus_byte_ranges(input_filename, chunk_size=RANGE_CHUNK_SIZE):
+    """
+    (start, end) byte offsets of runs of whole LOCUS records, each run is about chunk_size bytes or one record
+    """
+    file_size = os.path.getsize(input_filename)
+    if file_size == 0:
+        return []
+    with open(input_filename, 'rb') as fh, mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        offsets = [0] if mm[:len(LOCUS_PREFIX_BYTES)] == LOCUS_PREFIX_BYTES else []
+        position = mm.find(LOCUS_LINE_BYTES)
+        while position != -1:
+            offsets.append(position + 1)
+            position = mm.find(LOCUS_LINE_BYTES, position + 1)
+
+    if not offsets:
+        return []
+    byte_ranges = []
+    range_start = offsets[0]
+    for offset in offsets[1:]:
+        if offset - range_start >= chunk_size:
+            byte_ranges.append((range_start, offset))
+            range_start = offset
+    byte_ranges.append((range_start, file_size))
+    return byte_ranges
+
+
+def parse_byte_range(input_filename, start, end):
+    """ GenBankLocus records of a byte range, runs in the worker processes """
+    with open(input_filename, 'rb') as fh:
+        fh.seek(start)
+        data = fh.read(end - start)
+    return list(GenBankReader(io.BytesIO(data)))
 
-    feature_key_spacer = " " * feature_key_indent
-    key_regex = r"^" + feature_key_spacer + r"\w"
-    feature_key_flag = 0
-    feature = []
-    feature_store = []
-    for i, data in enumerate(gene_data):
-        if re.search(key_regex, data, re.IGNORECASE):
-            if feature_key_flag == 1:
-                feature_store.append(feature)
-                feature = [data]
-                if len(gene_data) == (i + 1):
-                    feature_store.append(feature)
-            else:
-                feature_key_flag = 1
-                feature.append(data)
-        elif len(gene_data) == (i + 1):
-            feature.append(data)
-            feature_store.append(feature)
-        else:
-            feature.append(data)
+
+def process_single_gene_data(gene_data, transcript_id_dct, locus_dct, locus_name, product_dct):
+    feature_store = tokenize_feature_lines(gene_data)
     locus_dct, transcript_id_dct, product_dct = single_gene_data_to_dict(feature_store, transcript_id_dct,
                                                                          locus_dct, locus_name, product_dct)
     return locus_dct, transcript_id_dct, product_dct
 
 
+def tokenize_feature_lines(gene_data):
+    """
+    splits the feature table lines of a gene into (feature key, feature lines) pairs. The feature lines are
+    the location text of the key line followed by the stripped qualifier lines, other lines are skipped
+    """
+    feature_store = []
+    feature_lines = None
+    for line in gene_data:
+        if line.startswith(FEATURE_QUALIFIER_INDENT):
+            if feature_lines is not None:
+                feature_lines.append(line[21:].strip())
+        elif line.startswith(FEATURE_KEY_INDENT):
+            match_obj = FEATURE_KEY.match(line)
+            if match_obj:
+                feature_lines = [line[match_obj.end():].strip()]
+                feature_store.append((match_obj.group(1), feature_lines))
+    return feature_store
+
+
 def single_gene_data_to_dict(feature_store, transcript_id_dct, locus_dct, locus_name, product_dct):
     dct = convert_gene_record_to_dictionary_format(feature_store)
 
@@ -154,8 +318,7 @@ def single_gene_data_to_dict(feature_store, transcript_id_dct, locus_dct, locus_
 
 def convert_gene_record_to_dictionary_format(feature_store):
     dct = OrderedDict()
-    for i, data in enumerate(feature_store):
-        (feature_key, feature_line) = get_feature_key_qualifier(data)
+    for feature_key, feature_line in feature_store:
         if feature_key in dct:
             dct[feature_key].append(feature_line)
         else:
@@ -269,7 +432,7 @@ def process_gff_cds_type3_data(gb_dct, gene_dct, prev_gene_id, product_dct, locu
 # CDS linked to mRNAs
     # cds count = n and m_rna count = n
 
-    cds_product_dct = defaultdict(list)
+    product_matchers = {}
     feature = 'CDS'
 
     for i in range(len(gb_dct[feature])):
@@ -279,14 +442,12 @@ def process_gff_cds_type3_data(gb_dct, gene_dct, prev_gene_id, product_dct, locu
             gene_id = prev_gene_id
 
         if 'product' in qualifier_dct:
-            product_name = qualifier_dct['product']
-            cds_product_dct[gene_id].append(product_name)
+            if gene_id not in product_matchers:
+                product_matchers[gene_id] = ProductMatcher(product_dct[gene_id])
+            matched_id = product_matchers[gene_id].match(qualifier_dct['product'])
 
-            cds_rna_match_dct = find_associated_id_using_string_comparision(product_dct[gene_id],
-                                                                            cds_product_dct[gene_id])
-
-            if product_name in cds_rna_match_dct:
-                transcript_id = cds_rna_match_dct[product_name]
+            if matched_id is not None:
+                transcript_id = matched_id
                 gene_dct = add_cds_data_to_dictionary(gene_dct, qualifier_dct, gene_id, transcript_id,
                                                       location, locus_name)
 
@@ -330,13 +491,148 @@ def find_gene_id_and_transcript_id(qualifier_dct, transcript_id_dct, m_rna_id=No
 
     if transcript_id in transcript_id_dct:
         if transcript_id_dct[transcript_id] != gene_id:
-            for transcript_key, gene_value in transcript_id_dct.items():
-                if gene_value == gene_id:
-                    transcript_id = transcript_key
+            # the id belongs to another gene, use the last transcript of this gene
+            if isinstance(transcript_id_dct, TranscriptIndex):
+                gene_transcript = transcript_id_dct.last_transcript(gene_id)
+                if gene_transcript is not None:
+                    transcript_id = gene_transcript
+            else:
+                for transcript_key, gene_value in transcript_id_dct.items():
+                    if gene_value == gene_id:
+                        transcript_id = transcript_key
 
     return gene_id, transcript_id
 
 
+class TranscriptIndex(dict):
+    """
+    transcript id -> gene id dictionary with a reverse index, the last transcript (in dictionary order)
+    of a gene is looked up without a scan
+    """
+    def __init__(self):
+        dict.__init__(self)
+        self.rank = {}
+        self.gene_transcripts = defaultdict(dict)
+        self.gene_last = {}
+
+    def __setitem__(self, transcript_id, gene_id):
+        if transcript_id in self:
+            previous_gene_id = dict.__getitem__(self, transcript_id)
+            if previous_gene_id == gene_id:
+                return
+            self.unlink(previous_gene_id, transcript_id)
+        else:
+            self.rank[transcript_id] = len(self.rank)
+        dict.__setitem__(self, transcript_id, gene_id)
+        self.link(gene_id, transcript_id)
+
+    def link(self, gene_id, transcript_id):
+        rank = self.rank[transcript_id]
+        self.gene_transcripts[gene_id][transcript_id] = rank
+        last_id = self.gene_last.get(gene_id)
+        if last_id is None or rank > self.rank[last_id]:
+            self.gene_last[gene_id] = transcript_id
+
+    def unlink(self, gene_id, transcript_id):
+        transcripts = self.gene_transcripts[gene_id]
+        del transcripts[transcript_id]
+        if self.gene_last[gene_id] == transcript_id:
+            if transcripts:
+                self.gene_last[gene_id] = max(transcripts, key=transcripts.get)
+            else:
+                del self.gene_last[gene_id]
+
+    def last_transcript(self, gene_id):
+        return self.gene_last.get(gene_id)
+
+
+class ProductIndex(dict):
+    """ gene id -> GeneProducts, missing genes are added on lookup like the nested defaultdict """
+    def __missing__(self, gene_id):
+        value = self[gene_id] = GeneProducts()
+        return value
+
+
+class GeneProducts(dict):
+    """
+    rna product -> transcript id of a gene. variant_index keeps the text from each 'variant' of a product
+    to the end, the CDS products are matched on it
+    """
+    def __init__(self):
+        dict.__init__(self)
+        self.variant_index = {}
+
+    def __setitem__(self, product, transcript_id):
+        dict.__setitem__(self, product, transcript_id)
+        index_variants(self.variant_index, product)
+
+
+def index_variants(variant_index, product):
+    position = product.find(VARIANT)
+    while position != -1:
+        variant_index[product[position:]] = product
+        position = product.find(VARIANT, position + 1)
+
+
+class ProductMatcher:
+    """
+    Matches the CDS products of a gene to its rna products, one CDS at a time. A CDS product matches
+    the same rna product, the product with 'isoform' read as 'variant', or the rna product ending
+    with the same 'variant ...' text. When exactly one CDS product is unmatched, it takes the
+    last unmatched rna product
+    """
+    def __init__(self, rna_products):
+        """
+        parameters
+        ----------
+        rna_products: dict
+            rna product -> transcript id of a gene (GeneProducts or a plain dictionary)
+        """
+        self.rna_products = rna_products
+        self.variant_index = getattr(rna_products, 'variant_index', None)
+        if self.variant_index is None:
+            self.variant_index = {}
+            for product in rna_products:
+                index_variants(self.variant_index, product)
+        self.cds_count = 0
+        self.matched = {}
+
+    def rna_product(self, cds_product):
+        if cds_product in self.rna_products:
+            return cds_product
+        variant_product = cds_product.replace('isoform', VARIANT)
+        if variant_product in self.rna_products:
+            return variant_product
+        position = variant_product.find(VARIANT)
+        if position == -1:
+            return None
+        variant = variant_product[position:]
+        if variant in self.variant_index:
+            return self.variant_index[variant]
+        matched_product = None
+        for product in self.rna_products:
+            if variant in product:
+                matched_product = product
+        return matched_product
+
+    def match(self, cds_product):
+        """ transcript id of a CDS product, None when it can not be matched """
+        self.cds_count += 1
+        rna_product = self.rna_product(cds_product)
+        if rna_product is not None:
+            self.matched[cds_product] = rna_product
+        unmatched_count = self.cds_count - len(self.matched)
+
+        if rna_product is not None:
+            return self.rna_products[rna_product] if unmatched_count <= 1 else None
+        if unmatched_count == 1 and cds_product:
+            matched_products = set(self.matched.values())
+            for product in reversed(self.rna_products):
+                if product not in matched_products:
+                    return self.rna_products[product]
+        return None
+
+
 def extract_feature_record(feature_key, feature_array):
     (feature_key, location, feature_qualifier) = process_single_feature_data(feature_key, feature_array)
     (location, strand) = parse_location(location)
@@ -347,52 +643,9 @@ def extract_feature_record(feature_key, feature_array):
     return qualifier_dct, location, strand, start_loc, end_loc
 
 
-def find_associated_id_using_string_comparision(dct, string_list):
-    match_dct = {}
-    # match[cds_product] = m_rna_product
-    for data in string_list:
-        if data in dct:
-            match_dct[data] = data
-        else:
-            data1 = data.replace('isoform', 'variant')
-            if data1 in dct:
-                match_dct[data] = data1
-            else:
-                string_finder = 'variant'
-                m = re.search(string_finder, data1)
-                if m:
-                    string_matcher = data1[data1.index(string_finder):]
-                    # print(string_matcher)
-                    for key, value in dct.items():
-                        if string_matcher in key:
-                            match_dct[data] = key
-
-    result_dct = {}
-    length_diff = len(string_list) - len(match_dct)
-    if length_diff == 0:
-        for key, value in match_dct.items():
-            result_dct[key] = dct[value]
-    elif length_diff == 1:
-        # find missing id in string_list
-        missed_cds_id = ''
-        for data in string_list:
-            if data in match_dct:
-                result_dct[data] = dct[match_dct[data]]
-            else:
-                missed_cds_id = data
-        # find missing string in match_dct
-        if missed_cds_id:
-            for key, value in dct.items():
-                if key not in match_dct.values():
-                    result_dct[missed_cds_id] = value
-    else:
-        pass
-        # print("Check the gene details")
-
-    return result_dct
-
-
 def get_start_end_location(location_list):
+    if not location_list:
+        return None, None
     start_location = location_list[0][0]
     end_location = location_list[-1][-1]
 
@@ -432,26 +685,11 @@ def transform_qualifier_dct(feature_qualifier):
 
 
 def get_feature_key_qualifier(data_array):
-    feature_ley_indent = 5
-    feature_qualifier_indent = 21
-    feature_key_space = " " * feature_ley_indent
-    feature_qualifier_space = " " * feature_qualifier_indent
-
-    feature_key = ''
-    feature_lines = []
-
-    try:
-        for line in data_array:
-            match_obj = re.match(r' {5}(\w+)', line, re.M | re.I)
-            if match_obj:
-                feature_key = match_obj.group(1)
-                line = re.sub(r' +\w+ +', '', line)
-                feature_lines.append(line.strip())
-            if line[:feature_qualifier_indent] == feature_qualifier_space and (line != ''):
-                feature_lines.append(line[feature_qualifier_indent:].strip())
-        return feature_key, feature_lines
-    except StopIteration:
-        raise ValueError("Problem with feature:\n%s" % ("\n".join(data_array)))
+    """ feature key and feature lines of the lines of one feature """
+    feature_store = tokenize_feature_lines(data_array)
+    if not feature_store:
+        return '', []
+    return feature_store[0]
 
 
 def process_single_feature_data(feature_key, data_array):
@@ -486,8 +724,7 @@ def process_single_feature_data(feature_key, data_array):
                     value_list = [value]
                     while value_list[-1][-1] != '"':
                         value_list.append(next(iterator))
-                    value = '\n'.join(value_list)
-                    value = re.sub('"', '', value)
+                    value = '\n'.join(value_list).replace('"', '')
                     qualifiers.append((key, value))
                 else:
                     qualifiers.append((key, value))
@@ -505,32 +742,29 @@ def process_single_feature_data(feature_key, data_array):
 
 
 def parse_location(location):
-    location_array = []
-    _re_complement = re.compile(r"complement")
-    _re_join = re.compile(r"join")
-    _re_substitute = re.compile('[^0-9.,]')
-
-    complement = _re_complement.search(location)
-    if complement:
-        stand = "-"
-    else:
-        stand = "+"
-    join = _re_join.search(location)
-
-    if join:
-        # loc = re.sub(r'[^0-9\.,]', '', location)
-        loc = _re_substitute.sub(r'', location)
-        tmp = re.split(",", loc)
-        for loc in tmp:
-            val = re.split("\.\.", loc)
-            location_array.append(val)
-    else:
-        # loc = re.sub(r'[^0-9\.,]', '', location)
-        loc = _re_substitute.sub(r'', location)
-        tmp = re.split("\.\.", loc)
-        location_array.append(tmp)
-
-    return location_array, stand
+    """
+    integer segments and strand of a location: [(start, end), ...] for ranges, [(base,)] for a single base
+    """
+    feature_location = parse_feature_location(location)
+    return feature_location.segments, feature_location.strand
+
+
+def parse_feature_location(location):
+    """
+    FeatureLocation of a location string, join(), order() and complement() are resolved.
+    partial_start and partial_end mark a < or > in the location
+    """
+    strand = "-" if "complement" in location else "+"
+    segments = []
+    partial_start = partial_end = False
+    for start_mark, start, end_mark, end in LOCATION_SEGMENT.findall(location):
+        if end:
+            segments.append((int(start), int(end)))
+        else:
+            segments.append((int(start),))
+        partial_start = partial_start or start_mark == '<' or end_mark == '<'
+        partial_end = partial_end or start_mark == '>' or end_mark == '>'
+    return FeatureLocation(segments, strand, partial_start, partial_end)
 
 
 def open_input_file(input_filename):
@@ -1,4 +1,5 @@
 import re
+import gc
 from collections import defaultdict, OrderedDict
 import logging
 _logger = logging.getLogger("galEupy.BioFile.gff_parser")
@@ -8,6 +9,14 @@ def dct_structure():
     return defaultdict(dct_structure)
 
 
+def nested_dct(dct):
+    """ dct_structure copy of a nested dictionary """
+    nested = dct_structure()
+    for key, value in dct.items():
+        nested[key] = nested_dct(value) if isinstance(value, dict) else value
+    return nested
+
+
 class ReadGFF3:
     def __init__(self, gff_file):
         self.gff_file = gff_file
@@ -194,7 +203,295 @@ class ReadGFF3:
 
         return dct, gene_id_dct
 
-    
+
+class StreamGFF3(ReadGFF3):
+    """
+    Single pass GFF3 reader.
+
+    Each line is split once and its attribute column is parsed once; the
+    feature dictionary is identical to the one produced by ReadGFF3.reader
+    """
+    gene_features = frozenset(['gene', 'pseudogene'])
+    rna_features = frozenset(['mrna', 'rrna', 'trna'])
+    lookup_features = frozenset(['pseudogene', 'gene', 'mrna', 'trna', 'rrna', 'cds', 'exon', 'transcript'])
+
+    def __init__(self, gff_file):
+        ReadGFF3.__init__(self, gff_file)
+        self.line_count = 0
+        self._contig_names = {}
+        self._rna_cache = None
+
+    def records(self):
+        """
+        yields (contig, feature, cols, attribute_dct) for the GFF lines used by the GAL model,
+        feature is the lower case feature type of column 3
+        """
+        lookup_features = self.lookup_features
+        self.line_count = 0
+        with open(self.gff_file, 'r', encoding="utf-8") as read_fh:
+            for line in read_fh:
+                self.line_count += 1
+                if line[:1] == '#':
+                    continue
+                cols = line.rstrip().split('\t')
+                if len(cols) < 8:
+                    continue
+                feature = cols[2].lower()
+                if feature not in lookup_features:
+                    continue
+                if len(cols) == 8:
+                    cols.append('')
+                yield self.contig_name(cols[0]), feature, cols, parse_attribute_column(cols[8])
+
+    def contig_name(self, seq_id):
+        """ first word of the seqid column, cached for each seqid """
+        try:
+            return self._contig_names[seq_id]
+        except KeyError:
+            match_obj = re.search(r'^(\S+) (.*)', seq_id)
+            contig = match_obj.group(1) if match_obj else seq_id
+            self._contig_names[seq_id] = contig
+            return contig
+
+    def reader(self):
+        """
+            This function takes gff file as input and return a dictionary of the gff file
+        """
+        dct = dct_structure()
+        gene_id_dct = dct_structure()
+
+        # the feature dictionary has no reference cycles, the cyclic garbage collector only slows the parsing
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            self.read_records(dct, gene_id_dct)
+        finally:
+            if gc_enabled:
+                gc.enable()
+        return dct
+
+    def read_records(self, dct, gene_id_dct):
+        self._rna_cache = None
+        for source, feature, cols, attribute_dct in self.records():
+            self.add_record(dct, gene_id_dct, source, feature, cols, attribute_dct)
+
+    def add_record(self, dct, gene_id_dct, source, feature, cols, attribute_dct):
+        if feature == 'cds':
+            self.add_cds(dct, gene_id_dct, source, cols, attribute_dct)
+        elif feature == 'exon':
+            self.add_exon(dct, gene_id_dct, source, cols, attribute_dct)
+        else:
+            # gene and rna lines can change the entry a cds/exon line resolves to
+            self._rna_cache = None
+            if feature in self.gene_features:
+                self.add_gene(dct, source, feature, cols, attribute_dct)
+            elif feature in self.rna_features or attribute_dct:
+                self.add_rna(dct, gene_id_dct, feature, cols, attribute_dct)
+            else:
+                self.add_augustus_transcript(dct, gene_id_dct, cols)
+
+    def contigs(self, reopen):
+        """
+        yields (contig, feature dictionary) of each contig once the lines of the next contig start, so only the
+        dictionary of one contig exists at a time. The dictionary is the one reader() builds for the contig.
+        parameters
+        ----------
+        reopen: callable
+            returns the feature dictionary of a contig yielded before, for a contig whose lines continue after
+            another contig (e.g. FeatureStore.pop_contig), the contig is then yielded again as a whole
+        """
+        dct = dct_structure()
+        gene_id_dct = dct_structure()
+        yielded = set()
+        current = None
+        self._rna_cache = None
+        # the garbage collector is off while the lines are read, and on while the consumer has a contig
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            for source, feature, cols, attribute_dct in self.records():
+                if source != current:
+                    yielded.update(dct)
+                    yield from self.pop_contigs(dct, gc_enabled)
+                    gene_id_dct.clear()
+                    self._rna_cache = None
+                    current = source
+                    if source in yielded:
+                        _logger.debug(f"{source}: the lines of the contig continue after another contig")
+                        self.restore_contig(dct, gene_id_dct, source, reopen(source))
+                self.add_record(dct, gene_id_dct, source, feature, cols, attribute_dct)
+            yield from self.pop_contigs(dct, gc_enabled)
+        finally:
+            if gc_enabled:
+                gc.enable()
+
+    @staticmethod
+    def pop_contigs(dct, gc_enabled):
+        """ yields and removes the contigs of dct, the garbage collector is enabled again during each yield """
+        for contig in list(dct):
+            contig_dct = dct.pop(contig)
+            if gc_enabled:
+                gc.enable()
+            try:
+                yield contig, contig_dct
+            finally:
+                gc.disable()
+
+    @staticmethod
+    def restore_contig(dct, gene_id_dct, contig, contig_dct):
+        """ puts a contig dictionary back into dct and the rna -> gene entries of its rnas into gene_id_dct """
+        if not contig_dct:
+            return
+        dct[contig] = nested_dct(contig_dct)
+        for gene_type in ('gene', 'pseudogene'):
+            for gene_id, gene_dct in contig_dct.get(gene_type, {}).items():
+                for rna_type, rna_group in gene_dct.items():
+                    if rna_type == 'location' or not isinstance(rna_group, dict):
+                        continue
+                    for rna_id in rna_group:
+                        gene_id_dct[contig][rna_id] = {'ID': gene_id, 'FeatureType': rna_type}
+
+    def add_gene(self, dct, source, feature, cols, attribute_dct):
+        if not attribute_dct:
+            gene_id = cols[8]
+        elif GffAttribute.id in attribute_dct:
+            gene_id = attribute_dct[GffAttribute.id]
+        else:
+            raise Exception('Please check your Gff file')
+
+        if feature == 'pseudogene':
+            self.pseudo_gene_id_dct[gene_id] = feature
+
+        gene_dct = dct[source][feature][gene_id]
+        location = [cols[3], cols[4], cols[6]]
+        if 'location' in gene_dct:
+            gene_dct['location'].append(location)
+        else:
+            gene_dct['location'] = [location]
+
+    def add_rna(self, dct, gene_id_dct, rna_type, cols, attribute_dct):
+        contig = cols[0]
+        rna_id = attribute_dct.get(GffAttribute.id)
+        if GffAttribute.parent not in attribute_dct or not rna_id:
+            return
+
+        gene_id = attribute_dct[GffAttribute.parent]
+        gene_id_dct[contig][rna_id] = {'ID': gene_id, 'FeatureType': rna_type}
+
+        location = [cols[3], cols[4], cols[6]]
+        is_pseudogene = gene_id in self.pseudo_gene_id_dct
+        gene_feature = 'pseudogene' if is_pseudogene else 'gene'
+        rna_dct = dct[contig][gene_feature][gene_id][rna_type][rna_id]
+        if 'location' in rna_dct:
+            rna_dct['location'].append(location)
+            # ReadGFF3 keeps the product of a gene's rna only from its first line
+            if not is_pseudogene:
+                return
+        else:
+            rna_dct['location'] = [location]
+
+        if GffAttribute.product in attribute_dct:
+            rna_dct['product'] = attribute_dct[GffAttribute.product]
+
+    @staticmethod
+    def add_augustus_transcript(dct, gene_id_dct, cols):
+        source = cols[0]
+        rna_id = cols[8]
+        gene_id = rna_id.split('.')[0]
+        gene_id_dct[source][rna_id] = gene_id
+
+        rna_dct = dct[source]['gene'][gene_id]['mrna'][rna_id]
+        if 'location' in rna_dct:
+            rna_dct['location'].append([cols[3], cols[4]])
+        else:
+            rna_dct['location'] = [[cols[3], cols[4]]]
+
+    @staticmethod
+    def parent_ids(attribute_dct, gene_id_dct, contig):
+        """ returns the gene id (super parent) and rna id (parent) of a cds/exon line """
+        super_parent_id, parent_id = None, None
+        if GffAttribute.parent in attribute_dct:
+            parent_id = attribute_dct[GffAttribute.parent]
+            contig_rna_dct = gene_id_dct.get(contig)
+            if contig_rna_dct is not None and parent_id in contig_rna_dct:
+                rna_entry = contig_rna_dct[parent_id]
+                super_parent_id = rna_entry['ID'] if isinstance(rna_entry, dict) else rna_entry
+        elif 'transcript_id' in attribute_dct:
+            parent_id = attribute_dct['transcript_id']
+            super_parent_id = attribute_dct.get('gene_id')
+
+        return super_parent_id, parent_id
+
+    def add_cds(self, dct, gene_id_dct, source, cols, attribute_dct):
+        super_parent_id, parent_id = self.parent_ids(attribute_dct, gene_id_dct, source)
+        mrna_entry = self.cached_rna_entry('cds', source, super_parent_id, parent_id)
+        if mrna_entry is None:
+            contig_dct = dct[source]
+            gene_type = 'gene'
+            if 'pseudogene' in contig_dct and super_parent_id in contig_dct['pseudogene']:
+                gene_type = 'pseudogene'
+            mrna_entry = contig_dct[gene_type][super_parent_id]['mrna'][parent_id]
+            self._rna_cache = ('cds', source, super_parent_id, parent_id, mrna_entry)
+
+        cds_id = attribute_dct.get(GffAttribute.id)
+        protein_id = attribute_dct.get('protein_id')
+        if 'cds' not in mrna_entry:
+            mrna_entry['cds'] = {'ID': cds_id, 'protein_id': protein_id, 'location': []}
+        else:
+            cds_dct = mrna_entry['cds']
+            cds_dct['ID'] = cds_id or cds_dct.get('ID')
+            cds_dct['protein_id'] = protein_id or cds_dct.get('protein_id')
+        mrna_entry['cds']['location'].append([cols[3], cols[4]])
+
+    def add_exon(self, dct, gene_id_dct, source, cols, attribute_dct):
+        super_parent_id, parent_id = self.parent_ids(attribute_dct, gene_id_dct, source)
+        if super_parent_id is None or parent_id is None:
+            return
+
+        mrna_entry = self.cached_rna_entry('exon', source, super_parent_id, parent_id)
+        if mrna_entry is None:
+            rna_entry = gene_id_dct[source].get(parent_id)
+            rna_type = rna_entry['FeatureType'] if isinstance(rna_entry, dict) else 'mrna'
+            gene_type = 'pseudogene' if super_parent_id in self.pseudo_gene_id_dct else 'gene'
+            mrna_entry = dct[source][gene_type][super_parent_id][rna_type][parent_id]
+            self._rna_cache = ('exon', source, super_parent_id, parent_id, mrna_entry)
+
+        exon_id = attribute_dct.get(GffAttribute.id)
+        if 'exon' not in mrna_entry:
+            mrna_entry['exon'] = {'ID': exon_id, 'protein_id': mrna_entry.get('product', None), 'location': []}
+        else:
+            mrna_entry['exon']['ID'] = exon_id or mrna_entry['exon'].get('ID')
+        mrna_entry['exon']['location'].append([cols[3], cols[4]])
+
+    def cached_rna_entry(self, feature, source, super_parent_id, parent_id):
+        """ rna entry of the previous cds/exon line when it belongs to the same rna """
+        cache = self._rna_cache
+        if cache is not None and cache[0] == feature and cache[1] == source and cache[2] == super_parent_id \
+                and cache[3] == parent_id:
+            return cache[4]
+        return None
+
+
+def parse_attribute_column(attribute_string):
+    """
+    faster equivalent of parse_single_feature_line
+    """
+    attributes = {}
+    for key_value_pair in attribute_string.split(';'):
+        key, sep, value = key_value_pair.partition('=')
+        if sep:
+            value = value.rstrip()
+            if '=' in value:
+                value = value.replace('=', ' ')
+            attributes[key.lstrip().lower()] = value
+        elif ' ' in key_value_pair:
+            key_value_pair = key_value_pair.strip()
+            if ' ' in key_value_pair:
+                key, value = key_value_pair.split(" ", maxsplit=1)
+                attributes[key.lower()] = value.strip('"')
+    return attributes
+
+
 class GffAttribute:
     product = 'product'
     id = 'id'
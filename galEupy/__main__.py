@@ -3,6 +3,8 @@ import logging
 import pkg_resources
 from pathlib import Path
 from .app import App, BaseApp, OrganismApp
+from .batch import BatchUpload, DEFAULT_BATCH_JOBS, DEFAULT_BATCH_LOADS
+from .bulk_loader import DEFAULT_LOAD_CONNECTIONS
 import sys
 
 def main():
@@ -34,6 +36,22 @@ def main():
     parser.add_argument("-remove_db", "--remove_db", type=str2bool, nargs='?', const=True, default=False,
                         help='Removes the entire GAL related databases')
 
+    parser.add_argument("-no_cache", "--no-cache", dest='no_cache', action='store_true',
+                        help='Parse the FASTA and GFF3 input files again instead of reusing the parse cache')
+    parser.add_argument("-workers", "--workers", type=int, default=1,
+                        help='Number of processes parsing GenBank records and building the gene models (default: 1)')
+    parser.add_argument("-load_connections", "--load-connections", dest='load_connections', type=int,
+                        default=DEFAULT_LOAD_CONNECTIONS,
+                        help='Number of database connections loading the central dogma tables '
+                             f'(default: {DEFAULT_LOAD_CONNECTIONS})')
+    parser.add_argument("-batch", "--batch", type=Path, metavar='MANIFEST',
+                        help='Upload the organisms of a TSV or JSON manifest in parallel')
+    parser.add_argument("-batch_jobs", "--batch-jobs", dest='batch_jobs', type=int, default=DEFAULT_BATCH_JOBS,
+                        help=f'Number of organisms uploaded at a time with --batch (default: {DEFAULT_BATCH_JOBS})')
+    parser.add_argument("-batch_loads", "--batch-loads", dest='batch_loads', type=int, default=DEFAULT_BATCH_LOADS,
+                        help='Number of LOAD DATA statements running at a time over all the organisms of '
+                             f'--batch (default: {DEFAULT_BATCH_LOADS})')
+
     parser.add_argument('-v', '--verbose', type=str, default="info",
                         choices=["none", "debug", "info", "warning", "error", "d", "e", "i", "w"],
                         help="verbose level: debug, info (default), warning, error")
@@ -72,8 +90,15 @@ def main():
         org_app_obj.db_table_log()
         org_app_obj.remove_organism_record()
 
-    if args.upload:
-        app = App(db_config_file, path_config_file, org_config_file)
+    if args.batch:
+        batch_upload = BatchUpload(db_config_file, path_config_file, args.batch, jobs=args.batch_jobs,
+                                   loads=args.batch_loads, use_cache=not args.no_cache, workers=args.workers,
+                                   load_connections=args.load_connections)
+        batch_upload.run()
+
+    elif args.upload:
+        app = App(db_config_file, path_config_file, org_config_file, use_cache=not args.no_cache,
+                  workers=args.workers, load_connections=args.load_connections)
         app.upload_schema()
         if args.upload == 'all':
             app.process_central_dogma_annotation()
@@ -2,17 +2,25 @@ import sys
 import logging
 from pathlib import Path
 from .config_utility import ConfigFileHandler, DatabaseConfig, OrganismConf
-from .dbconnect import check_db_connection, Database, DatabaseCreate
-from .dbschema import database_schema, UploadSchema
+from .directory_utility import BaseUploadDirectory
+from .dbconnect import check_db_connection, connection_pool, DatabaseCreate, NamedLock
+from .dbschema import database_schema, UploadSchema, OrganismPartitions, RANGE_PARTITIONED_TABLES, \
+    PARTITION_LOCK_TIMEOUT
 from .BioFile import genbank_parser
+from .BioFile.feature_store import FeatureStore
+from .parse_cache import ParseCache
 from .processing_utility import fix_multiple_splicing_bugs, ModelGFFDict, AnnotationData
 from .taxomony import Taxonomy, DotsOrganism
 from .dbtable_utility import TableStatusID, UploadTableData
+from .bulk_loader import BulkLoadSession, DEFAULT_LOAD_CONNECTIONS
 from .process_tables import TableProcessUtility
 from .protein_annotation_utility import ProteinAnnotations
 from . import general_utility
 _logger = logging.getLogger("galEupy.app")
 
+# bases of the GenBank records whose gene models are built and written together
+GENBANK_BATCH_BASES = 64 * 1024 ** 2
+
 
 class BaseApp(DatabaseConfig):
     def __init__(self, db_config_file):
@@ -45,6 +53,9 @@ class BaseApp(DatabaseConfig):
 
         if schema_existence:
             _logger.debug('Database Schema already exist')
+            if not schema.check_index_usage():
+                _logger.warning("Organism queries scan whole tables, run an upload to add the missing indexes")
+            schema.close()
             return True
         else:
             _logger.debug('Database Schema is missing')
@@ -52,11 +63,10 @@ class BaseApp(DatabaseConfig):
 
     def db_table_log(self):
 
-        # db_name = DbNames(self.db_prefix)
-        db_conn = Database(self.host, self.db_username, self.db_password, self.db_name, 1, port=self.db_port)
-        table_stat = TableStatusID(db_conn)
-        table_stat.show_id_log()
-        table_stat.get_protein_feature_table_status()
+        with connection_pool(self).connection() as db_conn:
+            table_stat = TableStatusID(db_conn)
+            table_stat.show_id_log()
+            table_stat.get_protein_feature_table_status()
 
     def drop_databases(self):
         query_response = query_yes_no("Would you like to delete the database?")
@@ -77,20 +87,19 @@ class OrganismApp(BaseApp, OrganismConf):
         OrganismConf.__init__(self, org_config_file)
 
     def remove_organism_record(self):
-        # db_name = DbNames(self.db_prefix)
-        db_conn = Database(self.host, self.db_username, self.db_password, self.db_name, 1, port=self.db_port)
-        organism_obj = DotsOrganism(db_conn, self.organism, self.version)
-        organism_obj.remove_organism_record()
+        with connection_pool(self).connection() as db_conn:
+            organism_obj = DotsOrganism(db_conn, self.organism, self.version)
+            organism_obj.remove_organism_record()
 
     def get_organism_record(self):
-        # db_name = DbNames(self.db_prefix)
-        db_conn = Database(self.host, self.db_username, self.db_password, self.db_name, 1, port=self.db_port)
-        organism_obj = DotsOrganism(db_conn, self.organism, self.version)
-        organism_obj.get_organism_record()
+        with connection_pool(self).connection() as db_conn:
+            organism_obj = DotsOrganism(db_conn, self.organism, self.version)
+            organism_obj.get_organism_record()
 
 
 class App(ConfigFileHandler):
-    def __init__(self, db_config_file, path_config_file, org_config_file):
+    def __init__(self, db_config_file, path_config_file, org_config_file, use_cache=True, workers=1,
+                 load_connections=DEFAULT_LOAD_CONNECTIONS, upload_dir=None, load_slots=None):
         """ class constructor reads three configuration files
         parameters
         ---------
@@ -100,9 +109,32 @@ class App(ConfigFileHandler):
             path for path related configuration file
         org_config_file: basestring
             path for organism configuration file
+        use_cache: bool
+            reuse parsed FASTA/GFF3 input files from the parse cache of the upload directory, GenBank input
+            is streamed and not cached
+        workers: int
+            number of processes building the gene models
+        load_connections: int
+            number of connections loading the central dogma upload files
+        upload_dir: Path
+            upload directory used instead of the one of the path configuration
+        load_slots: Semaphore
+            shared limit of the LOAD DATA statements of concurrent uploads
 
         """
         ConfigFileHandler.__init__(self, db_config_file, path_config_file, org_config_file)
+        self.use_cache = use_cache
+        self.workers = workers
+        self.load_connections = load_connections
+        self.upload_dir = upload_dir
+        self.load_slots = load_slots
+
+    @property
+    def path_config(self):
+        path_config = ConfigFileHandler.path_config.fget(self)
+        if self.upload_dir is not None:
+            path_config.upload_dir = BaseUploadDirectory(self.upload_dir).upload_dir
+        return path_config
 
     @property
     def check_db_status(self):
@@ -123,96 +155,120 @@ class App(ConfigFileHandler):
     def process_central_dogma_annotation(self):
         _logger.debug("Started processing central dogma data")
 
-        app1 = CentralDogmaAnnotator(self.db_config, self.path_config, self.org_config)
-        _logger.debug(f"Annotation type: {app1.annotation_type}")
-
-        if app1.taxonomy_id_sres is None:
-            _logger.error(f"""There is no entry with the entered organism name: Please check the organism name
-            Entered organism name: {app1.org_config.organism}""")
-            app1.taxon_entries()
-
-        elif app1.organism_existence is False:
-            _logger.debug(f"Detected Datatype: {app1.annotation_type}")
-            if app1.annotation_type == 'GenBank_Annotation':
-                app1.process_genbank_annotation()
-                app1.update_organism_table()
-
-            if app1.annotation_type in ['Partial_Annotation', 'Minimal_Annotation']:
-                process_status = app1.process_partial_annotations()
-                if process_status:
-                    app1.update_organism_table()
-                    # app1.import_protein_annotation()
-                    _logger.info("Data processing successful")
-                    return True
-                else:
-                    _logger.info("Data upload failed")
+        with CentralDogmaAnnotator(self.db_config, self.path_config, self.org_config, self.use_cache, self.workers,
+                                   self.load_connections, self.load_slots) as app1:
+            _logger.debug(f"Annotation type: {app1.annotation_type}")
+
+            if app1.taxonomy_id_sres is None:
+                _logger.error(f"""There is no entry with the entered organism name: Please check the organism name
+                Entered organism name: {app1.org_config.organism}""")
+                app1.taxon_entries()
+                return False
+
+            # held while the organism is uploaded, a second upload of the same strain number is refused
+            lock_name = f"galEupy:{self.db_config.db_name}:{app1.taxonomy_id_sres}:{app1.org_version}"
+            with NamedLock(app1.db_connection, lock_name) as upload_lock:
+                if not upload_lock.acquired:
+                    _logger.error(f"{app1.org_name} strain number {app1.org_version} is uploaded by another process")
                     return False
 
-            if app1.annotation_type == 'No_Annotation':
-                _logger.error("Under development")
+                if not OrganismPartitions(app1.db_connection, app1.taxonomy_id_sres,
+                                          app1.org_version).check_strain_number():
+                    return False
+
+                if app1.organism_existence is False:
+                    _logger.debug(f"Detected Datatype: {app1.annotation_type}")
+                    if app1.annotation_type == 'GenBank_Annotation':
+                        if app1.process_genbank_annotation():
+                            app1.update_organism_table()
+                            return True
+                        else:
+                            _logger.info("Data upload failed")
+                            return False
+
+                    if app1.annotation_type in ['Partial_Annotation', 'Minimal_Annotation']:
+                        process_status = app1.process_partial_annotations()
+                        if process_status:
+                            app1.update_organism_table()
+                            # app1.import_protein_annotation()
+                            _logger.info("Data processing successful")
+                            return True
+                        else:
+                            _logger.info("Data upload failed")
+                            return False
+
+                    if app1.annotation_type == 'No_Annotation':
+                        _logger.error("Under development")
+            return False
 
     def import_protein_annotation(self):
         _logger.debug("Processing protein annotation data: start")
         random_string = general_utility.random_string(20)
-        app1 = CentralDogmaAnnotator(self.db_config, self.path_config, self.org_config)
-
-        if app1.taxonomy_id_sres is None:
-            _logger.error(f"""There is no entry with entered organism name: Please check the organism name
-            Entered organism name: {app1.org_config.organism}""")
-
-        elif app1.organism_existence:
-            taxonomy_id = app1.taxonomy_id_sres
-            org_version = app1.org_config.version
-            _logger.info("Preparing the protein annotation data")
-            protein_annotation_obj = ProteinAnnotations(app1.db_dots, app1.path_config, app1.org_config, random_string,
-                                                        taxonomy_id, org_version)
-            # protein_annotation_obj.create_protein_file(app1.taxonomy_id_sres, app1.org_config.version)
-
-            # # upload InterProScan data
-            # if app1.org_config.interproscan:
-            #     _logger.info("IntroProScan data is provided")
-            #     if app1.org_config.interproscan.exists():
-            #         _logger.info("Processing IntroProScan data")
-            #         protein_annotation_obj.parse_interproscan_data(app1.org_config.interproscan)
-            #     else:
-            #         _logger.error(f"Please check the path for InterProScan data\n Path: {app1.org_config.interproscan}")
-            # else:
-            #     _logger.info("IntroProScan data is not provided")
-
-            # # for SignalP
-            # if app1.org_config.signalp:
-            #     _logger.info("SignalP data is provided")
-            #     if app1.org_config.signalp.exists():
-            #         _logger.info("Processing SignalP data")
-            #         protein_annotation_obj.parse_signalp_result(app1.org_config.signalp)
-            #         protein_annotation_obj.upload_signalp_data()
-            # else:
-            #     _logger.info("SignalP data is not provided")
-
-            # # for tmhmm
-            # if app1.org_config.tmhmm:
-            #     _logger.info("tmhmm data is provided")
-            #     if app1.org_config.tmhmm.exists():
-            #         _logger.info("Processing tmhmm data")
-            #         protein_annotation_obj.parse_tmhmm_result(app1.org_config.tmhmm)
-            #         protein_annotation_obj.upload_tmhmm_data()
-            # else:
-            #     _logger.info("tmhmm data is not provided")
-
-            # Eggnog
-            if app1.org_config.eggnog:
-                _logger.info(f"eggnog data is provided: {app1.org_config.eggnog}")
-                if app1.org_config.eggnog.exists():
-                    _logger.info("Processing eggnog data")
-                    protein_annotation_obj.parse_eggnog_result(app1.org_config.eggnog)
-                    protein_annotation_obj.upload_eggnog_data()
-            else:
-                _logger.info("eggnog data is not provided")
+        with CentralDogmaAnnotator(self.db_config, self.path_config, self.org_config) as app1:
+            if app1.taxonomy_id_sres is None:
+                _logger.error(f"""There is no entry with entered organism name: Please check the organism name
+                Entered organism name: {app1.org_config.organism}""")
+
+            elif app1.organism_existence:
+                taxonomy_id = app1.taxonomy_id_sres
+                org_version = app1.org_config.version
+                _logger.info("Preparing the protein annotation data")
+                protein_annotation_obj = ProteinAnnotations(app1.db_dots, app1.path_config, app1.org_config,
+                                                            random_string, taxonomy_id, org_version)
+                # protein_annotation_obj.create_protein_file(app1.taxonomy_id_sres, app1.org_config.version)
+
+                # # upload InterProScan data
+                # if app1.org_config.interproscan:
+                #     _logger.info("IntroProScan data is provided")
+                #     if app1.org_config.interproscan.exists():
+                #         _logger.info("Processing IntroProScan data")
+                #         protein_annotation_obj.parse_interproscan_data(app1.org_config.interproscan)
+                #     else:
+                #         _logger.error(f"Please check the path for InterProScan data\n Path: {app1.org_config.interproscan}")
+                # else:
+                #     _logger.info("IntroProScan data is not provided")
+
+                # # for SignalP
+                # if app1.org_config.signalp:
+                #     _logger.info("SignalP data is provided")
+                #     if app1.org_config.signalp.exists():
+                #         _logger.info("Processing SignalP data")
+                #         protein_annotation_obj.parse_signalp_result(app1.org_config.signalp)
+                #         protein_annotation_obj.upload_signalp_data()
+                # else:
+                #     _logger.info("SignalP data is not provided")
+
+                # # for tmhmm
+                # if app1.org_config.tmhmm:
+                #     _logger.info("tmhmm data is provided")
+                #     if app1.org_config.tmhmm.exists():
+                #         _logger.info("Processing tmhmm data")
+                #         protein_annotation_obj.parse_tmhmm_result(app1.org_config.tmhmm)
+                #         protein_annotation_obj.upload_tmhmm_data()
+                # else:
+                #     _logger.info("tmhmm data is not provided")
+
+                # Eggnog
+                if app1.org_config.eggnog:
+                    _logger.info(f"eggnog data is provided: {app1.org_config.eggnog}")
+                    if app1.org_config.eggnog.exists():
+                        _logger.info("Processing eggnog data")
+                        # the chunks of the file are loaded while the rest of it is parsed
+                        with protein_annotation_obj.eggnog_loader(self.load_slots) as loader:
+                            protein_annotation_obj.parse_eggnog_result(app1.org_config.eggnog, loader)
+                            if not loader.commit():
+                                _logger.error("eggnog data upload failed")
+                                return False
+                else:
+                    _logger.info("eggnog data is not provided")
+                return True
+            return False
 
     def db_table_logs(self):
-        app1 = CentralDogmaAnnotator(self.db_config, self.path_config, self.org_config)
-        app1.show_id_log()
-        app1.get_protein_feature_table_status()
+        with CentralDogmaAnnotator(self.db_config, self.path_config, self.org_config) as app1:
+            table_stat = TableStatusID(app1.db_connection)
+            table_stat.show_id_log()
+            table_stat.get_protein_feature_table_status()
 
 
 class AnnotationCategory:
@@ -263,20 +319,41 @@ class AnnotationCategory:
                 return None
 
 
-class CentralDogmaAnnotator(AnnotationCategory, Taxonomy, TableStatusID):
-    def __init__(self, db_config, path_config, org_config):
+class CentralDogmaAnnotator(AnnotationCategory, Taxonomy):
+    def __init__(self, db_config, path_config, org_config, use_cache=False, workers=1,
+                 load_connections=DEFAULT_LOAD_CONNECTIONS, load_slots=None):
         AnnotationCategory.__init__(self, org_config, path_config)
 
         self.db_config = db_config
         self.org_config = org_config
         self.path_config = path_config
+        self.workers = workers
+        self.load_connections = load_connections
+        self.load_slots = load_slots
+        self.parse_cache = ParseCache(self.path_config.upload_dir) if use_cache else None
 
-        self.db_connection = Database(db_config.host, db_config.db_username, db_config.db_password, db_config.db_name,
-                                      1, port=db_config.db_port)
+        # borrowed from the connection pool of the process until close()
+        self.connection_pool = connection_pool(db_config)
+        self.db_connection = self.connection_pool.get()
 
         self.file_upload = UploadTableData(self.db_connection, self.path_config.upload_dir)
         Taxonomy.__init__(self, self.db_connection, org_config.organism, org_config.strain, org_config.assembly_version, org_config.version)
-        TableStatusID.__init__(self, self.db_connection)
+
+    def bulk_load_session(self):
+        """ bulk load mode of the central dogma loads, the loaded rows are checked against the organism """
+        return BulkLoadSession(self.db_connection, self.taxonomy_id_sres, self.org_version)
+
+    def close(self):
+        """ gives the connection back to the connection pool """
+        if self.db_connection is not None:
+            self.connection_pool.put(self.db_connection)
+            self.db_connection = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
 
     def process_genbank_annotation(self):
         _logger.info('Processing  GenBank type Data: start')
@@ -285,32 +362,78 @@ class CentralDogmaAnnotator(AnnotationCategory, Taxonomy, TableStatusID):
             file_path = self.org_config.config_file_path.parent.joinpath(file_path)
 
         if file_path.exists():
-            file_handler = genbank_parser.open_input_file(file_path)
-            (feature_dct, sequence_dct) = genbank_parser.get_data(file_handler)
-
-            feature_dct = fix_multiple_splicing_bugs(feature_dct)
-            model_gff_obj = ModelGFFDict(sequence_dct, feature_dct)
-            model_gff_dct = model_gff_obj.create_model_dct()
-
-            # (sequence_dct, feature_dct) = process_type1_data(org_config)
-            self.minimal_annotation_data(sequence_dct, feature_dct)
-            self.file_upload.upload_central_dogma_data()
+            with self.file_upload.central_dogma_loader(self.load_connections, self.load_slots,
+                                                       self.bulk_load_session()) as loader:
+                # GenBank input is always streamed, a cached parse would hold the whole file in memory again
+                self.stream_genbank_annotation(file_path, loader)
+                return loader.commit()
 
         else:
             _logger.error("File not found: {}".format(self.org_config.GenBank))
+            return False
+
+    def stream_genbank_annotation(self, file_path, loader=None):
+        """
+        writes the upload rows of the GenBank records while the file is read. The gene models are built
+        for batches of about GENBANK_BATCH_BASES bases, only one batch is held in memory.
+        The closed segments of the upload files are loaded by the loader meanwhile
+        """
+        gal_table = self.annotation_table(loader)
+        batch = []
+        batch_bases = 0
+        for locus in genbank_parser.read_loci(file_path, self.workers):
+            batch.append(locus)
+            batch_bases += len(locus.sequence)
+            if batch_bases >= GENBANK_BATCH_BASES:
+                self.upload_genbank_loci(gal_table, batch)
+                batch = []
+                batch_bases = 0
+        if batch:
+            self.upload_genbank_loci(gal_table, batch)
+        gal_table.close_files()
+        gal_table.release_id_blocks()
+
+    def upload_genbank_loci(self, gal_table, loci):
+        _logger.debug(f"GenBank records {loci[0].name} to {loci[-1].name} ({len(loci)})")
+        (feature_dct, sequence_dct) = self.genbank_feature_store(loci)
+        feature_dct = self.build_genbank_models(sequence_dct, feature_dct)
+        for scaffold, sequence in sequence_dct.items():
+            self.scaffold_annotation_data(gal_table, scaffold, sequence, feature_dct)
+            gal_table.next_segment()
+
+    def build_genbank_models(self, sequence_dct, feature_dct):
+        feature_dct = fix_multiple_splicing_bugs(feature_dct)
+        model_gff_obj = ModelGFFDict(sequence_dct, feature_dct, genetic_code=self.genetic_code,
+                                     workers=self.workers)
+        model_gff_obj.create_model_dct()
+        return feature_dct
+
+    @staticmethod
+    def genbank_feature_store(loci):
+        """ FeatureStore and sequence dictionary of GenBankLocus records, each locus is stored as it arrives """
+        feature_dct = FeatureStore()
+        sequence_dct = {}
+        for locus in loci:
+            if locus.features:
+                feature_dct.add_contig(locus.name, locus.features)
+            sequence_dct[locus.name] = locus.sequence
+        return feature_dct, sequence_dct
 
     def process_partial_annotations(self):
         _logger.info("Partial annotation step")
         random_string = general_utility.random_string(20)
 
-        annotation_obj = AnnotationData(self.org_config)
+        annotation_obj = AnnotationData(self.org_config, self.parse_cache, self.genetic_code, self.workers)
         feature_dct = annotation_obj.prepare_gal_model()
         fasta_contigs = list(annotation_obj.sequence_dct.keys())
         gff_contigs = list(feature_dct.keys())
         contig_names_compare = self.compare_contig_names(fasta_contigs, gff_contigs)
         if contig_names_compare:
-            self.minimal_annotation_data(annotation_obj.sequence_dct, feature_dct)
-            self.file_upload.upload_central_dogma_data()
+            with self.file_upload.central_dogma_loader(self.load_connections, self.load_slots,
+                                                       self.bulk_load_session()) as loader:
+                self.minimal_annotation_data(annotation_obj.sequence_dct, feature_dct, loader)
+                if not loader.commit():
+                    return False
             _logger.info("passed")
 
             return True
@@ -347,88 +470,55 @@ class CentralDogmaAnnotator(AnnotationCategory, Taxonomy, TableStatusID):
         _logger.debug(f"There are {len(common_contigs)} common contigs between FASTA and GFF file.\n\t FASTA file: {len(fasta_contigs)}, GFF file: {len(gff_contigs)}")
         return True
 
-    def minimal_annotation_data(self, sequence_dct, feature_dct):
+    def minimal_annotation_data(self, sequence_dct, feature_dct, loader=None):
+        gal_table = self.annotation_table(loader)
+        for scaffold, sequence in sequence_dct.items():
+            self.scaffold_annotation_data(gal_table, scaffold, sequence, feature_dct)
+            gal_table.next_segment()
+        gal_table.close_files()
+        gal_table.release_id_blocks()
 
+    def annotation_table(self, loader=None):
         taxonomy_id = self.taxonomy_id_sres
         _logger.info(f"Taxonomy_id: {taxonomy_id}")
 
-
-
-        gal_table = TableProcessUtility(self.db_connection, self.path_config.upload_dir, self.org_config.organism,
-                                        taxonomy_id, self.org_config.version)
+        partitions = OrganismPartitions(self.db_connection, taxonomy_id, self.org_config.version)
+        if partitions.enabled:
+            # blocks are reserved and partitioned one upload at a time, so the partitions follow the block order
+            with NamedLock(self.db_connection, f"galEupy:{self.db_connection.db}:partitions", PARTITION_LOCK_TIMEOUT):
+                gal_table = TableProcessUtility(self.db_connection, self.path_config.upload_dir,
+                                                self.org_config.organism, taxonomy_id, self.org_config.version,
+                                                RANGE_PARTITIONED_TABLES)
+                partitions.create(gal_table.id_allocators)
+        else:
+            gal_table = TableProcessUtility(self.db_connection, self.path_config.upload_dir, self.org_config.organism,
+                                            taxonomy_id, self.org_config.version)
         gal_table.show_id_log()
-        gal_table.increase_by_value(1)
-        for idx, (scaffold, sequence) in enumerate(sequence_dct.items()):
-            if scaffold in feature_dct:
-                scaffold_dct = feature_dct[scaffold]
-                gal_table.na_sequenceimp_scaffold(gal_table.NaSequenceId, scaffold, sequence)
-                scaffold_na_sequence_id = gal_table.NaSequenceId
-                gal_table.NaSequenceId += 1
-                for feature, scaffold_feature_dct in scaffold_dct.items():
-                    if feature == 'gene':
-                        for gene_id, gene_dct in scaffold_feature_dct.items():
-                            gal_table.process_gff_gene_data(scaffold, gene_id, gene_dct, scaffold_na_sequence_id)
-                            gal_table.NaSequenceId += 1
-                    elif feature == 'repeat_region':
-                        gal_table.process_repeat_data(feature, scaffold_feature_dct, scaffold_na_sequence_id)
-            else:
-                _logger.debug(f"Contig not found in the gff({idx}): {scaffold}")
-                gal_table.na_sequenceimp_scaffold(gal_table.NaSequenceId, scaffold, sequence)
-                scaffold_na_sequence_id = gal_table.NaSequenceId
-                gal_table.NaSequenceId += 1
+        gal_table.segment_loader = loader
+        if loader is not None and loader.session is not None:
+            # the rows of an upload that fails the validation are deleted by their IDs
+            loader.session.id_allocators = gal_table.id_allocators
+        return gal_table
 
-    def import_protein_annotation(self):
-        _logger.debug("Processing protein annotation data: start")
-        random_string = general_utility.random_string(20)
-
-        if self.organism_existence:
-            taxonomy_id = self.taxonomy_id_sres
-            org_version = self.org_config.version
-            _logger.info("Preparing the protein annotation data")
-            protein_annotation_obj = ProteinAnnotations(self.db_connection, self.path_config, self.org_config,
-                                                        random_string, taxonomy_id, org_version)
-            # upload InterProScan data
-            # if self.org_config.interproscan:
-            #     _logger.info("InterProScan data is provided")
-            #     if self.org_config.interproscan.exists():
-            #         _logger.info("Processing InterProScan data")
-            #         protein_annotation_obj.parse_interproscan_data(self.org_config.interproscan)
-            #     else:
-            #         _logger.error(f"Please check the path for InterProScan data\n Path: {self.org_config.interproscan}")
-            # else:
-            #     _logger.info("IntroProScan data is not provided")
-
-            # # for SignalP
-            # if self.org_config.signalp:
-            #     _logger.info("SignalP data is provided")
-            #     if self.org_config.signalp.exists():
-            #         _logger.info("Processing SignalP data")
-            #         protein_annotation_obj.parse_signalp_result(self.org_config.signalp)
-            #         protein_annotation_obj.upload_signalp_data()
-            # else:
-            #     _logger.info("SignalP data is not provided")
-
-            # if self.org_config.tmhmm:
-            #     _logger.info("tmhmm data is provided")
-            #     if self.org_config.tmhmm.exists():
-            #         _logger.info("Processing tmhmm data")
-            #         protein_annotation_obj.parse_tmhmm_result(self.org_config.tmhmm)
-            #         protein_annotation_obj.upload_tmhmm_data()
-            # else:
-            #     _logger.info("tmhmm data is not provided")
-
-            if self.org_config.eggnog:
-                _logger.info(f"eggnog data is provided: {self.org_config.eggnog}")
-                if self.org_config.eggnog.exists():
-                    _logger.info("Processing eggnog data")
-                    protein_annotation_obj.parse_eggnog_result(self.org_config.eggnog)
-                    protein_annotation_obj.upload_eggnog_data()
-            else:
-                _logger.info("eggnog data is not provided")
-
-            # show log
-            protein_annotation_obj.show_id_log()
-            protein_annotation_obj.get_protein_feature_table_status()
+    @staticmethod
+    def scaffold_annotation_data(gal_table, scaffold, sequence, feature_dct):
+        if scaffold in feature_dct:
+            scaffold_dct = feature_dct[scaffold]
+            gal_table.na_sequenceimp_scaffold(gal_table.NaSequenceId, scaffold, sequence)
+            scaffold_na_sequence_id = gal_table.NaSequenceId
+            gal_table.NaSequenceId += 1
+            for feature, scaffold_feature_dct in scaffold_dct.items():
+                if feature == 'gene':
+                    gal_table.count_gene_bases(scaffold_feature_dct)
+                    for gene_id, gene_dct in scaffold_feature_dct.items():
+                        gal_table.process_gff_gene_data(scaffold, gene_id, gene_dct, scaffold_na_sequence_id)
+                        gal_table.NaSequenceId += 1
+                elif feature == 'repeat_region':
+                    gal_table.process_repeat_data(feature, scaffold_feature_dct, scaffold_na_sequence_id)
+        else:
+            _logger.debug(f"Contig not found in the gff: {scaffold}")
+            gal_table.na_sequenceimp_scaffold(gal_table.NaSequenceId, scaffold, sequence)
+            gal_table.NaSequenceId += 1
 
 
 def query_yes_no(question, default="no"):
@@ -0,0 +1,238 @@
+"""
+Uploads the organisms of a manifest in parallel, one organism per worker process
+"""
+import csv
+import json
+import time
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from .app import App
+from .bulk_loader import DEFAULT_LOAD_CONNECTIONS
+from .config_utility import DatabaseConfig, PathConf, OrganismConf, write_organism_config
+from .dbconnect import check_db_connection, connection_pool
+from .dbschema import database_schema
+from .dbtable_utility import IdBlockAllocator
+from .taxomony import CommonOrganismInfo
+_logger = logging.getLogger("galEupy.batch")
+
+MANIFEST_PATH_COLUMNS = ('org_config', 'genbank', 'fasta', 'gff', 'eggnog')
+DEFAULT_BATCH_JOBS = 2
+DEFAULT_BATCH_LOADS = 2
+
+
+def read_manifest(manifest_file):
+    """
+    reads the organisms of a batch upload. A TSV manifest has a header line, a JSON manifest is a list of objects.
+    An entry has an org_config column with an organism configuration file, or the columns organism, strain,
+    strain_number (optional), assembly_version, sequence_type, genbank, fasta, gff and eggnog.
+    Relative paths are resolved against the directory of the manifest
+
+    parameters
+    ----------
+    manifest_file: Path
+        TSV or JSON manifest
+
+    returns
+    -------
+    entries: list
+        dict of each organism
+    """
+    manifest_file = Path(manifest_file)
+    with open(manifest_file) as fh:
+        if manifest_file.suffix.lower() == '.json':
+            rows = json.load(fh)
+        else:
+            rows = list(csv.DictReader((line for line in fh if not line.startswith('#')), delimiter='\t'))
+
+    entries = []
+    for row in rows:
+        entry = {key.strip().lower(): str(value).strip() for key, value in row.items()
+                 if key and value is not None and str(value).strip() != ''}
+        for key in MANIFEST_PATH_COLUMNS:
+            if key in entry and not Path(entry[key]).is_absolute():
+                entry[key] = str(manifest_file.parent.resolve().joinpath(entry[key]))
+        if 'org_config' in entry:
+            org_config = OrganismConf(entry['org_config'])
+            entry.setdefault('organism', org_config.organism)
+            entry.setdefault('strain', org_config.strain)
+            entry.setdefault('strain_number', org_config.version)
+        if 'organism' not in entry:
+            _logger.error(f"Manifest entry without organism name skipped: {row}")
+            continue
+        entries.append(entry)
+    return entries
+
+
+def upload_organism(task):
+    """
+    uploads the central dogma and protein annotation data of one organism in a worker process,
+    the log of the upload is written to the log file of the organism
+
+    returns
+    -------
+    dict
+        organism, strain number, status and the seconds of each step
+    """
+    galeupy_logger = logging.getLogger('galEupy')
+    log_handler = logging.FileHandler(task['log_file'], mode='w')
+    log_handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+    log_handler.setLevel(logging.DEBUG)
+    galeupy_logger.addHandler(log_handler)
+
+    result = {'organism': task['organism'], 'strain': task.get('strain', ''),
+              'strain_number': task['strain_number'], 'status': 'failed',
+              'central_dogma': 0.0, 'protein_annotation': 0.0}
+    start = time.perf_counter()
+    try:
+        app = App(task['db_config_file'], task['path_config_file'], task['org_config_file'],
+                  use_cache=task['use_cache'], workers=task['workers'], load_connections=task['load_connections'],
+                  upload_dir=task['upload_dir'], load_slots=task['load_slots'])
+        if app.process_central_dogma_annotation():
+            result['central_dogma'] = time.perf_counter() - start
+            protein_status = app.import_protein_annotation()
+            result['protein_annotation'] = time.perf_counter() - start - result['central_dogma']
+            result['status'] = 'uploaded' if protein_status else 'partial'
+        else:
+            result['central_dogma'] = time.perf_counter() - start
+    except Exception as e:
+        _logger.exception(f"Upload of {task['organism']} failed: {e}")
+        result['error'] = str(e)
+    finally:
+        galeupy_logger.removeHandler(log_handler)
+        log_handler.close()
+    result['total'] = time.perf_counter() - start
+    return result
+
+
+class BatchUpload:
+    def __init__(self, db_config_file, path_config_file, manifest_file, jobs=DEFAULT_BATCH_JOBS,
+                 loads=DEFAULT_BATCH_LOADS, use_cache=True, workers=1, load_connections=DEFAULT_LOAD_CONNECTIONS):
+        """
+        Uploads the organisms of a manifest with a pool of worker processes
+        parameters
+        ----------
+        db_config_file: Path
+            database configuration file
+        path_config_file: Path
+            path configuration file, each organism has its own directory in the upload directory
+        manifest_file: Path
+            TSV or JSON manifest of the organisms
+        jobs: int
+            number of organisms uploaded at a time
+        loads: int
+            number of LOAD DATA statements running at a time over all the uploads
+        use_cache: bool
+            reuse parsed input files from the parse cache
+        workers: int
+            number of processes building the gene models of an organism
+        load_connections: int
+            number of connections loading the central dogma upload files of an organism
+        """
+        self.db_config_file = db_config_file
+        self.path_config_file = path_config_file
+        self.manifest_file = Path(manifest_file)
+        self.jobs = max(1, jobs)
+        self.loads = max(1, loads)
+        self.use_cache = use_cache
+        self.workers = workers
+        self.load_connections = load_connections
+        self.db_config = DatabaseConfig(db_config_file)
+        self.batch_dir = PathConf(path_config_file).upload_dir.joinpath(f"Batch_{self.manifest_file.stem}")
+
+    def organism_tasks(self, entries):
+        """
+        writes the organism configuration file of each entry, entries without a strain number get the next strain
+        number of their taxon. Strain numbers are reserved in the idsequence table, so batches running
+        at the same time do not hand out the same number
+        """
+        pool = connection_pool(self.db_config)
+        db = pool.get()
+        strain_allocators = {}
+        seen = set()
+        tasks = []
+        for entry in entries:
+            organism = entry['organism']
+            strain_key = (organism, entry.get('strain'))
+            if entry.get('strain') and strain_key in seen:
+                _logger.error(f"{organism} strain {entry['strain']} is listed twice in the manifest, skipped")
+                continue
+            seen.add(strain_key)
+
+            if 'strain_number' not in entry:
+                taxonomy_id = CommonOrganismInfo(db, organism).taxonomy_id_sres
+                if taxonomy_id is None:
+                    _logger.error(f"There is no taxon entry for {organism}, skipped")
+                    continue
+                if taxonomy_id not in strain_allocators:
+                    strain_allocators[taxonomy_id] = IdBlockAllocator(
+                        db, 'organism', 'strain_number', block_size=1,
+                        sequence_name=f"strain_number:{taxonomy_id}", where=f"taxon_ID = {taxonomy_id}")
+                allocator = strain_allocators[taxonomy_id]
+                entry['strain_number'] = allocator.next_id
+                allocator.move_to(allocator.next_id + 1)
+
+            name = f"{organism.replace(' ', '_')}_{entry.get('strain') or 'v' + str(entry['strain_number'])}"
+            upload_dir = self.batch_dir.joinpath(name)
+            upload_dir.mkdir(parents=True, exist_ok=True)
+            if 'org_config' in entry:
+                org_config_file = entry['org_config']
+            else:
+                org_config_file = write_organism_config(
+                    upload_dir.joinpath('organism.ini'), organism, entry['strain_number'], entry.get('strain', ''),
+                    entry.get('assembly_version', 1), entry.get('sequence_type', 'chromosome'),
+                    entry.get('genbank'), entry.get('fasta'), entry.get('gff'), entry.get('eggnog'))
+            tasks.append({'organism': organism, 'strain': entry.get('strain', ''),
+                          'strain_number': entry['strain_number'], 'org_config_file': str(org_config_file),
+                          'upload_dir': str(upload_dir), 'log_file': str(self.batch_dir.joinpath(f"{name}.log")),
+                          'db_config_file': str(self.db_config_file), 'path_config_file': str(self.path_config_file),
+                          'use_cache': self.use_cache, 'workers': self.workers,
+                          'load_connections': self.load_connections})
+            _logger.info(f"{organism} strain {entry.get('strain', '')}: strain number {entry['strain_number']}")
+        pool.put(db)
+        # the worker processes open their own connections, the forked ones must not share these
+        pool.close()
+        return tasks
+
+    def run(self):
+        """ uploads the organisms of the manifest, returns the result of each organism """
+        entries = read_manifest(self.manifest_file)
+        _logger.info(f"Batch upload of {len(entries)} organisms from {self.manifest_file}: "
+                     f"{self.jobs} at a time, {self.loads} loads at a time")
+
+        if not check_db_connection(self.db_config.host, self.db_config.db_username, self.db_config.db_password,
+                                   port=self.db_config.db_port):
+            _logger.error("Check the database configuration, the database connection failed")
+            return []
+        database_schema(self.db_config_file)
+
+        self.batch_dir.mkdir(parents=True, exist_ok=True)
+        tasks = self.organism_tasks(entries)
+        results = []
+        start = time.perf_counter()
+        with multiprocessing.Manager() as manager:
+            load_slots = manager.BoundedSemaphore(self.loads)
+            for task in tasks:
+                task['load_slots'] = load_slots
+            with ProcessPoolExecutor(max_workers=self.jobs) as executor:
+                futures = {executor.submit(upload_organism, task): task for task in tasks}
+                for future in as_completed(futures):
+                    result = future.result()
+                    _logger.info(f"{result['organism']} strain number {result['strain_number']}: {result['status']} "
+                                 f"in {result['total']:.1f} s, log: {futures[future]['log_file']}")
+                    results.append(result)
+        self.log_summary(results, time.perf_counter() - start)
+        return results
+
+    @staticmethod
+    def log_summary(results, elapsed):
+        lines = [f"{'organism':<40} {'strain':<16} {'no.':>5} {'status':<9} {'central dogma':>14} "
+                 f"{'protein annot.':>15} {'total':>9}"]
+        for result in sorted(results, key=lambda value: (value['organism'], str(value['strain_number']))):
+            lines.append(f"{result['organism'][:40]:<40} {result['strain'][:16]:<16} {result['strain_number']:>5} "
+                         f"{result['status']:<9} {result['central_dogma']:>12.1f} s "
+                         f"{result['protein_annotation']:>13.1f} s {result['total']:>7.1f} s")
+        uploaded = sum(result['status'] == 'uploaded' for result in results)
+        summary = '\n'.join(lines)
+        _logger.info(f"Batch upload: {uploaded} of {len(results)} organisms uploaded in {elapsed:.1f} s\n{summary}")
@@ -0,0 +1,459 @@
+"""
+Loads the central dogma and protein feature upload files over several connections while the later files are
+still written
+"""
+import uuid
+import contextlib
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+import pymysql
+from .dbconnect import NamedLock
+_logger = logging.getLogger("galEupy.bulk_loader")
+
+# central dogma tables in foreign key order, with the tables their rows reference
+CENTRAL_DOGMA_TABLES = {
+    'nasequenceimp': (),
+    'nafeatureimp': ('nasequenceimp',),
+    'nalocation': ('nafeatureimp',),
+    'geneinstance': ('nafeatureimp',),
+    'protein': ('geneinstance',),
+}
+DEFAULT_LOAD_CONNECTIONS = len(CENTRAL_DOGMA_TABLES)
+
+# rows of each central dogma table that belong to an organism, the rows of a table reach the organism
+# through the rows of their parent tables
+ORGANISM_ROWS_QUERIES = {
+    'nasequenceimp': """SELECT COUNT(*) AS row_count FROM nasequenceimp AS ns
+    WHERE ns.taxon_ID = %(taxon_id)s AND ns.strain_number = %(strain_number)s""",
+    'nafeatureimp': """SELECT COUNT(*) AS row_count FROM nafeatureimp AS nf
+    INNER JOIN nasequenceimp AS ns ON nf.na_sequence_ID = ns.na_sequence_ID
+    WHERE ns.taxon_ID = %(taxon_id)s AND ns.strain_number = %(strain_number)s""",
+    'nalocation': """SELECT COUNT(*) AS row_count FROM nalocation AS nl
+    INNER JOIN nafeatureimp AS nf ON nl.na_feature_ID = nf.na_feature_ID
+    INNER JOIN nasequenceimp AS ns ON nf.na_sequence_ID = ns.na_sequence_ID
+    WHERE ns.taxon_ID = %(taxon_id)s AND ns.strain_number = %(strain_number)s""",
+    'geneinstance': """SELECT COUNT(*) AS row_count FROM geneinstance AS gi
+    INNER JOIN nafeatureimp AS nf ON gi.na_feature_ID = nf.na_feature_ID
+    INNER JOIN nasequenceimp AS ns ON nf.na_sequence_ID = ns.na_sequence_ID
+    WHERE ns.taxon_ID = %(taxon_id)s AND ns.strain_number = %(strain_number)s""",
+    'protein': """SELECT COUNT(*) AS row_count FROM protein AS p
+    INNER JOIN geneinstance AS gi ON p.gene_instance_ID = gi.gene_instance_ID
+    INNER JOIN nafeatureimp AS nf ON gi.na_feature_ID = nf.na_feature_ID
+    INNER JOIN nasequenceimp AS ns ON nf.na_sequence_ID = ns.na_sequence_ID
+    WHERE ns.taxon_ID = %(taxon_id)s AND ns.strain_number = %(strain_number)s""",
+}
+# features of an organism whose parent feature does not exist
+ORPHAN_FEATURES_QUERY = """SELECT COUNT(*) AS row_count FROM nafeatureimp AS nf
+INNER JOIN nasequenceimp AS ns ON nf.na_sequence_ID = ns.na_sequence_ID
+LEFT JOIN nafeatureimp AS parent ON parent.na_feature_ID = nf.parent_ID
+WHERE ns.taxon_ID = %(taxon_id)s AND ns.strain_number = %(strain_number)s
+AND nf.parent_ID IS NOT NULL AND parent.na_feature_ID IS NULL"""
+# IDs covered by a DELETE of the rows of a failed upload
+DELETE_CHUNK_IDS = 10000
+
+
+class LoadAborted(Exception):
+    """ a segment file was not loaded because an earlier load failed """
+
+
+class PipelinedLoader:
+    """
+    Loads segments of upload files, one file per table and segment, with LOAD DATA LOCAL INFILE.
+    A segment is handed over as soon as its files are closed and is loaded by a small pool of connections
+    while the next one is written. The files of a table are loaded in segment order and a file is loaded
+    after the files of its parent tables in the same segment, so rows come in after the rows they reference.
+    Each connection loads inside an XA transaction with foreign_key_checks off, commit() prepares all of
+    them and commits them together; after any failure all of them are rolled back.
+    """
+    def __init__(self, db, load_query, connections=DEFAULT_LOAD_CONNECTIONS, load_slots=None, session=None,
+                 tables=None, label='Central dogma upload'):
+        """
+        parameters
+        ----------
+        db: Database
+            connection whose settings are used for the loader connections
+        load_query: function
+            LOAD DATA statement of a table name and a file path
+        connections: int
+            number of loader connections
+        load_slots: Semaphore
+            limits the LOAD DATA statements running at a time when it is shared by several uploads
+        session: BulkLoadSession
+            started before the first load, finished and validated after the commit or rollback
+        tables: dict
+            tables of a segment in load order, with the tables their rows reference, CENTRAL_DOGMA_TABLES by default
+        label: str
+            name of the upload in the log
+        """
+        self.db = db
+        self.load_query = load_query
+        self.session = session
+        self.tables = tables if tables is not None else CENTRAL_DOGMA_TABLES
+        self.label = label
+        if self.session is not None:
+            self.session.begin()
+        self.load_slots = load_slots if load_slots is not None else contextlib.nullcontext()
+        self.xid_prefix = f"galEupy-{uuid.uuid4().hex[:16]}"
+        self.transactions = []
+        self.transactions_lock = threading.Lock()
+        self.local = threading.local()
+        self.failed = threading.Event()
+        self.loads = {table_name: [] for table_name in self.tables}
+        self.finished = False
+        self.executor = ThreadPoolExecutor(max_workers=max(1, connections), thread_name_prefix='galEupy-loader',
+                                           initializer=self.open_connection)
+
+    def open_connection(self):
+        connection = pymysql.connect(host=self.db.host, user=self.db.user, passwd=self.db.password,
+                                     database=self.db.db, local_infile=1, port=self.db.port, autocommit=True)
+        with self.transactions_lock:
+            xid = f"{self.xid_prefix}-{len(self.transactions)}"
+            self.transactions.append((xid, connection))
+        with connection.cursor() as cursor:
+            # the parent rows of another loader connection are not visible before the commit
+            cursor.execute("SET SESSION foreign_key_checks = 0")
+            cursor.execute("SET SESSION unique_checks = 0")
+            cursor.execute(f"XA START '{xid}'")
+        self.local.connection = connection
+
+    @property
+    def segments(self):
+        return len(next(iter(self.loads.values())))
+
+    def add_segment(self, files):
+        """
+        queues the files of a segment
+
+        parameters
+        ----------
+        files: dict
+            closed upload file of each table
+        """
+        segment = self.segments
+        for table_name, parent_tables in self.tables.items():
+            depends = [self.loads[parent_table][segment] for parent_table in parent_tables]
+            if segment:
+                depends.append(self.loads[table_name][segment - 1])
+            future = self.executor.submit(self.load_file, table_name, files[table_name], depends)
+            self.loads[table_name].append(future)
+        _logger.debug(f"{self.label}: segment {segment} queued")
+
+    def load_file(self, table_name, file_path, depends):
+        # the loads a load depends on were submitted before it and have started already
+        for future in depends:
+            if future.exception() is not None:
+                self.failed.set()
+        if self.failed.is_set():
+            raise LoadAborted(f"{table_name}: {file_path} was not loaded")
+        if file_path.stat().st_size == 0:
+            return 0
+        start = time.perf_counter()
+        try:
+            with self.load_slots, self.local.connection.cursor() as cursor:
+                rows = cursor.execute(self.load_query(table_name, file_path))
+        except (pymysql.Error, OSError):
+            self.failed.set()
+            raise
+        _logger.debug(f"{table_name}: {rows:,} rows loaded from {file_path.name} "
+                      f"in {time.perf_counter() - start:.2f} s")
+        return rows
+
+    def table_rows(self):
+        return {table_name: sum(future.result() for future in futures) for table_name, futures in self.loads.items()}
+
+    def commit(self):
+        """
+        waits for the queued segments and commits the loaded rows of all connections as one unit
+
+        returns
+        -------
+        bool
+            True if every file was loaded and committed, all loads are rolled back otherwise
+        """
+        futures = [future for table_futures in self.loads.values() for future in table_futures]
+        wait(futures)
+        self.executor.shutdown(wait=True)
+        errors = [future.exception() for future in futures if future.exception() is not None]
+        for error in errors:
+            if not isinstance(error, LoadAborted):
+                _logger.error(f"{self.label} failed: {error}")
+        if errors:
+            self.rollback()
+            return False
+        try:
+            for xid, connection in self.transactions:
+                with connection.cursor() as cursor:
+                    cursor.execute(f"XA END '{xid}'")
+                    cursor.execute(f"XA PREPARE '{xid}'")
+        except pymysql.Error as e:
+            _logger.error(f"{self.label} could not be prepared: {e}")
+            self.rollback()
+            return False
+        failed_xids = []
+        for xid, connection in self.transactions:
+            try:
+                with connection.cursor() as cursor:
+                    cursor.execute(f"XA COMMIT '{xid}'")
+            except pymysql.Error as e:
+                _logger.warning(f"XA COMMIT '{xid}' failed, retried on a new connection: {e}")
+                failed_xids.append(xid)
+        self.close()
+        failed_xids = self.retry_commit(failed_xids)
+        if failed_xids:
+            _logger.error(f"{self.label} is not fully committed, the transactions {', '.join(failed_xids)} "
+                          f"stay prepared. Commit them with XA COMMIT '<xid>' (XA RECOVER lists them) "
+                          f"or roll them back with XA ROLLBACK '<xid>' and delete the organism")
+            if self.session is not None:
+                # the loaded rows are not validated while a part of them is not committed
+                self.session.finished = True
+                self.session.rebuild_indexes()
+            return False
+        table_rows = self.table_rows()
+        rows = ', '.join(f"{table_name}: {count:,}" for table_name, count in table_rows.items())
+        _logger.info(f"{self.label} committed ({self.segments} segments, "
+                     f"{len(self.transactions)} connections), rows {rows}")
+        if self.session is not None:
+            return self.session.finish(table_rows)
+        return True
+
+    def retry_commit(self, xids):
+        """
+        commits prepared transactions on a new connection, a prepared transaction outlives the connection
+        that prepared it
+
+        returns
+        -------
+        list
+            xids that could not be committed
+        """
+        if not xids:
+            return []
+        failed_xids = []
+        try:
+            connection = pymysql.connect(host=self.db.host, user=self.db.user, passwd=self.db.password,
+                                         database=self.db.db, port=self.db.port, autocommit=True)
+        except pymysql.Error as e:
+            _logger.error(f"XA COMMIT could not be retried: {e}")
+            return list(xids)
+        try:
+            for xid in xids:
+                try:
+                    with connection.cursor() as cursor:
+                        cursor.execute(f"XA COMMIT '{xid}'")
+                except pymysql.Error as e:
+                    _logger.error(f"XA COMMIT '{xid}' failed again: {e}")
+                    failed_xids.append(xid)
+        finally:
+            connection.close()
+        return failed_xids
+
+    def rollback(self):
+        self.failed.set()
+        self.executor.shutdown(wait=True)
+        for xid, connection in self.transactions:
+            # XA END fails for a transaction that is prepared already
+            for query in (f"XA END '{xid}'", f"XA ROLLBACK '{xid}'"):
+                try:
+                    with connection.cursor() as cursor:
+                        cursor.execute(query)
+                except pymysql.Error as e:
+                    _logger.debug(f"{query}: {e}")
+        self.close()
+        _logger.info(f"{self.label} rolled back")
+        if self.session is not None:
+            self.session.finish()
+
+    def close(self):
+        self.finished = True
+        for _, connection in self.transactions:
+            connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if not self.finished:
+            self.rollback()
+
+
+class BulkLoadSession:
+    """
+    Bulk load mode of a central dogma upload. The loader connections run with foreign_key_checks and
+    unique_checks off. On a first-time load into an empty table, the secondary indexes of the table that no
+    foreign key needs are dropped before the load and built again in one ALTER TABLE afterwards.
+    As the foreign keys are not checked row by row, finish() checks with set-based queries that every
+    loaded row reaches the organism through its parent rows. The rows are committed by then, if the check fails
+    they are deleted by the ID ranges of id_allocators, so the upload can be run again
+    """
+    def __init__(self, db, taxonomy_id, strain_number, tables=tuple(CENTRAL_DOGMA_TABLES)):
+        """
+        parameters
+        ----------
+        db: Database
+            connection for the index changes and the checks
+        taxonomy_id: int
+            taxon of the uploaded organism
+        strain_number: int
+            strain number of the uploaded organism
+        tables: tuple
+            tables whose indexes can be rebuilt
+        """
+        self.db = db
+        self.taxonomy_id = taxonomy_id
+        self.strain_number = strain_number
+        self.tables = tables
+        # only one upload changes the indexes at a time
+        self.index_lock = NamedLock(db, f"galEupy:{db.db}:bulk_load_indexes")
+        self.dropped_indexes = {}
+        # IdBlockAllocator of each table, set by the writer of the upload files
+        self.id_allocators = {}
+        self.finished = False
+
+    def begin(self):
+        empty_tables = [table_name for table_name in self.tables
+                        if self.row_count(f"SELECT EXISTS(SELECT 1 FROM {table_name}) AS row_count") == 0]
+        if not empty_tables or not self.index_lock.acquire():
+            return
+        for table_name in empty_tables:
+            indexes = self.droppable_indexes(table_name)
+            if not indexes:
+                continue
+            drop_clauses = ', '.join(f"DROP INDEX `{index_name}`" for index_name in indexes)
+            self.db.execute(f"ALTER TABLE {table_name} {drop_clauses}")
+            self.dropped_indexes[table_name] = indexes
+            _logger.info(f"{table_name}: indexes {', '.join(indexes)} dropped until the first load is complete")
+
+    def droppable_indexes(self, table_name):
+        """ secondary indexes of a table with their column lists, except the indexes its foreign keys need """
+        index_rows = self.db.query("""SELECT INDEX_NAME AS index_name, COLUMN_NAME AS column_name,
+        SUB_PART AS sub_part, NON_UNIQUE AS non_unique FROM information_schema.STATISTICS
+        WHERE TABLE_SCHEMA = %s AND TABLE_NAME = %s ORDER BY INDEX_NAME, SEQ_IN_INDEX""",
+                                   (self.db.db, table_name)) or []
+        foreign_key_rows = self.db.query("""SELECT CONSTRAINT_NAME AS constraint_name, COLUMN_NAME AS column_name
+        FROM information_schema.KEY_COLUMN_USAGE WHERE TABLE_SCHEMA = %s AND TABLE_NAME = %s
+        AND REFERENCED_TABLE_NAME IS NOT NULL ORDER BY CONSTRAINT_NAME, ORDINAL_POSITION""",
+                                         (self.db.db, table_name)) or []
+        indexes = {}
+        for row in index_rows:
+            if row['index_name'] != 'PRIMARY' and row['non_unique']:
+                indexes.setdefault(row['index_name'], []).append((row['column_name'], row['sub_part']))
+        foreign_keys = {}
+        for row in foreign_key_rows:
+            foreign_keys.setdefault(row['constraint_name'], []).append(row['column_name'])
+
+        def covers(columns, foreign_key_columns):
+            return [column for column, _ in columns[:len(foreign_key_columns)]] == foreign_key_columns
+
+        kept = dict(indexes)
+        droppable = {}
+        for index_name, columns in indexes.items():
+            others = [other for other_name, other in kept.items() if other_name != index_name]
+            if all(not covers(columns, fk_columns) or any(covers(other, fk_columns) for other in others)
+                   for fk_columns in foreign_keys.values()):
+                droppable[index_name] = columns
+                del kept[index_name]
+        return droppable
+
+    def rebuild_indexes(self):
+        """ adds the dropped indexes again, False if an index could not be built """
+        rebuilt = True
+        try:
+            for table_name, indexes in self.dropped_indexes.items():
+                add_clauses = ', '.join(
+                    f"ADD INDEX `{index_name}` ("
+                    + ', '.join(f"`{column}`({sub_part})" if sub_part else f"`{column}`"
+                                for column, sub_part in columns)
+                    + ")" for index_name, columns in indexes.items())
+                start = time.perf_counter()
+                try:
+                    built = self.db.execute(f"ALTER TABLE {table_name} {add_clauses}") is not None
+                except pymysql.Error as e:
+                    _logger.error(f"Error {e}")
+                    built = False
+                if built:
+                    _logger.info(f"{table_name}: indexes rebuilt in {time.perf_counter() - start:.1f} s")
+                else:
+                    _logger.error(f"{table_name}: indexes {', '.join(indexes)} could not be rebuilt, "
+                                  f"the next run of galEupy adds the missing indexes")
+                    rebuilt = False
+        finally:
+            self.dropped_indexes = {}
+            if self.index_lock.acquired:
+                self.index_lock.release()
+        return rebuilt
+
+    def validate(self, table_rows):
+        """
+        True if every loaded row belongs to the organism through its parent rows and every parent feature exists
+
+        parameters
+        ----------
+        table_rows: dict
+            rows loaded into each central dogma table
+        """
+        params = {'taxon_id': self.taxonomy_id, 'strain_number': self.strain_number}
+        valid = True
+        for table_name, loaded_rows in table_rows.items():
+            organism_rows = self.row_count(ORGANISM_ROWS_QUERIES[table_name], params)
+            if organism_rows is None:
+                _logger.error(f"{table_name}: the organism rows could not be counted")
+                valid = False
+            elif organism_rows != loaded_rows:
+                _logger.error(f"{table_name}: {loaded_rows:,} rows loaded, {organism_rows:,} rows reach the organism, "
+                              f"loaded rows reference missing rows or rows of another organism")
+                valid = False
+        orphan_features = self.row_count(ORPHAN_FEATURES_QUERY, params)
+        if orphan_features is None:
+            _logger.error("nafeatureimp: the features without parent could not be counted")
+            valid = False
+        elif orphan_features:
+            _logger.error(f"nafeatureimp: {orphan_features:,} features reference a missing parent feature")
+            valid = False
+        if valid:
+            _logger.info("Central dogma upload: all loaded rows reference existing rows")
+        return valid
+
+    def row_count(self, query, params=None):
+        """ row_count of a single row query, None if the query failed """
+        data = self.db.query_one(query, params)
+        return data['row_count'] if data is not None else None
+
+    def finish(self, table_rows=None):
+        """ rebuilds the dropped indexes and validates the loaded rows, returns False if the check fails """
+        if self.finished:
+            return True
+        self.finished = True
+        self.rebuild_indexes()
+        if table_rows is None:
+            return True
+        if self.validate(table_rows):
+            return True
+        self.delete_loaded_rows()
+        return False
+
+    def delete_loaded_rows(self):
+        """
+        deletes the committed rows of the upload by the ID ranges handed out for it, children first.
+        The rows of a range are deleted from the highest ID, gene sequences and child features come
+        after the rows they reference
+        """
+        for table_name in reversed(list(CENTRAL_DOGMA_TABLES)):
+            allocator = self.id_allocators.get(table_name)
+            if allocator is None:
+                continue
+            deleted = 0
+            for first_id, end_id in reversed(allocator.used_ranges()):
+                for chunk_end in range(end_id, first_id, -DELETE_CHUNK_IDS):
+                    chunk_start = max(first_id, chunk_end - DELETE_CHUNK_IDS)
+                    row_count = self.db.execute(
+                        f"""DELETE FROM {table_name} WHERE {allocator.id_column} >= %s AND {allocator.id_column} < %s
+                        ORDER BY {allocator.id_column} DESC""", (chunk_start, chunk_end))
+                    if row_count is None:
+                        _logger.error(f"{table_name}: the rows of the failed upload could not be deleted, "
+                                      f"IDs {first_id} to {end_id - 1}")
+                        return False
+                    deleted += row_count
+            _logger.info(f"{table_name}: {deleted:,} rows of the failed upload deleted")
+        return True
@@ -0,0 +1,154 @@
+"""
+Buffered writers for the tab separated files loaded with LOAD DATA LOCAL INFILE
+"""
+import os
+import time
+import logging
+_logger = logging.getLogger("galEupy.bulk_writer")
+
+# LOAD DATA reads the files with FIELDS ESCAPED BY '\\' (the default) and OPTIONALLY ENCLOSED BY '"'
+ESCAPE_TABLE = str.maketrans({'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r', '"': '\\"'})
+DEFAULT_BUFFER_SIZE = 4 * 1024 ** 2
+DEFAULT_CHUNK_ROWS = 16384
+# text held by the pending rows of a writer of sequence rows, a chromosome row alone is written at once
+SEQUENCE_CHUNK_BYTES = 4 * 1024 ** 2
+
+
+def escape_field(value):
+    """ text of a field value, tabs, newlines, quotes and backslashes are escaped for LOAD DATA """
+    return str(value).translate(ESCAPE_TABLE)
+
+
+def escaped_line(fields):
+    return '\t'.join(map(escape_field, fields)) + '\n'
+
+
+def has_special_characters(text):
+    """ True if the text has characters to escape besides tabs and newlines, whose counts are checked """
+    return '"' in text or '\\' in text or '\r' in text
+
+
+def clean_line(line, fields):
+    """ True if the formatted line of the fields needs no escaping """
+    return (line.count('\t') == len(fields) - 1 and line.count('\n') == 1
+            and not has_special_characters(line))
+
+
+class RowFormats(dict):
+    """ number of fields -> tab separated format string of a row """
+    def __missing__(self, field_count):
+        row_format = self[field_count] = '\t'.join(['{}'] * field_count) + '\n'
+        return row_format
+
+
+class BulkRowWriter:
+    """
+    Writes table rows to a tab separated file through a large binary buffer. Rows are kept until
+    a chunk of them (chunk_rows rows or, if it is set, chunk_bytes of text fields) is formatted and checked for characters to escape, the rows of a chunk with such
+    characters are checked one by one and formatted again with escaping.
+    Counts the rows and bytes written, close() flushes and syncs the file before it is loaded.
+    """
+    def __init__(self, file_path, table_name=None, buffer_size=DEFAULT_BUFFER_SIZE, chunk_rows=DEFAULT_CHUNK_ROWS,
+                 chunk_bytes=None):
+        """
+        parameters
+        ----------
+        file_path: Path
+            upload file, it is truncated
+        table_name: str
+            table name for the log, the file name by default
+        buffer_size: int
+            size of the write buffer in bytes
+        chunk_rows: int
+            number of rows formatted together
+        chunk_bytes: int
+            length of the text fields of the rows formatted together, for tables with sequences in their rows
+        """
+        self.file_path = file_path
+        self.table_name = table_name or file_path.name
+        self.chunk_rows = chunk_rows
+        self.chunk_bytes = chunk_bytes
+        self.pending_bytes = 0
+        self.fh = open(file_path, 'wb', buffering=buffer_size)
+        self.row_formats = RowFormats()
+        self.pending_rows = []
+        self.rows = 0
+        self.bytes_written = 0
+        self.start_time = time.perf_counter()
+
+    def write_row(self, fields):
+        """ writes one row, the fields are converted as str.format does (None becomes 'None') """
+        self.pending_rows.append(fields)
+        if self.chunk_bytes is not None:
+            self.pending_bytes += sum(len(field) for field in fields if type(field) is str)
+            if self.pending_bytes >= self.chunk_bytes:
+                self.write_pending()
+                return
+        if len(self.pending_rows) >= self.chunk_rows:
+            self.write_pending()
+
+    def write_rows(self, rows):
+        for fields in rows:
+            self.write_row(fields)
+
+    def write_pending(self):
+        pending_rows = self.pending_rows
+        if not pending_rows:
+            return
+        row_formats = self.row_formats
+        lines = [row_formats[len(fields)].format(*fields) for fields in pending_rows]
+        text = ''.join(lines)
+        row_count = len(lines)
+        tab_count = sum(map(len, pending_rows)) - row_count
+        if (text.count('\t') != tab_count or text.count('\n') != row_count
+                or has_special_characters(text)):
+            text = ''.join([line if clean_line(line, fields) else escaped_line(fields)
+                            for line, fields in zip(lines, pending_rows)])
+        data = text.encode()
+        self.fh.write(data)
+        self.rows += row_count
+        self.bytes_written += len(data)
+        self.pending_rows = []
+        self.pending_bytes = 0
+
+    @property
+    def row_count(self):
+        """ rows written so far, including the rows of the chunk not formatted yet """
+        return self.rows + len(self.pending_rows)
+
+    @property
+    def closed(self):
+        return self.fh.closed
+
+    def flush(self, fsync=False):
+        self.write_pending()
+        self.fh.flush()
+        if fsync:
+            os.fsync(self.fh.fileno())
+
+    def close(self, fsync=True):
+        if self.fh.closed:
+            return
+        self.flush(fsync)
+        self.fh.close()
+        self.report()
+
+    def report(self):
+        elapsed = time.perf_counter() - self.start_time
+        _logger.info(f"{self.table_name}: {self.rows:,} rows, {self.bytes_written / 2 ** 20:,.1f} MiB "
+                     f"({self.rows / elapsed if elapsed else 0:,.0f} rows/sec)")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __del__(self):
+        # rows must not be lost when the writer is dropped without close()
+        try:
+            if not self.fh.closed:
+                self.write_pending()
+                self.fh.close()
+        except AttributeError:
+            pass
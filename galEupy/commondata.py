@@ -1,5 +1,5 @@
 import os
-from .dbconnect import Database
+from .dbconnect import connection_pool
 import logging
 from pathlib import Path, PurePosixPath
 import urllib.request
@@ -12,15 +12,8 @@ _logger = logging.getLogger("galEupy.commondata")
 def common_data_basic(db_config, main_path):
     _logger.info("Common Data will load now prior to parsing your real data...")
 
-    host = db_config.host
-    db_username = db_config.db_username
-    db_password = db_config.db_password
-    db_name = db_config.db_name
-
-    # db_name = DbNames(db_prefix)
-    db_connection = Database(host, db_username, db_password, db_name, infile=1)
-
-    upload_shared_data(db_connection, main_path)
+    with connection_pool(db_config).connection() as db_connection:
+        upload_shared_data(db_connection, main_path)
 
 
 def upload_shared_data(db, main_path):
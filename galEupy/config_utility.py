@@ -143,9 +143,23 @@ def database_config_reader(filename):
     return host, db_username, db_password, db_name, db_port
 
 
+def pool_size_reader(filename):
+    """ optional pool_size of the dbconnection section, the number of pooled connections of a process """
+    pool_size = ConfigReader(filename).section_map("dbconnection").get('pool_size')
+    return int(pool_size) if pool_size else None
+
+
+def partitioned_reader(filename):
+    """ optional partitioned option of the dbconnection section, yes creates the partitioned schema """
+    partitioned = ConfigReader(filename).section_map("dbconnection").get('partitioned') or ''
+    return partitioned.strip().lower() in ('yes', 'true', '1')
+
+
 class DatabaseConf:
     def __init__(self, filename):
         (self.host, self.db_username, self.db_password, self.db_name, self.db_port) = database_config_reader(filename)
+        self.pool_size = pool_size_reader(filename)
+        self.partitioned = partitioned_reader(filename)
 
 
 class DatabaseConfig(ConfigReader):
@@ -153,6 +167,8 @@ class DatabaseConfig(ConfigReader):
         ConfigReader.__init__(self, filename)
         self.db_config_file = filename
         self.host, self.db_username, self.db_password, self.db_name, self.db_port = self.config_reader()
+        self.pool_size = pool_size_reader(filename)
+        self.partitioned = partitioned_reader(filename)
 
     def config_reader(self):
         section_map = self.section_map("dbconnection")
@@ -327,6 +343,40 @@ class PathConf:
         self.genmark_model = path_config_dct['genmark_model']
 
 
+def write_organism_config(file_name, organism, strain_number, strain, assembly_version=1, sequence_type='chromosome',
+                          genbank=None, fasta=None, gff=None, eggnog=None):
+    """
+    writes an organism configuration file in the format of organism_config_format.ini
+    parameters
+    ----------
+    file_name: Path
+        organism configuration file
+    organism: str
+        organism name, Genus species
+    strain_number: int
+        strain number of the organism in the organism table
+    """
+    config_string = f"""[OrganismDetails]
+Organism: {organism}
+strain_number: {strain_number}
+strain: {strain}
+assembly_version: {assembly_version}
+
+[SequenceType]
+SequenceType: {sequence_type}
+scaffold_prefix:
+
+[filePath]
+GenBank: {genbank or ''}
+FASTA: {fasta or ''}
+GFF: {gff or ''}
+eggnog: {eggnog or ''}
+"""
+    with open(file_name, 'w') as fh:
+        fh.write(config_string)
+    return Path(file_name)
+
+
 def config_string_generator( org_name, org_version, reg_org, genbank, fasta, gff, product):
     organism_part = """
 [OrganismDetails]
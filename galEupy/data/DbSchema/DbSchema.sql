@@ -74,7 +74,8 @@ CREATE TABLE IF NOT EXISTS `organism`(
     assembly_name VARCHAR(50) NULL,
     assembly_level VARCHAR(50) NULL,
     createdat TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
-	PRIMARY KEY (organism_ID)
+	PRIMARY KEY (organism_ID),
+    KEY `organism_taxon_strain` (taxon_ID, strain_number)
 )ENGINE=InnoDB AUTO_INCREMENT = 1;
 
 
@@ -276,6 +277,8 @@ CREATE TABLE `nasequenceimp` (
     PRIMARY KEY (`na_sequence_ID`),
     KEY `nasequenceimp_FK02` (`taxon_ID`),
     KEY `nasequenceimp_FK03` (`external_database_ID`),
+    -- organism scoped lookups and deletes filter on the organism and the sequence type
+    KEY `nasequenceimp_taxon_strain` (`taxon_ID`, `strain_number`, `sequence_type_ID`),
     FOREIGN KEY (`sequence_type_ID`) REFERENCES `sequencetype`(`sequence_type_ID`),
     FOREIGN KEY (`source_na_sequence_ID`) REFERENCES `nasequenceimp`(`na_sequence_ID`)
 ) ENGINE=InnoDB AUTO_INCREMENT=1 DEFAULT CHARSET=utf8;
@@ -366,6 +369,7 @@ CREATE TABLE IF NOT EXISTS `nafeatureimp`(
     `string50` varchar(64) DEFAULT NULL,
     `modification_date` timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP,
     PRIMARY KEY (na_feature_ID),
+    KEY `nafeatureimp_sequence_type` (na_sequence_ID, feature_type, name),
     FOREIGN KEY (na_sequence_ID) REFERENCES nasequenceimp(na_sequence_ID),
     FOREIGN KEY (parent_ID) REFERENCES nafeatureimp(na_feature_ID) ON DELETE CASCADE
 )ENGINE=InnoDB AUTO_INCREMENT = 1 ROW_FORMAT=DYNAMIC;
@@ -385,6 +389,7 @@ CREATE TABLE IF NOT EXISTS `nalocation`(
     literal_sequence VARCHAR(255),
     location_type VARCHAR(50),
     PRIMARY KEY(na_location_ID),
+    KEY `nalocation_feature` (na_feature_ID),
     FOREIGN KEY(na_feature_ID) REFERENCES nafeatureimp(na_feature_ID)
 )ENGINE=InnoDB AUTO_INCREMENT = 1;
 
@@ -428,6 +433,7 @@ CREATE TABLE IF NOT EXISTS `geneinstance`(
     review_status_id INT(11),
     modification_date TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
     PRIMARY KEY (gene_instance_ID),
+    KEY `geneinstance_feature` (na_feature_ID),
     FOREIGN KEY(na_feature_ID) REFERENCES nafeatureimp(na_feature_ID)
 )ENGINE=InnoDB AUTO_INCREMENT = 1;
 
@@ -519,10 +525,20 @@ CREATE TABLE IF NOT EXISTS `protein`(
     gene_instance_ID INT(11),
     sequence TEXT NOT NULL,
     PRIMARY KEY (protein_ID),
+    KEY `protein_gene_instance` (gene_instance_ID, name),
     FOREIGN KEY(gene_instance_ID) REFERENCES geneinstance(gene_instance_ID)
 )ENGINE=InnoDB AUTO_INCREMENT = 1;
 
 
+-- next free ID of each central dogma table, uploads reserve blocks of IDs from it
+DROP TABLE IF EXISTS `idsequence`;
+CREATE TABLE IF NOT EXISTS `idsequence`(
+    table_name VARCHAR(64) NOT NULL,
+    next_id BIGINT NOT NULL,
+    PRIMARY KEY (table_name)
+)ENGINE=InnoDB;
+
+
 
 -- DROP TABLE IF EXISTS `protein_cluster`;
 -- CREATE TABLE `protein_cluster` (
@@ -567,7 +583,8 @@ CREATE TABLE `proteininstancefeature` (
     `modification_date` timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP,
   PRIMARY KEY (`protein_instance_feature_ID`),
   KEY `proteininstancefeature_FK01` (`protein_instance_ID`),
-  KEY `proteininstancefeature_FK02` (`prediction_algorithm_id`)
+  KEY `proteininstancefeature_FK02` (`prediction_algorithm_id`),
+  KEY `proteininstancefeature_organism` (`taxonomy_id`, `strain_number`)
 ) ENGINE=InnoDB AUTO_INCREMENT=1942002 DEFAULT CHARSET=utf8;
 
 CREATE TABLE COG_CATEGORIES (
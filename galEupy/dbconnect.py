@@ -1,10 +1,25 @@
 import pymysql
+import os
 import sys
+import time
+import queue
 import logging
 import warnings
+import threading
+import contextlib
 warnings.filterwarnings("ignore", category=pymysql.Warning)
 _logger = logging.getLogger("galEupy.dbconnect")
 
+DEFAULT_POOL_SIZE = 4
+# seconds a pooled connection can be idle before it is pinged when it is borrowed
+HEALTH_CHECK_INTERVAL = 30
+# seconds get() waits for a connection when all the connections of the pool are borrowed
+POOL_TIMEOUT = 300
+
+
+class PoolExhausted(Exception):
+    """ no connection of a pool was given back within the timeout of get() """
+
 
 class BaseDatabase:
     def __init__(self, host, user, password, port=None):
@@ -109,36 +124,232 @@ class Database(BaseDatabase):
         except pymysql.Error as e:
             _logger.error("MySQL::Error in database connection. %s" % str(e))
             sys.exit(0)
+        # statements inside transaction() are committed together at its end
+        self.in_transaction = False
+
+    def insert(self, query, params=None):
+        self.execute(query, params)
+
+    def execute(self, query, params=None):
+        """
+        executes a statement, the %s placeholders of the query are bound to params by the driver.
+        Outside of a transaction the statement is committed, a failed statement is logged and rolled back;
+        inside transaction() the error is raised and the whole transaction is rolled back
+
+        returns
+        -------
+        int
+            number of affected rows, None if the statement failed
+        """
+        return self.run_statement(self.cursor.execute, query, params)
 
-    def insert(self, query):
+    def executemany(self, query, rows):
+        """
+        executes a statement for each parameter tuple of rows, a multi-row INSERT ... VALUES is sent as
+        one statement with all the rows
+        """
+        return self.run_statement(self.cursor.executemany, query, rows)
+
+    def run_statement(self, execute, query, params):
         try:
-            self.cursor.execute(query)
-            self.connection.commit()
+            row_count = execute(query, params)
+            if not self.in_transaction:
+                self.connection.commit()
+            return row_count
         except pymysql.Error as e:
+            if self.in_transaction:
+                raise
             _logger.error("Error {}".format(e))
-            # _logger.debug("Query: {}".format(query))
             self.connection.rollback()
 
-    def query(self, query):
+    @contextlib.contextmanager
+    def transaction(self):
+        """ statements executed in the block are committed together, an error rolls all of them back """
+        if self.in_transaction:
+            yield self
+            return
+        self.connection.begin()
+        self.in_transaction = True
+        try:
+            yield self
+            self.connection.commit()
+        except BaseException:
+            self.connection.rollback()
+            raise
+        finally:
+            self.in_transaction = False
+
+    def query(self, query, params=None):
         try:
             cursor = self.connection.cursor(pymysql.cursors.DictCursor)
-            cursor.execute(query)
+            cursor.execute(query, params)
             return cursor.fetchall()
         except pymysql.Error as e:
             _logger.error("Error {}".format(e))
 
-    def query_one(self, query):
+    def query_one(self, query, params=None):
         try:
             cursor = self.connection.cursor(pymysql.cursors.DictCursor)
-            cursor.execute(query)
+            cursor.execute(query, params)
             return cursor.fetchone()
         except pymysql.Error as e:
             _logger.error("Error {}".format(e))
 
-    def rowcount(self, query):
+    def rowcount(self, query, params=None):
         cursor = self.connection.cursor(pymysql.cursors.DictCursor)
-        cursor.execute(query)
+        cursor.execute(query, params)
         return cursor.rowcount
 
+    def ping(self):
+        """ checks the connection and reconnects if the server has closed it """
+        try:
+            self.connection.ping(reconnect=True)
+        except pymysql.Error as e:
+            _logger.error("MySQL::Error in database connection. %s" % str(e))
+            sys.exit(0)
+
+    def close(self):
+        if self.connection.open:
+            self.connection.close()
+
     def __del__(self):
-        self.connection.close()
+        self.close()
+
+
+class NamedLock:
+    """
+    MySQL named lock (GET_LOCK) of a connection. The lock is server wide, another connection cannot take it
+    until it is released or the connection is closed
+    """
+    def __init__(self, db, name, timeout=0):
+        """
+        parameters
+        ----------
+        db: Database
+            connection holding the lock
+        name: str
+            lock name, at most 64 characters are used
+        timeout: int
+            seconds to wait for the lock
+        """
+        self.db = db
+        self.name = name[:64]
+        self.timeout = timeout
+        self.acquired = False
+
+    def acquire(self):
+        data = self.db.query_one(f"SELECT GET_LOCK('{self.name}', {self.timeout}) AS acquired")
+        self.acquired = data is not None and data['acquired'] == 1
+        return self.acquired
+
+    def release(self):
+        if self.acquired:
+            self.db.query_one(f"SELECT RELEASE_LOCK('{self.name}') AS released")
+            self.acquired = False
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
+
+
+class ConnectionPool:
+    """
+    Pool of Database connections of a database. A connection is borrowed with get() or connection() and given back
+    with put(); a connection idle for longer than health_check_interval seconds is pinged before it is handed out
+    and is reconnected if the server has closed it
+    """
+    def __init__(self, host, user, password, db, size=DEFAULT_POOL_SIZE, port=None,
+                 health_check_interval=HEALTH_CHECK_INTERVAL):
+        """
+        parameters
+        ----------
+        host, user, password, db, port:
+            connection settings, the connections are opened with local_infile
+        size: int
+            maximum number of open connections, get() waits up to POOL_TIMEOUT seconds for a connection when all
+            of them are borrowed
+        health_check_interval: float
+            seconds a connection can be idle before it is checked
+        """
+        self.host = host
+        self.user = user
+        self.password = password
+        self.db = db
+        self.port = port
+        self.size = max(1, size)
+        self.health_check_interval = health_check_interval
+        self.idle = queue.LifoQueue()
+        self.opened = 0
+        self.lock = threading.Lock()
+        self.pid = os.getpid()
+
+    def get(self, timeout=POOL_TIMEOUT):
+        """
+        borrows a connection, an idle one if there is one. When all size connections are borrowed it waits
+        timeout seconds (None waits forever) for one to be given back and raises PoolExhausted after that
+        """
+        with self.lock:
+            open_new = self.idle.empty() and self.opened < self.size
+            if open_new:
+                self.opened += 1
+        if open_new:
+            try:
+                db = Database(self.host, self.user, self.password, self.db, 1, port=self.port)
+            except BaseException:
+                with self.lock:
+                    self.opened -= 1
+                raise
+            _logger.debug(f"Connection pool of {self.db}: {self.opened} of {self.size} connections open")
+            return db
+        try:
+            db, returned = self.idle.get(timeout=timeout)
+        except queue.Empty:
+            raise PoolExhausted(f"Connection pool of {self.db}: all {self.size} connections are borrowed and none "
+                                f"was given back within {timeout} s, raise pool_size in the database "
+                                f"configuration") from None
+        if time.monotonic() - returned > self.health_check_interval:
+            db.ping()
+        return db
+
+    def put(self, db):
+        """ gives back a borrowed connection, an open transaction is rolled back """
+        try:
+            db.connection.rollback()
+        except pymysql.Error:
+            pass
+        self.idle.put((db, time.monotonic()))
+
+    @contextlib.contextmanager
+    def connection(self):
+        db = self.get()
+        try:
+            yield db
+        finally:
+            self.put(db)
+
+    def close(self):
+        while not self.idle.empty():
+            db, _ = self.idle.get_nowait()
+            db.close()
+            with self.lock:
+                self.opened -= 1
+
+
+_pools = {}
+
+
+def connection_pool(db_config):
+    """
+    connection pool of a database configuration, shared by the app components of a process. A process started
+    with fork gets its own pool, the connections of the parent process are not used
+    """
+    key = (db_config.host, db_config.db_username, db_config.db_name, db_config.db_port)
+    pool = _pools.get(key)
+    if pool is None or pool.pid != os.getpid():
+        pool_size = getattr(db_config, 'pool_size', None) or DEFAULT_POOL_SIZE
+        pool = _pools[key] = ConnectionPool(db_config.host, db_config.db_username, db_config.db_password,
+                                            db_config.db_name, size=pool_size, port=db_config.db_port)
+    return pool
@@ -1,11 +1,67 @@
 from pathlib import Path
 import pkg_resources
 import logging
-from .dbconnect import DatabaseCreate, Database
+import time
+from .dbconnect import DatabaseCreate, connection_pool
 from .commondata import DownloadCommonData, upload_shared_data
 from .config_utility import DatabaseConfig
 _logger = logging.getLogger("galEupy.dbschema")
 
+# secondary indexes of the organism scoped queries, databases created before they were in DbSchema.sql get them
+# from upgrade_indexes()
+ORGANISM_INDEXES = {
+    'organism': {'organism_taxon_strain': ('taxon_ID', 'strain_number')},
+    'nasequenceimp': {'nasequenceimp_taxon_strain': ('taxon_ID', 'strain_number', 'sequence_type_ID')},
+    'nafeatureimp': {'nafeatureimp_sequence_type': ('na_sequence_ID', 'feature_type', 'name')},
+    'nalocation': {'nalocation_feature': ('na_feature_ID',)},
+    'geneinstance': {'geneinstance_feature': ('na_feature_ID',)},
+    'protein': {'protein_gene_instance': ('gene_instance_ID', 'name')},
+    'proteininstancefeature': {'proteininstancefeature_organism': ('taxonomy_id', 'strain_number')},
+}
+
+# the organism scoped lookups and the joins of the organism deletion, checked with EXPLAIN
+ORGANISM_QUERIES = {
+    'transcript map': """SELECT gi.gene_instance_ID, mrna.name, cds.name, p.name FROM nasequenceimp na
+    JOIN nafeatureimp mrna ON mrna.na_sequence_ID = na.na_sequence_ID AND mrna.feature_type = 'mRNA'
+    JOIN geneinstance gi ON gi.na_feature_ID = mrna.na_feature_ID
+    JOIN nafeatureimp cds ON cds.na_sequence_ID = na.na_sequence_ID AND cds.feature_type = 'cds'
+    JOIN protein p ON p.gene_instance_ID = gi.gene_instance_ID
+    WHERE na.taxon_ID = %(taxon_id)s AND na.strain_number = %(strain_number)s""",
+    'protein file': """SELECT nf.name, p.gene_instance_ID, p.sequence FROM nasequenceimp ns, nafeatureimp nf,
+    geneinstance gi, protein p WHERE ns.taxon_ID = %(taxon_id)s AND ns.strain_number = %(strain_number)s
+    AND ns.sequence_type_ID = 6 AND nf.na_sequence_ID = ns.na_sequence_ID AND nf.feature_type = 'mRNA'
+    AND gi.na_feature_ID = nf.na_feature_ID AND p.gene_instance_ID = gi.gene_instance_ID""",
+    'delete nalocation': """SELECT nl.na_location_ID FROM nalocation AS nl
+    INNER JOIN nafeatureimp AS nf ON nl.na_feature_ID = nf.na_feature_ID
+    INNER JOIN nasequenceimp AS ns ON nf.na_sequence_ID = ns.na_sequence_ID
+    WHERE ns.taxon_ID = %(taxon_id)s AND ns.strain_number = %(strain_number)s AND ns.sequence_type_ID != 1""",
+    'delete protein': """SELECT p.protein_ID FROM protein AS p
+    INNER JOIN geneinstance AS gi ON p.gene_instance_ID = gi.gene_instance_ID
+    INNER JOIN nafeatureimp AS nf ON gi.na_feature_ID = nf.na_feature_ID
+    INNER JOIN nasequenceimp AS ns ON nf.na_sequence_ID = ns.na_sequence_ID
+    WHERE ns.taxon_ID = %(taxon_id)s AND ns.strain_number = %(strain_number)s AND ns.sequence_type_ID = 6""",
+    'delete protein features': """SELECT pi.protein_instance_feature_ID FROM proteininstancefeature AS pi
+    WHERE pi.taxonomy_id = %(taxon_id)s AND pi.strain_number = %(strain_number)s""",
+    'organism existence': """SELECT organism_ID FROM organism
+    WHERE taxon_ID = %(taxon_id)s AND strain_number = %(strain_number)s""",
+}
+
+
+# tables range partitioned by their primary key in the partitioned schema, each organism upload adds the
+# partition of its ID block
+RANGE_PARTITIONED_TABLES = {
+    'nasequenceimp': 'na_sequence_ID',
+    'nafeatureimp': 'na_feature_ID',
+    'nalocation': 'na_location_ID',
+}
+# the protein feature IDs are not reserved in blocks, the table is list partitioned by the organism columns
+LIST_PARTITIONED_TABLES = {
+    'proteininstancefeature': ('protein_instance_feature_ID', ('taxonomy_id', 'strain_number')),
+}
+PARTITION_LOCK_TIMEOUT = 600
+PARTITION_DDL_TIMEOUT = 10
+PARTITION_DDL_RETRIES = 6
+
 
 def database_schema(db_config):
     _logger.debug('Checking database Schemas')
@@ -14,17 +70,24 @@ def database_schema(db_config):
 
     if schema_existence:
         _logger.debug('Database Schema already exist')
+        schema.upgrade_indexes()
+        if schema.partitioned:
+            schema.partition_tables()
+        schema.close()
         return True
     else:
         _logger.debug('Uploading Database Scheme : Processing')
         schema.upload_schema()
 
         schema.add_database_constrain()
+        if schema.partitioned:
+            schema.partition_tables()
         _logger.debug('Uploading Database Scheme : Complete')
 
         _logger.debug('Uploading Shared data : Processing')
         schema.download_upload_commondata()
         _logger.debug('Uploading Shared data : Complete')
+        schema.close()
 
         return True
 
@@ -53,6 +116,7 @@ class UploadSchema(DefaultSchemaPath, DatabaseConfig):
         # _logger.debug('UploadSchema class initiation')
         self.db = DatabaseCreate(self.host, self.db_username, self.db_password, port=self.db_port)
         self.db_name = self.db_name
+        self.db_dots = None
 
     def create_database(self):
         db_name = self.db.create(self.db_name)
@@ -61,9 +125,16 @@ class UploadSchema(DefaultSchemaPath, DatabaseConfig):
 
     @property
     def db_connection(self):
-        _logger.debug("connect to database")
-        db_dots = Database(self.host, self.db_username, self.db_password, self.db_name, 1, port=self.db_port)
-        return db_dots
+        """ connection of the database borrowed from the connection pool, it is kept until close() """
+        if self.db_dots is None:
+            _logger.debug("connect to database")
+            self.db_dots = connection_pool(self).get()
+        return self.db_dots
+
+    def close(self):
+        if self.db_dots is not None:
+            connection_pool(self).put(self.db_dots)
+            self.db_dots = None
 
     def check_schema_existence(self):
         # _logger.debug('Checking Schema existence')
@@ -88,6 +159,107 @@ class UploadSchema(DefaultSchemaPath, DatabaseConfig):
         else:
             _logger.error(f"File not found: {self.schema_path}")
 
+    def upgrade_indexes(self):
+        """ adds the missing indexes of ORGANISM_INDEXES to a database created with an older schema """
+        index_query = """SELECT DISTINCT TABLE_NAME AS table_name, INDEX_NAME AS index_name
+        FROM information_schema.STATISTICS WHERE TABLE_SCHEMA = %s"""
+        existing = {(row['table_name'].lower(), row['index_name'])
+                    for row in self.db_connection.query(index_query, (self.db_name,)) or []}
+        for table_name, indexes in ORGANISM_INDEXES.items():
+            for index_name, columns in indexes.items():
+                if (table_name, index_name) in existing:
+                    continue
+                _logger.info(f"Adding index {index_name} ({', '.join(columns)}) to {table_name}, "
+                             f"large tables take a while")
+                self.db_connection.execute(f"ALTER TABLE {table_name} ADD INDEX `{index_name}` ({', '.join(columns)})")
+
+    def check_index_usage(self, taxonomy_id=None, strain_number=None):
+        """
+        runs EXPLAIN on the organism scoped queries and logs the index used for each table
+
+        parameters
+        ----------
+        taxonomy_id: int
+            organism of the queries, the first uploaded organism by default
+        strain_number: int
+            strain number of the organism
+
+        returns
+        -------
+        bool
+            False if a table of the queries is read with a full table or index scan
+        """
+        if taxonomy_id is None:
+            organism = self.db_connection.query_one("SELECT taxon_ID, strain_number FROM organism LIMIT 1") or {}
+            taxonomy_id, strain_number = organism.get('taxon_ID', 0), organism.get('strain_number', 0)
+        params = {'taxon_id': taxonomy_id, 'strain_number': strain_number}
+        indexes_used = True
+        for query_name, query in ORGANISM_QUERIES.items():
+            plan = self.db_connection.query(f"EXPLAIN {query}", params) or []
+            for row in plan:
+                if row['table'] is None:
+                    continue
+                full_scan = row['type'] in ('ALL', 'index')
+                indexes_used = indexes_used and not full_scan
+                log = _logger.warning if full_scan else _logger.info
+                log(f"{query_name:>24}: {row['table']:<6} {row['type']:<7} key {row['key']} "
+                    f"rows {row['rows']}{' (full scan)' if full_scan else ''}")
+        return indexes_used
+
+    def partition_tables(self):
+        """
+        converts the tables of RANGE_PARTITIONED_TABLES and LIST_PARTITIONED_TABLES to the partitioned schema.
+        Partitioned InnoDB tables cannot have foreign keys, the foreign keys of and to these tables are dropped and
+        the loaded rows are checked by the validation of the bulk load session instead. Without the ON DELETE
+        CASCADE of nafeatureimp.parent_ID, OrganismDeletion deletes the child features before their parents.
+        LIST COLUMNS partitions cannot be keyed by a FLOAT column, strain_number of the protein features stays an
+        integer and organisms with a fractional strain number are refused (OrganismPartitions.check_strain_number)
+        The rows of a converted table stay in its shared partitions, only organisms uploaded afterwards get
+        partitions of their own
+        """
+        existing = partitioned_tables(self.db_connection)
+        tables = list(RANGE_PARTITIONED_TABLES) + list(LIST_PARTITIONED_TABLES)
+        if existing.issuperset(tables):
+            return True
+
+        placeholders = ', '.join(['%s'] * len(tables))
+        foreign_key_query = f"""SELECT DISTINCT TABLE_NAME AS table_name, CONSTRAINT_NAME AS constraint_name
+        FROM information_schema.KEY_COLUMN_USAGE WHERE TABLE_SCHEMA = %s AND REFERENCED_TABLE_NAME IS NOT NULL
+        AND (TABLE_NAME IN ({placeholders}) OR REFERENCED_TABLE_NAME IN ({placeholders}))"""
+        foreign_keys = self.db_connection.query(foreign_key_query, (self.db_name, *tables, *tables)) or []
+        for row in foreign_keys:
+            _logger.info(f"Dropping foreign key {row['constraint_name']} of {row['table_name']}")
+            self.db_connection.execute(f"ALTER TABLE {row['table_name']} DROP FOREIGN KEY `{row['constraint_name']}`")
+
+        for table_name, id_column in RANGE_PARTITIONED_TABLES.items():
+            if table_name in existing:
+                continue
+            _logger.info(f"Partitioning {table_name} by {id_column} ranges, large tables take a while")
+            if self.db_connection.execute(f"""ALTER TABLE {table_name} PARTITION BY RANGE ({id_column})
+            (PARTITION pmax VALUES LESS THAN MAXVALUE)""") is None:
+                return False
+
+        for table_name, (id_column, columns) in LIST_PARTITIONED_TABLES.items():
+            if table_name in existing:
+                continue
+            _logger.info(f"Partitioning {table_name} by {', '.join(columns)}, large tables take a while")
+            # the primary key of a partitioned table includes the partitioning columns, which cannot be NULL
+            self.db_connection.execute(f"""UPDATE {table_name} SET {', '.join(f'{column} = 0' for column in columns)}
+            WHERE {' OR '.join(f'{column} IS NULL' for column in columns)}""")
+            self.db_connection.execute(f"""ALTER TABLE {table_name}
+            {', '.join(f'MODIFY {column} int(11) NOT NULL DEFAULT 0' for column in columns)},
+            DROP PRIMARY KEY, ADD PRIMARY KEY ({id_column}, {', '.join(columns)})""")
+            # every organism already in the table gets its partition, a list partitioned table has no catch-all
+            organisms = self.db_connection.query(f"SELECT DISTINCT {', '.join(columns)} FROM {table_name}") or []
+            values = {(0, 0)} | {tuple(row[column] for column in columns) for row in organisms}
+            partitions = ', '.join(
+                f"PARTITION {organism_partition_name(*value)} VALUES IN (({', '.join(str(v) for v in value)}))"
+                for value in sorted(values))
+            if self.db_connection.execute(f"""ALTER TABLE {table_name}
+            PARTITION BY LIST COLUMNS ({', '.join(columns)}) ({partitions})""") is None:
+                return False
+        return True
+
     def add_database_constrain(self):
         organism_table = self.db_name + ".organism"
         taxonomy_table = self.db_name + ".taxon"
@@ -132,3 +304,132 @@ class UploadSchema(DefaultSchemaPath, DatabaseConfig):
             _logger.error("Error: {}".format(e))
 
 
+
+
+def partitioned_tables(db):
+    """ names of the partitioned tables of the database of a connection """
+    query = """SELECT DISTINCT TABLE_NAME AS table_name FROM information_schema.PARTITIONS
+    WHERE TABLE_SCHEMA = %s AND PARTITION_NAME IS NOT NULL"""
+    return {row['table_name'].lower() for row in db.query(query, (db.db,)) or []}
+
+
+def organism_partition_name(taxonomy_id, strain_number):
+    return f"o{taxonomy_id}_{float(strain_number):g}".replace('.', '_')
+
+
+class OrganismPartitions:
+    """
+    Partitions of an organism in the partitioned schema. The rows of an upload in the range partitioned tables
+    carry the IDs of its reserved ID blocks, create() adds a partition covering the block of each table and the
+    list partition of the protein features. Removing the organism then drops its partitions instead of deleting
+    the rows one by one
+    """
+    def __init__(self, db, taxonomy_id, strain_number):
+        """
+        parameters
+        ----------
+        db: Database
+            connection of the partition statements
+        taxonomy_id: int
+            taxon of the organism
+        strain_number: int
+            strain number of the organism
+        """
+        self.db = db
+        self.taxonomy_id = taxonomy_id
+        self.strain_number = strain_number
+        self.name = organism_partition_name(taxonomy_id, strain_number)
+        self.tables = partitioned_tables(db)
+
+    @property
+    def enabled(self):
+        """ True if the database has the partitioned schema """
+        return bool(self.tables)
+
+    def check_strain_number(self):
+        """
+        False for a fractional strain number in the partitioned schema. The list partitions of the protein features
+        are keyed by an integer strain number, organism.strain_number is FLOAT and keeps the fraction
+        """
+        if self.enabled and float(self.strain_number) != int(float(self.strain_number)):
+            _logger.error(f"Strain number {self.strain_number} is not a whole number, the partitioned schema "
+                          f"takes whole strain numbers only")
+            return False
+        return True
+
+    def partitions(self, table_name):
+        """ upper bound of each partition of a table, in partition order """
+        query = """SELECT PARTITION_NAME AS name, PARTITION_DESCRIPTION AS description
+        FROM information_schema.PARTITIONS WHERE TABLE_SCHEMA = %s AND TABLE_NAME = %s AND PARTITION_NAME IS NOT NULL
+        ORDER BY PARTITION_ORDINAL_POSITION"""
+        return {row['name']: row['description'] for row in self.db.query(query, (self.db.db, table_name)) or []}
+
+    def alter(self, statement):
+        """
+        runs a partition statement with a short metadata lock wait. The open load transactions of other uploads
+        hold the metadata lock of the table and their new statements would queue behind a waiting ALTER TABLE,
+        so the statement gives way and is retried
+        """
+        self.db.execute(f"SET SESSION lock_wait_timeout = {PARTITION_DDL_TIMEOUT}")
+        try:
+            for _ in range(PARTITION_DDL_RETRIES):
+                if self.db.execute(statement) is not None:
+                    return True
+                time.sleep(PARTITION_DDL_TIMEOUT)
+            return False
+        finally:
+            self.db.execute("SET SESSION lock_wait_timeout = DEFAULT")
+
+    def create(self, id_allocators):
+        """
+        adds the partitions of the organism, a partition left by an earlier upload of the organism is dropped first.
+        The blocks have to be reserved and their partitions added under the partition lock of the database,
+        a block below the last partition of a table cannot get a partition
+
+        parameters
+        ----------
+        id_allocators: dict
+            IdBlockAllocator of each range partitioned table, before any ID was handed out
+
+        returns
+        -------
+        bool
+            False if a table has no partition of the organism, its rows are deleted by chunks
+        """
+        created = True
+        for table_name in RANGE_PARTITIONED_TABLES:
+            if table_name not in self.tables:
+                continue
+            if self.name in self.partitions(table_name):
+                self.alter(f"ALTER TABLE {table_name} DROP PARTITION {self.name}")
+            bounds = [int(bound) for bound in self.partitions(table_name).values() if bound != 'MAXVALUE']
+            last_bound = max(bounds, default=1)
+            allocator = id_allocators[table_name]
+            if allocator.next_id < last_bound:
+                _logger.warning(f"{table_name}: IDs {allocator.next_id} to {allocator.block_end - 1} are below the "
+                                f"last partition, {self.name} has no partition")
+                created = False
+                continue
+            new_partitions = []
+            if allocator.next_id > last_bound:
+                # the rows between the partitions, e.g. IDs of blocks reserved past the end of an organism block
+                new_partitions.append(f"PARTITION g{allocator.next_id} VALUES LESS THAN ({allocator.next_id})")
+            new_partitions.append(f"PARTITION {self.name} VALUES LESS THAN ({allocator.block_end})")
+            new_partitions.append("PARTITION pmax VALUES LESS THAN MAXVALUE")
+            _logger.info(f"{table_name}: partition {self.name} for IDs {allocator.next_id} to "
+                         f"{allocator.block_end - 1}")
+            created = self.alter(f"ALTER TABLE {table_name} REORGANIZE PARTITION pmax INTO "
+                                 f"({', '.join(new_partitions)})") and created
+
+        for table_name in LIST_PARTITIONED_TABLES:
+            if table_name in self.tables and self.name not in self.partitions(table_name):
+                created = self.alter(f"""ALTER TABLE {table_name} ADD PARTITION (PARTITION {self.name}
+                VALUES IN (({self.taxonomy_id}, {float(self.strain_number):g})))""") and created
+        return created
+
+    def drop(self, table_name):
+        """ drops the partition of the organism of a table, True if it was dropped """
+        if table_name not in self.tables or self.name not in self.partitions(table_name):
+            return False
+        _logger.info(f"{table_name}: dropping partition {self.name}")
+        return self.alter(f"ALTER TABLE {table_name} DROP PARTITION {self.name}")
@@ -1,10 +1,19 @@
+import contextlib
 import logging
+import pymysql
 from .directory_utility import UploadDirectory, GALFileHandler
 from .general_utility import BaseCount
 from .taxomony import OrganismName
 from .general_utility import get_date
+from .bulk_loader import PipelinedLoader, DEFAULT_LOAD_CONNECTIONS
+from .dbconnect import Database
 _logger = logging.getLogger("galEupy.dbtable_utility")
 
+# IDs of a central dogma table reserved at a time by an upload
+ID_BLOCK_SIZE = 100000
+# ID block of a partitioned table, the block is the range of the organism partition
+PARTITION_BLOCK_SIZE = 2000000
+
 
 class TableStatusID:
     def __init__(self, db_conn):
@@ -89,6 +98,117 @@ class TableStatusID:
         return row_dct
 
 
+class IdBlockAllocator:
+    """
+    Hands out the IDs of a table from blocks reserved in the idsequence table. A block is taken with
+    UPDATE idsequence SET next_id = LAST_INSERT_ID(next_id) + block_size, the row lock is held only for the
+    update, so concurrent uploads get disjoint blocks.
+    """
+    sequence_table_query = """CREATE TABLE IF NOT EXISTS idsequence (
+        table_name VARCHAR(64) NOT NULL,
+        next_id BIGINT NOT NULL,
+        PRIMARY KEY (table_name)
+    ) ENGINE=InnoDB"""
+
+    def __init__(self, db_conn, table_name, id_column, block_size=ID_BLOCK_SIZE, sequence_name=None, where=None):
+        """
+        parameters
+        ----------
+        db_conn: Database
+            connection used for the reservations
+        table_name: str
+        id_column: str
+            primary key column, its maximum is the start of the sequence of a table without an idsequence row
+        block_size: int
+            number of IDs reserved at a time
+        sequence_name: str
+            idsequence row, the table name by default
+        where: str
+            condition of the rows whose maximum starts the sequence
+        """
+        self.db = db_conn
+        self.table_name = table_name
+        self.id_column = id_column
+        self.block_size = block_size
+        self.sequence_name = sequence_name or table_name
+        self.where = f" WHERE {where}" if where else ''
+        self.next_id = None
+        self.block_end = None
+        self.blocks = []
+        self.reserve_block()
+
+    @contextlib.contextmanager
+    def reservation_connection(self):
+        """
+        connection of a reservation. While a transaction of db is open the reservation is made on a dedicated
+        connection, its commit (and the implicit commit of CREATE TABLE) would commit the statements of the
+        transaction and a rollback would discard them
+        """
+        if not self.db.in_transaction:
+            yield self.db
+            return
+        db = Database(self.db.host, self.db.user, self.db.password, self.db.db, 0, port=self.db.port)
+        try:
+            yield db
+        finally:
+            db.close()
+
+    def reserve_block(self):
+        try:
+            with self.reservation_connection() as db, db.transaction():
+                if self.block_end is None:
+                    db.execute(self.sequence_table_query)
+                    db.execute(f"""INSERT IGNORE INTO idsequence (table_name, next_id)
+                    SELECT '{self.sequence_name}', COALESCE(MAX({self.id_column}), 0) + 1
+                    FROM {self.table_name}{self.where}""")
+                db.execute(f"""UPDATE idsequence SET next_id = LAST_INSERT_ID(next_id) + {self.block_size}
+                WHERE table_name = '{self.sequence_name}'""")
+                db.execute("SELECT LAST_INSERT_ID()")
+                (first_id,) = db.cursor.fetchone()
+        except pymysql.Error as e:
+            _logger.error(f"ID block of {self.sequence_name} could not be reserved: {e}")
+            raise
+        self.next_id = first_id
+        self.block_end = first_id + self.block_size
+        self.blocks.append(first_id)
+        _logger.debug(f"{self.sequence_name} IDs reserved: {first_id} to {self.block_end - 1}")
+
+    def move_to(self, value):
+        """ sets the next ID, past the reserved block the next ID is the start of a new block """
+        if value < self.block_end:
+            self.next_id = value
+        else:
+            self.reserve_block()
+
+    def used_ranges(self):
+        """ ranges (first, end) of the IDs handed out from the reserved blocks, end excluded """
+        ranges = [(first_id, first_id + self.block_size) for first_id in self.blocks[:-1]]
+        return ranges + [(self.blocks[-1], self.next_id)]
+
+    def release(self):
+        """ returns the unused end of the last block if no other upload has reserved a block after it """
+        try:
+            with self.reservation_connection() as db, db.transaction():
+                db.execute(f"""UPDATE idsequence SET next_id = {self.next_id}
+                WHERE table_name = '{self.sequence_name}' AND next_id = {self.block_end}""")
+        except pymysql.Error as e:
+            _logger.error(f"ID block of {self.sequence_name} could not be released: {e}")
+
+
+class ReservedId:
+    """ ID attribute of a table, its values come from the IdBlockAllocator of the table in id_allocators """
+    def __init__(self, table_name):
+        self.table_name = table_name
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+        return instance.id_allocators[self.table_name].next_id
+
+    def __set__(self, instance, value):
+        instance.id_allocators[self.table_name].move_to(value)
+
+
 class DefaultVariables:
     externalDatabaseID = 8
     source_na_sequence_ID = 0
@@ -118,7 +238,21 @@ class DefaultVariables:
 
 
 class TableUtility(TableStatusID, OrganismName, DefaultVariables, GALFileHandler):
-    def __init__(self, db_dots, upload_dir, organism, taxonomy_id, version):
+    # table and primary key of each ID attribute
+    id_columns = {
+        'nasequenceimp': 'na_sequence_ID',
+        'nafeatureimp': 'na_feature_ID',
+        'nalocation': 'na_location_ID',
+        'geneinstance': 'gene_instance_ID',
+        'protein': 'protein_ID',
+    }
+    NaSequenceId = ReservedId('nasequenceimp')
+    NaFeatureId = ReservedId('nafeatureimp')
+    na_location_Id = ReservedId('nalocation')
+    GeneInstanceId = ReservedId('geneinstance')
+    ProteinId = ReservedId('protein')
+
+    def __init__(self, db_dots, upload_dir, organism, taxonomy_id, version, partitioned_tables=()):
         """ class constructor process the data for GAL table structure
         parameter
         ---------
@@ -132,14 +266,54 @@ class TableUtility(TableStatusID, OrganismName, DefaultVariables, GALFileHandler
             taxonomy id for the organism
         version: str
             assembly version for the organism (i.e; 1, 2)
+        partitioned_tables: iterable
+            range partitioned tables, their IDs are reserved in blocks of PARTITION_BLOCK_SIZE
 
         """
         OrganismName.__init__(self, organism, version)
         self.taxonomy_id = taxonomy_id
-        TableStatusID.__init__(self, db_dots)
+        self.db_dots = db_dots
+        self.partitioned_tables = set(partitioned_tables)
+        self.id_allocators = {
+            table_name: IdBlockAllocator(db_dots, table_name, id_column,
+                                         PARTITION_BLOCK_SIZE if table_name in self.partitioned_tables
+                                         else ID_BLOCK_SIZE)
+            for table_name, id_column in self.id_columns.items()}
         GALFileHandler.__init__(self, upload_dir)
         DefaultVariables.__init__(self)
         self.present_day = get_date()
+        # BaseCount of the gene sequences of the scaffold being written, see count_gene_bases
+        self.gene_base_counts = {}
+
+    def show_id_log(self):
+        log_str = "First IDs of the reserved blocks.."
+        for table_name, allocator in self.id_allocators.items():
+            log_str += f"\n                        {table_name} ID: {allocator.next_id}"
+        _logger.info(log_str)
+
+    def release_id_blocks(self):
+        for table_name, allocator in self.id_allocators.items():
+            # a released tail would put the rows of the next upload into the partition of this organism
+            if table_name not in self.partitioned_tables:
+                allocator.release()
+
+    def count_gene_bases(self, gene_group):
+        """
+        counts the bases of the gene sequences of a scaffold together with BaseCount.batch,
+        na_sequenceimp_gene takes the count of each gene from gene_base_counts
+
+        parameters
+        ----------
+        gene_group: dict
+            gene_id -> gene dictionary with the gene_sequence of the gene
+        """
+        gene_names, sequences = [], []
+        for gene_id, gene_dct in gene_group.items():
+            sequence = gene_dct.get('gene_sequence')
+            if sequence:
+                gene_names.append(self.prefix + gene_id)
+                sequences.append(str(sequence))
+        self.gene_base_counts = dict(zip(gene_names, BaseCount.batch(sequences)))
 
     def na_sequenceimp_scaffold(self, na_sequence_id, scaffold, sequence):
         """
@@ -157,35 +331,24 @@ class TableUtility(TableStatusID, OrganismName, DefaultVariables, GALFileHandler
         sequence_type_id = 1
         gi_number = "GI:{}".format(scaffold)
 
-        sequence_string = get_sequence_string(sequence)
-        string1 = '{}\t{}\t{}\t{}\t{}\t{}'.format(na_sequence_id, self.org_version, subclass_view, sequence_type_id,
-                                                  self.taxonomy_id, sequence_string)
-
-        string2 = '{}\t{}\t{}\t{}'.format(self.org_name, 'NULL', self.sequence_piece_ID,
-                                          self.sequencing_center_contact_ID)
-        string3 = '{}\t{}\t{}\t{}'.format(self.present_day, scaffold, gi_number, scaffold)
-        final_string = '{}\t{}\t{}\n'.format(string1, string2, string3)
-
-        self.NaSequenceImp_fh.write(final_string)  # write to file
-        return final_string
+        row = [na_sequence_id, self.org_version, subclass_view, sequence_type_id, self.taxonomy_id,
+               *sequence_fields(sequence),
+               self.org_name, 'NULL', self.sequence_piece_ID, self.sequencing_center_contact_ID,
+               self.present_day, scaffold, gi_number, scaffold]
+        self.NaSequenceImp_writer.write_row(row)  # write to file
 
     def na_sequenceimp_gene(self, na_sequence_id, scaffold, source_na_sequence_id, gene_data):
         subclass_view = "ExternalNASequence"
         sequence_type_id = 6
-        sequence_string = get_sequence_string(gene_data.gene_sequence)
 
         gi_number = "GI:{}".format(scaffold)
         description = "Unknown"
 
-        string1 = '{}\t{}\t{}\t{}\t{}\t{}'.format(na_sequence_id, self.org_version, subclass_view, sequence_type_id,
-                                                  self.taxonomy_id, sequence_string)
-        string2 = '{}\t{}\t{}\t{}'.format(description, source_na_sequence_id, self.sequence_piece_ID,
-                                          self.sequencing_center_contact_ID)
-        string3 = '{}\t{}\t{}\t{}'.format(self.present_day, scaffold, gi_number, gene_data.gene_name)
-
-        final_string = '{}\t{}\t{}\n'.format(string1, string2, string3)
-        self.NaSequenceImp_fh.write(final_string)  # write to file
-        return final_string
+        row = [na_sequence_id, self.org_version, subclass_view, sequence_type_id, self.taxonomy_id,
+               *sequence_fields(gene_data.gene_sequence, self.gene_base_counts.pop(gene_data.gene_name, None)),
+               description, source_na_sequence_id, self.sequence_piece_ID, self.sequencing_center_contact_ID,
+               self.present_day, scaffold, gi_number, gene_data.gene_name]
+        self.NaSequenceImp_writer.write_row(row)  # write to file
 
     def na_featureimp(self, na_feature_id, na_sequence_id, feature_type, name, parent_id):
         if name == 'gene':
@@ -198,14 +361,9 @@ class TableUtility(TableStatusID, OrganismName, DefaultVariables, GALFileHandler
         is_predicted = 0
         review_status_id = 0
 
-        string1 = '{}\t{}\t{}\t{}\t{}'.format(na_feature_id, na_sequence_id, sub_class_view, feature_type, name)
-
-        string2 = '{}\t{}\t{}\t{}\t{}\t{}'.format(parent_id, external_database_id, source_id, prediction_algorithm_id,
-                                                  is_predicted, review_status_id)
-
-        final_string = '{}\t{}\n'.format(string1, string2)
-        self.NaFeatureImp_fh.write(final_string)
-        return final_string
+        row = [na_feature_id, na_sequence_id, sub_class_view, feature_type, name,
+               parent_id, external_database_id, source_id, prediction_algorithm_id, is_predicted, review_status_id]
+        self.NaFeatureImp_writer.write_row(row)
 
     def na_featureimp_rna(self, na_feature_id, na_sequence_id, feature_type, name, parent_id):
         sub_class_view = feature_type
@@ -216,13 +374,9 @@ class TableUtility(TableStatusID, OrganismName, DefaultVariables, GALFileHandler
         is_predicted = 0
         review_status_id = 0
 
-        string1 = '{}\t{}\t{}\t{}\t{}'.format(na_feature_id, na_sequence_id, sub_class_view, feature_type, name)
-
-        string2 = '{}\t{}\t{}\t{}\t{}\t{}'.format(parent_id, external_database_id, source_id, prediction_algorithm_id,
-                                                  is_predicted, review_status_id)
-        final_string = '{}\t{}\n'.format(string1, string2)
-        self.NaFeatureImp_fh.write(final_string)
-        return final_string
+        row = [na_feature_id, na_sequence_id, sub_class_view, feature_type, name,
+               parent_id, external_database_id, source_id, prediction_algorithm_id, is_predicted, review_status_id]
+        self.NaFeatureImp_writer.write_row(row)
 
     def na_location(self, na_location_id, na_feature_id, start_location, end_location, is_reversed):
         loc_order = 0
@@ -230,47 +384,71 @@ class TableUtility(TableStatusID, OrganismName, DefaultVariables, GALFileHandler
         literal_sequence = ''
         location_type = ''
 
-        string1 = '{}\t{}\t{}\t{}\t{}\t{}'.format(na_location_id, na_feature_id, start_location, start_location,
-                                                  end_location, end_location)
-        string2 = '{}\t{}\t{}\t{}\t{}'.format(loc_order, is_reversed, is_excluded, literal_sequence, location_type)
-
-        final_string = '{}\t{}\n'.format(string1, string2)
-        self.NALocation_fh.write(final_string)
-        return final_string
+        row = [na_location_id, na_feature_id, start_location, start_location, end_location, end_location,
+               loc_order, is_reversed, is_excluded, literal_sequence, location_type]
+        self.NALocation_writer.write_row(row)
 
     def gene_instance(self, gene_instance_id, na_feature_id, annotation):
         review_summary = None
         is_reference = 0
         review_status_id = 0
-        string1 = '{}\t{}\t{}\t{}\t{}\t{}\t{}\n'.format(gene_instance_id, na_feature_id, annotation, review_summary,
-                                                        is_reference, review_status_id, self.present_day)
-        self.GeneInstance_fh.write(string1)
-        return string1
+        row = [gene_instance_id, na_feature_id, annotation, review_summary, is_reference, review_status_id,
+               self.present_day]
+        self.GeneInstance_writer.write_row(row)
 
     def protein(self, protein_id, name, description, gene_instance_id, protein_sequence):
         review_status_id = 0
         review_summary = None
-        string1 = '{}\t{}\t{}\t{}\t{}\t{}\t{}\n'.format(protein_id, name, description, review_status_id, review_summary,
-                                                        gene_instance_id, protein_sequence)
-        self.Protein_fh.write(string1)
-        return string1
+        row = [protein_id, name, description, review_status_id, review_summary, gene_instance_id, protein_sequence]
+        self.Protein_writer.write_row(row)
+
+
+def sequence_fields(sequence, base=None):
+    """ sequence, length and base count columns of a sequence, base is its BaseCount if counted already """
+    sequence = str(sequence)
+    if base is None:
+        base = BaseCount(sequence)
+    return [sequence, base.length(), base.A_count, base.T_count, base.G_count, base.C_count, base.other_count()]
 
 
 def get_sequence_string(sequence):
-    base = BaseCount(sequence)
-    length = base.length()
-    base_count = base.print_base_count()
-    sequence_string = '{}\t{}\t{}'.format(sequence, length, base_count)
-    return sequence_string
+    return '\t'.join(map(str, sequence_fields(sequence)))
 
 
 class UploadTableData(UploadDirectory):
+    # columns of the upload files, None if they are in table order
+    central_dogma_columns = {
+        'nasequenceimp': ['na_sequence_ID', 'strain_number', 'subclass_view', 'sequence_type_ID', 'taxon_ID',
+                          'sequence', 'length', 'a_count', 't_count', 'g_count', 'c_count', 'other_count',
+                          'description', 'source_na_sequence_ID', 'sequence_piece_ID',
+                          'sequencing_center_contact_ID', 'modification_date', 'string1', 'string2', 'string3'],
+        'nafeatureimp': ["na_feature_ID", "na_sequence_ID", "subclass_view", "feature_type", "name", "parent_ID",
+                         "external_database_id", "source_id", "prediction_algorithm_id", "is_predicted",
+                         "review_status_id"],
+        'nalocation': None,
+        'geneinstance': None,
+        'protein': None,
+    }
+
     def __init__(self, db_connection, upload_dir):
 
         UploadDirectory.__init__(self, upload_dir)
         self.db = db_connection
 
+    def load_data_query(self, table_name, file_path):
+        columns = self.central_dogma_columns[table_name]
+        column_list = f" ({', '.join(columns)})" if columns else ''
+        return f"""LOAD DATA LOCAL INFILE '{file_path}'
+        INTO TABLE {table_name}
+        FIELDS TERMINATED BY '\t' OPTIONALLY ENCLOSED BY '"'
+        LINES TERMINATED BY '\n'{column_list};"""
+
+    def central_dogma_loader(self, connections=DEFAULT_LOAD_CONNECTIONS, load_slots=None, session=None):
+        """ loader of the central dogma upload files, the files are loaded while they are written """
+        return PipelinedLoader(self.db, self.load_data_query, connections, load_slots, session)
+
     def upload_central_dogma_data(self):
+        """ loads the central dogma upload files one after another on the upload connection """
         _logger.info("Uploading central dogma data: start")
         self.upload_na_sequenceimp()
         self.upload_na_featureimp()
@@ -278,56 +456,25 @@ class UploadTableData(UploadDirectory):
         self.upload_geneinstance()
         self.protein()
 
+    def upload_table_file(self, table_name, file_path):
+        sql = self.load_data_query(table_name, file_path)
+        _logger.debug(sql)
+        self.db.insert(sql)
+
     def upload_na_sequenceimp(self):
-        # For NASequenceImp table
-        columns = ['na_sequence_ID', 'strain_number', 'subclass_view', 'sequence_type_ID', 'taxon_ID', 'sequence',
-                   'length', 'a_count', 't_count', 'g_count', 'c_count', 'other_count', 'description',
-                   'source_na_sequence_ID', 'sequence_piece_ID', 'sequencing_center_contact_ID', 'modification_date',
-                   'string1', 'string2', 'string3']
-        sql_1 = f"""LOAD DATA LOCAL INFILE '{self.NaSequenceImp}' 
-        INTO TABLE nasequenceimp 
-        FIELDS TERMINATED BY '\t' OPTIONALLY ENCLOSED BY '"' 
-        LINES TERMINATED BY '\n' 
-        ({', '.join(columns)});"""
-
-        _logger.debug(sql_1)
-        self.db.insert(sql_1)
+        self.upload_table_file('nasequenceimp', self.NaSequenceImp)
 
     def upload_na_featureimp(self):
-        # For NAFeatureImp table
-        columns = ["na_feature_ID", "na_sequence_ID", "subclass_view", "feature_type", "name", "parent_ID",
-                   "external_database_id", "source_id", "prediction_algorithm_id", "is_predicted", "review_status_id"]
-
-        # sql_2 = f"""LOAD DATA LOCAL INFILE '{self.NaFeatureImp}' INTO TABLE nafeatureimp FIELDS TERMINATED BY '\t'
-        #            OPTIONALLY ENCLOSED BY '"' LINES TERMINATED BY '\n';"""
-
-        sql_2 = f""" LOAD DATA LOCAL INFILE '{self.NaFeatureImp}'
-        INTO TABLE nafeatureimp
-        FIELDS TERMINATED BY '\t' OPTIONALLY ENCLOSED BY '"'
-        LINES TERMINATED BY '\n' ({', '.join(columns)});"""
-
-        _logger.debug(sql_2)
-        self.db.insert(sql_2)
+        self.upload_table_file('nafeatureimp', self.NaFeatureImp)
 
     def upload_nalocation(self):
-        # For NALocation table
-        sql_3 = f"""LOAD DATA LOCAL INFILE '{self.NaLocation}' INTO TABLE nalocation FIELDS TERMINATED BY '\t' 
-                    OPTIONALLY ENCLOSED BY '"' LINES TERMINATED BY '\n';"""
-        _logger.debug(sql_3)
-        self.db.insert(sql_3)
+        self.upload_table_file('nalocation', self.NaLocation)
 
     def upload_geneinstance(self):
-        sql_4 = f"""LOAD DATA LOCAL INFILE '{self.GeneInstance}' INTO TABLE geneinstance 
-        FIELDS TERMINATED BY '\t' OPTIONALLY ENCLOSED BY '\"' LINES TERMINATED BY '\n';"""
-        _logger.debug(sql_4)
-        self.db.insert(sql_4)
+        self.upload_table_file('geneinstance', self.GeneInstance)
 
     def protein(self):
-        # For Protein Table
-        sql_5 = f"""LOAD DATA LOCAL INFILE '{self.Protein}' INTO TABLE protein FIELDS TERMINATED BY '\t' OPTIONALLY
-                     ENCLOSED BY '"' LINES TERMINATED BY '\n';"""
-        _logger.debug(sql_5)
-        self.db.insert(sql_5)
+        self.upload_table_file('protein', self.Protein)
 
     # def protein_feature_data(self, upload_dir_names):
     #     pfam_upload_file = upload_dir_names.PFam
@@ -1,5 +1,6 @@
 from pathlib import Path
 import logging
+from .bulk_writer import BulkRowWriter, SEQUENCE_CHUNK_BYTES
 _logger = logging.getLogger("galEupy.directory_utility")
 
 
@@ -54,14 +55,59 @@ class UploadDirectory(BaseUploadDirectory):
 
 
 class GALFileHandler(UploadDirectory):
+    # rows of a segment of the upload files handed to the segment loader
+    segment_rows = 1000000
+
     def __init__(self, upload_dir):
         UploadDirectory.__init__(self, upload_dir)
         _logger.info('Reset the temporary files')
-        self.NaSequenceImp_fh = open(self.NaSequenceImp, "w")
-        self.NaFeatureImp_fh = open(self.NaFeatureImp, 'w')
-        self.NALocation_fh = open(self.NaLocation, 'w')
-        self.GeneInstance_fh = open(self.GeneInstance, 'w')
-        self.Protein_fh = open(self.Protein, 'w')
+        self.segment = 0
+        self.segment_loader = None
+        # segment files of an earlier run
+        for path in self.central_dogma_files().values():
+            for stale_file in self.upload_dir.glob(f"{path.name}.*"):
+                stale_file.unlink()
+        self.open_files()
+
+    def central_dogma_files(self):
+        """ upload file of each central dogma table in the current segment, the first segment writes the .parsed files """
+        files = {'nasequenceimp': self.NaSequenceImp, 'nafeatureimp': self.NaFeatureImp,
+                 'nalocation': self.NaLocation, 'geneinstance': self.GeneInstance, 'protein': self.Protein}
+        if self.segment:
+            files = {table_name: path.with_name(f"{path.name}.{self.segment}") for table_name, path in files.items()}
+        return files
+
+    def open_files(self):
+        files = self.central_dogma_files()
+        # the rows with sequences are written once their sequences reach SEQUENCE_CHUNK_BYTES
+        self.NaSequenceImp_writer = BulkRowWriter(files['nasequenceimp'], 'nasequenceimp',
+                                                  chunk_bytes=SEQUENCE_CHUNK_BYTES)
+        self.NaFeatureImp_writer = BulkRowWriter(files['nafeatureimp'], 'nafeatureimp')
+        self.NALocation_writer = BulkRowWriter(files['nalocation'], 'nalocation')
+        self.GeneInstance_writer = BulkRowWriter(files['geneinstance'], 'geneinstance')
+        self.Protein_writer = BulkRowWriter(files['protein'], 'protein', chunk_bytes=SEQUENCE_CHUNK_BYTES)
+
+    def writers(self):
+        return (self.NaSequenceImp_writer, self.NaFeatureImp_writer, self.NALocation_writer,
+                self.GeneInstance_writer, self.Protein_writer)
+
+    def close_files(self):
+        """
+        flushes, syncs and closes the upload files, they must be complete before LOAD DATA reads them.
+        The files are handed to the segment loader if there is one
+        """
+        for writer in self.writers():
+            writer.close()
+        if self.segment_loader is not None:
+            self.segment_loader.add_segment(self.central_dogma_files())
+
+    def next_segment(self):
+        """ with a segment loader, a segment of segment_rows rows is closed and loaded while the next is written """
+        if self.segment_loader is None or sum(writer.row_count for writer in self.writers()) < self.segment_rows:
+            return
+        self.close_files()
+        self.segment += 1
+        self.open_files()
 
 
 class ProteinAnnotationFiles(UploadDirectory):
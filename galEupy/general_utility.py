@@ -1,89 +1,163 @@
 import re
+import gzip
+import time
 import random
 import datetime
+import functools
+try:
+    import numpy
+except ImportError:
+    numpy = None
 import logging
 _logger = logging.getLogger("galEupy.general_utility")
 
 
+COMPLEMENT = str.maketrans('ACGT', 'TGCA')
+ASCII_UPPER = str.maketrans('abcdefghijklmnopqrstuvwxyz', 'ABCDEFGHIJKLMNOPQRSTUVWXYZ')
+# NCBI genetic code 1, amino acids of the codons TTT, TTC, TTA, ..., GGG (geneticcode.code column)
+STANDARD_GENETIC_CODE = 'FFLLSSSSYY**CC*WLLLLPPPPHHQQRRRRIIIMTTTTNNKKSSRRVVVVAAAADDEEGGGG'
+CODON_PAIR = re.compile('.{6}', re.S)
+
+
 def reverse_complement(sequence):
-    complement = {'A': 'T', 'C': 'G', 'G': 'C', 'T': 'A'}
-    reverse_complement_sequence = "".join(complement.get(base, base) for base in reversed(sequence))
+    reverse_complement_sequence = sequence.translate(COMPLEMENT)[::-1]
     return reverse_complement_sequence
 
 
-def translate(dna_string):
-    # Translate a given DNA sequence into protein
-    protein = []
-    table = {
-        'ATA': 'I', 'ATC': 'I', 'ATT': 'I', 'ATG': 'M',
-        'ACA': 'T', 'ACC': 'T', 'ACG': 'T', 'ACT': 'T',
-        'AAC': 'N', 'AAT': 'N', 'AAA': 'K', 'AAG': 'K',
-        'AGC': 'S', 'AGT': 'S', 'AGA': 'R', 'AGG': 'R',
-        'CTA': 'L', 'CTC': 'L', 'CTG': 'L', 'CTT': 'L',
-        'CCA': 'P', 'CCC': 'P', 'CCG': 'P', 'CCT': 'P',
-        'CAC': 'H', 'CAT': 'H', 'CAA': 'Q', 'CAG': 'Q',
-        'CGA': 'R', 'CGC': 'R', 'CGG': 'R', 'CGT': 'R',
-        'GTA': 'V', 'GTC': 'V', 'GTG': 'V', 'GTT': 'V',
-        'GCA': 'A', 'GCC': 'A', 'GCG': 'A', 'GCT': 'A',
-        'GAC': 'D', 'GAT': 'D', 'GAA': 'E', 'GAG': 'E',
-        'GGA': 'G', 'GGC': 'G', 'GGG': 'G', 'GGT': 'G',
-        'TCA': 'S', 'TCC': 'S', 'TCG': 'S', 'TCT': 'S',
-        'TTC': 'F', 'TTT': 'F', 'TTA': 'L', 'TTG': 'L',
-        'TAC': 'Y', 'TAT': 'Y', 'TAA': '_', 'TAG': '_',
-        'TGC': 'C', 'TGT': 'C', 'TGA': '_', 'TGG': 'W',
-    }
-    end = len(dna_string) - (len(dna_string) % 3) - 1
-    for i in range(0, end, 3):
-        codon = dna_string[i:i + 3]
-        codon = codon.upper()
-        if codon in table:
-            amino_acid = table[codon]
-            protein.append(amino_acid)
-        else:
-            protein.append("N")
+@functools.lru_cache(maxsize=None)
+def codon_tables(genetic_code=STANDARD_GENETIC_CODE):
+    """
+    codon and codon pair lookup tables of a genetic code
+    parameters
+    ----------
+    genetic_code: str
+        64 amino acids in the NCBI TCAG codon order, stop codons ('*') are translated to '_'
+    returns
+    -------
+    (codon table, codon pair table) dictionaries
+    """
+    if len(genetic_code) != 64:
+        raise ValueError("A genetic code needs 64 amino acids, got {}: {}".format(len(genetic_code), genetic_code))
+    codons = [first + second + third for first in 'TCAG' for second in 'TCAG' for third in 'TCAG']
+    table = dict(zip(codons, genetic_code.replace('*', '_')))
+    pair_table = {codon1 + codon2: amino_acid1 + amino_acid2
+                  for codon1, amino_acid1 in table.items() for codon2, amino_acid2 in table.items()}
+    return table, pair_table
+
+
+def upper_case(dna_string):
+    # only ASCII letters, so the length of the sequence never changes
+    if dna_string.isascii():
+        return dna_string.upper()
+    return dna_string.translate(ASCII_UPPER)
 
+
+def translate(dna_string, genetic_code=STANDARD_GENETIC_CODE):
+    """
+    Translate a given DNA sequence into protein. Incomplete codons at the end are ignored,
+    codons with other letters than A, C, G and T are translated to 'N' and stop codons to '_'
+    parameters
+    ----------
+    dna_string: str
+    genetic_code: str
+        64 amino acids in the NCBI TCAG codon order, the standard code by default
+    """
+    table, pair_table = codon_tables(genetic_code)
+    dna_string = upper_case(dna_string)
+    codon_end = len(dna_string) - len(dna_string) % 3
+    pair_end = codon_end - codon_end % 6
+    protein = [pair_table[pair] if pair in pair_table else table.get(pair[:3], 'N') + table.get(pair[3:], 'N')
+               for pair in CODON_PAIR.findall(dna_string, 0, pair_end)]
+    if pair_end < codon_end:
+        protein.append(table.get(dna_string[pair_end:codon_end], 'N'))
     return "".join(protein)
 
 
+def translate_batch(dna_strings, genetic_code=STANDARD_GENETIC_CODE):
+    """
+    Translates many DNA sequences in one pass, see translate
+    parameters
+    ----------
+    dna_strings: list
+    genetic_code: str
+    returns
+    -------
+    list of protein sequences in the order of dna_strings
+    """
+    codon_counts = [len(dna_string) // 3 for dna_string in dna_strings]
+    # whole codons of every sequence, padded to an even codon count with an untranslatable codon
+    padded = [dna_string[:codon_count * 3] + ('---' if codon_count % 2 else '')
+              for dna_string, codon_count in zip(dna_strings, codon_counts)]
+    protein = translate("".join(padded), genetic_code)
+
+    proteins = []
+    offset = 0
+    for codon_count in codon_counts:
+        proteins.append(protein[offset:offset + codon_count])
+        offset += codon_count + codon_count % 2
+    return proteins
+
+
+NUMBER_PREFIX = re.compile(r'(\d+)_')
+
+
+@functools.lru_cache(maxsize=2 ** 16)
+def fasta_header_name(line):
+    """
+    contig name of a FASTA header line, the same name read_fasta_to_dictionary uses.
+    returns None when the line is not a header
+
+    Headers with six or more words keep the first word without commas. Shorter headers drop
+    every '<digits>_' from the first word and keep the part after its last '|'.
+    """
+    if line[:1] != '>' or line[1:2].isspace() or len(line) < 2:
+        return None
+    words = line[1:].split(None, 6)
+    if len(words) >= 6:
+        return words[0].replace(',', '')
+    id_name = NUMBER_PREFIX.sub("", words[0])
+    return id_name.rpartition('|')[2]
+
+
+def is_gzip_file(file_name):
+    with open(file_name, 'rb') as fh:
+        return fh.read(2) == b'\x1f\x8b'
+
+
 def read_fasta_to_dictionary(genome_file):
     """
-    this function reads a sequence file in FASTA format and stores
+    this function reads a sequence file in FASTA format (plain or gzip compressed) and stores
     in a dictionary format for future manipulation
     """
-    filename = genome_file
-    dct = {}
+    start_time = time.perf_counter()
+    if is_gzip_file(genome_file):
+        read_fh = gzip.open(genome_file, 'rt')
+    else:
+        read_fh = open(genome_file, 'r')
 
+    dct = {}
     id_name = ""
-    sequence = ""
+    chunks = []
     first_pass = 1
+    byte_count = 0
+    with read_fh:
+        for line in read_fh:
+            byte_count += len(line)
+            line = line.rstrip()
+            id_line = fasta_header_name(line) if line[:1] == '>' else None
+            if id_line is not None:
+                if not first_pass:
+                    dct[id_name] = "".join(chunks)
+                id_name = id_line
+                first_pass = 0
+                chunks = []
+            else:
+                chunks.append(line)
+    dct[id_name] = "".join(chunks)
 
-    read_fh = open(filename, 'r')
-    for i, line in enumerate(read_fh):
-        line = line.rstrip()
-        if re.search(r'^>(\S+)(\s+)(\S+)(\s+)(\S+)(\s+)(\S+)(\s+)(\S+)(\s+)(\S+)(.*)', line):
-
-            match_obj = re.search(r'^>(\S+)(\s+)(\S+)(\s+)(\S+)(\s+)(\S+)(\s+)(\S+)(\s+)(\S+)(.*)', line)
-            if not first_pass:
-                dct[id_name] = sequence
-            id_name = match_obj.group(1)
-            id_name = re.sub(r',', "", id_name)
-            first_pass = 0
-            sequence = ""
-
-        elif re.search(r'^>(\S+)(.*)', line):
-
-            match_obj = re.search(r'^>(\S+)(.*)', line)
-            if not first_pass:
-                dct[id_name] = sequence
-            id_name = match_obj.group(1)
-            id_name = re.sub(r'(\d+)_', "", id_name)
-            id_name = re.sub(r'.*\|', "", id_name)
-            first_pass = 0
-            sequence = ""
-        else:
-            sequence += line
-    dct[id_name] = sequence
-
+    elapsed = time.perf_counter() - start_time
+    _logger.info("Read {} contigs from {}: {:,} bytes in {:.2f} s ({:,.0f} bytes/sec)".format(
+        len(dct), genome_file, byte_count, elapsed, byte_count / elapsed if elapsed else 0))
     return dct
 
 
@@ -111,13 +185,87 @@ def get_date():
     return today
 
 
+BASE_FOLD = bytes.maketrans(b'atgc', b'ATGC')
+# below this length bytes.count beats the NumPy histogram set up cost
+NUMPY_MIN_LENGTH = 1 << 16
+
+
+def numpy_base_codes():
+    """ byte -> base code lookup table: A, T, G, C -> 0..3 and every other byte -> 4 """
+    base_codes = numpy.full(256, 4, dtype=numpy.int64)
+    for code, bases in enumerate([b'Aa', b'Tt', b'Gg', b'Cc']):
+        base_codes[list(bases)] = code
+    return base_codes
+
+
+NUMPY_BASE_CODES = numpy_base_codes() if numpy is not None else None
+
+
+def sequence_bytes(sequence):
+    if isinstance(sequence, bytes):
+        return sequence
+    # one byte per character, so the length stays the same and non latin-1 letters count as other
+    return str(sequence).encode('latin-1', 'replace')
+
+
+def count_bases(sequence):
+    """
+    A, T, G and C counts of a sequence, case insensitive
+    parameters
+    ----------
+    sequence: str or bytes
+    returns
+    -------
+    tuple of (A, T, G, C) counts
+    """
+    data = sequence_bytes(sequence)
+    if numpy is not None and len(data) >= NUMPY_MIN_LENGTH:
+        histogram = numpy.bincount(numpy.frombuffer(data, dtype=numpy.uint8), minlength=256).tolist()
+        return tuple(histogram[upper] + histogram[lower] for upper, lower in (b'Aa', b'Tt', b'Gg', b'Cc'))
+    data = data.translate(BASE_FOLD)
+    return data.count(b'A'), data.count(b'T'), data.count(b'G'), data.count(b'C')
+
+
+def count_bases_batch(sequences):
+    """
+    A, T, G and C counts of many sequences in one pass
+    parameters
+    ----------
+    sequences: list
+        str or bytes sequences
+    returns
+    -------
+    list of (A, T, G, C) tuples in the order of sequences
+    """
+    if numpy is None or len(sequences) < 2:
+        return [count_bases(sequence) for sequence in sequences]
+    buffers = [sequence_bytes(sequence) for sequence in sequences]
+    lengths = numpy.fromiter(map(len, buffers), dtype=numpy.int64, count=len(buffers))
+    codes = NUMPY_BASE_CODES[numpy.frombuffer(b''.join(buffers), dtype=numpy.uint8)]
+    codes += numpy.repeat(numpy.arange(len(buffers), dtype=numpy.int64) * 5, lengths)
+    counts = numpy.bincount(codes, minlength=len(buffers) * 5).reshape(-1, 5)
+    return [tuple(row[:4]) for row in counts.tolist()]
+
+
 class BaseCount:
-    def __init__(self, sequence):
+    def __init__(self, sequence, counts=None):
+        """
+        base composition of a sequence
+        parameters
+        ----------
+        sequence: str
+        counts: tuple
+            precomputed (A, T, G, C) counts, see BaseCount.batch
+        """
         self.sequence = sequence
-        self.A_count = len(re.findall("(?i)a", self.sequence))
-        self.T_count = len(re.findall("(?i)t", self.sequence))
-        self.G_count = len(re.findall("(?i)g", self.sequence))
-        self.C_count = len(re.findall("(?i)c", self.sequence))
+        if counts is None:
+            counts = count_bases(sequence)
+        self.A_count, self.T_count, self.G_count, self.C_count = counts
+
+    @classmethod
+    def batch(cls, sequences):
+        """ BaseCount objects of many sequences, counted together """
+        return [cls(sequence, counts) for sequence, counts in zip(sequences, count_bases_batch(sequences))]
 
     def length(self):
         return len(self.sequence)
@@ -128,4 +276,4 @@ class BaseCount:
 
     def print_base_count(self):
         other_count = self.other_count()
-        return '{}\t{}\t{}\t{}\t{}'.format(self.A_count, self.T_count, self.G_count, self.C_count, other_count)
\ No newline at end of file
+        return '{}\t{}\t{}\t{}\t{}'.format(self.A_count, self.T_count, self.G_count, self.C_count, other_count)
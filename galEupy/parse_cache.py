@@ -0,0 +1,165 @@
+"""
+On-disk cache of parsed input files (feature models and sequence tables)
+"""
+import contextlib
+import hashlib
+import json
+import os
+import pickle
+from pathlib import Path
+import logging
+from .directory_utility import BaseUploadDirectory
+from .version import __version__
+_logger = logging.getLogger("galEupy.parse_cache")
+
+# bump when the layout of a cached object changes, older entries are then ignored
+CACHE_FORMAT = 3
+# first bytes of an entry, an entry of another format or galEupy version is removed when it is read
+CACHE_HEADER = 'galEupy-parse-cache\t{}\t{}\n'.format(CACHE_FORMAT, __version__).encode()
+
+
+class ParseCache(BaseUploadDirectory):
+    default_dir_name = 'ParseCache'
+    hash_file_name = 'file_hashes.json'
+    entry_suffix = '.pickle'
+
+    def __init__(self, upload_dir, max_size=2 * 1024 ** 3):
+        """
+        parameters
+        ----------
+        upload_dir: basestring
+            upload directory, the cache lives in its ParseCache sub directory
+        max_size: int
+            size cap in bytes, least recently used entries are removed beyond it
+        """
+        BaseUploadDirectory.__init__(self, upload_dir)
+        self.cache_dir = self.upload_dir.joinpath(self.default_dir_name)
+        self.create_directory(self.cache_dir)
+        self.max_size = max_size
+        self.hash_file = self.cache_dir.joinpath(self.hash_file_name)
+
+    def load_or_parse(self, kind, file_names, parse):
+        """
+        returns the cached result of parse() for the input files, parses and stores it when missing
+        parameters
+        ----------
+        kind: basestring
+            name of the parsed object (gff_dct, sequence_dct, ...)
+        file_names: list
+            input files the parsed object depends on
+        parse: callable
+            parses the input files
+        """
+        entry = self.entry_path(kind, file_names)
+        value = self.load(entry)
+        if value is not None:
+            _logger.info("Loaded {} from the parse cache: {}".format(kind, entry.name))
+            return value
+        value = parse()
+        self.store(entry, value)
+        return value
+
+    def entry_path(self, kind, file_names):
+        key = hashlib.blake2b(digest_size=20)
+        key.update(CACHE_HEADER)
+        key.update(kind.encode())
+        for file_name in file_names:
+            key.update(self.file_hash(file_name).encode())
+        return self.cache_dir.joinpath('{}-{}{}'.format(kind, key.hexdigest(), self.entry_suffix))
+
+    def file_hash(self, file_name):
+        """
+        blake2b hash of a file's content. Hashes are remembered with the file's size and mtime,
+        an unchanged file is not read again
+        """
+        file_path = Path(file_name).resolve()
+        file_stat = file_path.stat()
+        hash_dct = self.read_hashes()
+        size_mtime = [file_stat.st_size, file_stat.st_mtime_ns]
+        record = hash_dct.get(str(file_path))
+        if record is not None and record[:2] == size_mtime:
+            return record[2]
+
+        file_digest = hashlib.blake2b()
+        with open(file_path, 'rb') as fh:
+            for block in iter(lambda: fh.read(1 << 20), b''):
+                file_digest.update(block)
+        digest = '{}:{}'.format(file_stat.st_size, file_digest.hexdigest())
+        hash_dct[str(file_path)] = size_mtime + [digest]
+        write_atomic(self.hash_file, json.dumps(hash_dct).encode())
+        return digest
+
+    def read_hashes(self):
+        try:
+            with open(self.hash_file, 'r') as fh:
+                return json.load(fh)
+        except (OSError, ValueError):
+            return {}
+
+    @staticmethod
+    def load(entry):
+        try:
+            with open(entry, 'rb') as fh:
+                if fh.read(len(CACHE_HEADER)) != CACHE_HEADER:
+                    raise ValueError("written by another format or version of galEupy")
+                value = pickle.load(fh)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            _logger.warning("Removing unreadable parse cache entry {}: {}".format(entry, e))
+            entry.unlink(missing_ok=True)
+            return None
+        os.utime(entry)  # mark as recently used
+        return value
+
+    def store(self, entry, value):
+        try:
+            # pickled straight into the file, the entry is never held in memory as a whole
+            with atomic_file(entry) as fh:
+                fh.write(CACHE_HEADER)
+                pickle.dump(value, fh, protocol=pickle.HIGHEST_PROTOCOL)
+        except (OSError, pickle.PicklingError) as e:
+            _logger.warning("Could not write parse cache entry {}: {}".format(entry, e))
+            return
+        _logger.debug("Stored parse cache entry {} ({:,} bytes)".format(entry.name, entry.stat().st_size))
+        self.evict()
+
+    def evict(self):
+        """ removes the least recently used entries until the cache fits max_size """
+        entries = []
+        for entry in self.cache_dir.glob('*' + self.entry_suffix):
+            try:
+                entry_stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((entry_stat.st_mtime, entry_stat.st_size, entry))
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, entry in sorted(entries, key=lambda item: item[0]):
+            if total_size <= self.max_size:
+                break
+            _logger.debug("Removing parse cache entry {}".format(entry.name))
+            entry.unlink(missing_ok=True)
+            total_size -= size
+
+    def clear(self):
+        for entry in self.cache_dir.glob('*' + self.entry_suffix):
+            entry.unlink(missing_ok=True)
+        self.hash_file.unlink(missing_ok=True)
+
+
+@contextlib.contextmanager
+def atomic_file(file_path):
+    """ binary file written under a temporary name, it replaces file_path once it is complete """
+    tmp_path = file_path.with_name('{}.{}.tmp'.format(file_path.name, os.getpid()))
+    try:
+        with open(tmp_path, 'wb') as fh:
+            yield fh
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    os.replace(tmp_path, file_path)
+
+
+def write_atomic(file_path, data):
+    with atomic_file(file_path) as fh:
+        fh.write(data)
@@ -10,12 +10,12 @@ class TableProcessUtility(TableUtility):
     Utility class for processing GFF data and interacting with database tables.
     Inherits from TableUtility.
     """
-    def __init__(self, db_dots, upload_dir, organism, taxonomy_id, version):
+    def __init__(self, db_dots, upload_dir, organism, taxonomy_id, version, partitioned_tables=()):
         """
         Initializes TableProcessUtility, calling the parent constructor.
         """
 
-        super().__init__(db_dots, upload_dir, organism, taxonomy_id, version)
+        super().__init__(db_dots, upload_dir, organism, taxonomy_id, version, partitioned_tables)
 
     def process_gff_gene_data(self, scaffold, gene_id, gene_dct, scaffold_na_sequence_id):
         """
@@ -180,7 +180,7 @@ class TableProcessUtility(TableUtility):
 
         # Process all location segments for this feature
         locations = feature_dct.get('location', [])
-        if not isinstance(locations, list):
+        if not isinstance(locations, (list, tuple)):
             _logger.warning(f"Expected list for locations in {feature_name} {feature_id_name}, found {type(locations)}. Skipping.")
             return
 
@@ -221,7 +221,7 @@ class TableProcessUtility(TableUtility):
         location_key = 'location'
         if location_key in feature_dct:
             locations = feature_dct[location_key]
-            if not isinstance(locations, list):
+            if not isinstance(locations, (list, tuple)):
                 _logger.warning(f"Expected list for locations in {feature}, found {type(locations)}. Skipping.")
                 return
 
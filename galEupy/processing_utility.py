@@ -1,75 +1,241 @@
-from .general_utility import translate, reverse_complement, read_fasta_to_dictionary, product_to_dictionary
+from .general_utility import translate, translate_batch, reverse_complement, read_fasta_to_dictionary, \
+    product_to_dictionary, is_gzip_file, STANDARD_GENETIC_CODE
+import os
+import sys
 import json
+import collections
+import time
+import functools
+from concurrent.futures import ProcessPoolExecutor
 from .BioFile import gff_parser
+from .BioFile.feature_store import FeatureStore, FeatureView
+from .BioFile.fasta_index import IndexedFasta, FastaContig
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
 import logging
 _logger = logging.getLogger("galEupy.processing_utility")
 
+# ru_maxrss is in bytes on macOS and in KiB on Linux
+MAXRSS_UNIT = 1 if sys.platform == 'darwin' else 1024
+# gene model jobs queued for each worker process
+MODEL_JOBS_PER_WORKER = 2
+
+
+def resident_memory():
+    """ current resident set size of the process in bytes, None where /proc is not available """
+    try:
+        with open('/proc/self/statm') as fh:
+            return int(fh.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def peak_memory():
+    """ peak resident set size of the process in bytes, None where resource is not available """
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * MAXRSS_UNIT
+
+
+def memory_change(before, after):
+    if before is None or after is None:
+        return "unknown"
+    return "{:+.1f} MiB".format((after - before) / 2 ** 20)
+
+
+def annotation_input(parse):
+    """
+    AnnotationData input parsed on first access and kept until AnnotationData.invalidate.
+    Logs the parse time, the resident memory the input added and how far the parse raised the peak
+    resident memory of the process
+    """
+    @functools.wraps(parse)
+    def timed_parse(self):
+        resident_before, peak_before = resident_memory(), peak_memory()
+        start_time = time.perf_counter()
+        value = parse(self)
+        elapsed = time.perf_counter() - start_time
+        _logger.info("Parsed {} in {:.2f} s, resident memory {}, peak memory {}".format(
+            parse.__name__, elapsed, memory_change(resident_before, resident_memory()),
+            memory_change(peak_before, peak_memory())))
+        return value
+    return functools.cached_property(timed_parse)
+
 
 class AnnotationData:
-    def __init__(self, org_config):
+    inputs = ('sequence_dct', 'gff_dct', 'product_dct')
+
+    def __init__(self, org_config, parse_cache=None, genetic_code=None, workers=1):
+        """
+        parameters
+        ----------
+        org_config: OrganismConf
+            organism configuration
+        parse_cache: ParseCache
+            cache of parsed inputs, the files are always parsed when it is None
+        genetic_code: str
+            genetic code for the protein translation, the standard code when it is None
+        workers: int
+            number of processes building the gene models
+        """
         self.org_config = org_config
-
-    @property
+        self.parse_cache = parse_cache
+        self.genetic_code = genetic_code
+        self.workers = workers
+
+    def parse_input(self, kind, file_names, parse):
+        if self.parse_cache is None:
+            return parse()
+        return self.parse_cache.load_or_parse(kind, file_names, parse)
+
+    def invalidate(self, *names):
+        """
+        drops parsed inputs so the next access reads the files again
+        parameters
+        ----------
+        names: str
+            sequence_dct, gff_dct or product_dct, all inputs when no name is given
+        """
+        for name in names or self.inputs:
+            if name not in self.inputs:
+                raise ValueError("Unknown annotation input: {}".format(name))
+            value = self.__dict__.pop(name, None)
+            if hasattr(value, 'close'):
+                value.close()
+
+    @annotation_input
     def sequence_dct(self):
-        sequence_dct = read_fasta_to_dictionary(self.org_config.fasta)
-        return sequence_dct
-
-    @property
+        """
+        contig table of the FASTA file, memory mapped for plain files and decoded in memory for gzip files
+        """
+        fasta = self.org_config.fasta
+        if is_gzip_file(fasta):
+            return self.parse_input('sequence_dct', [fasta], lambda: read_fasta_to_dictionary(fasta))
+        return self.parse_input('sequence_index', [fasta], lambda: IndexedFasta(fasta))
+
+    @annotation_input
     def gff_dct(self):
-        gff_obj = gff_parser.ReadGFF3(self.org_config.gff)
-        gff_dct = gff_obj.reader()
+        """
+        feature model of the GFF file, prepare_gal_model adds the sequences to it in place
+        """
+        gff_obj = gff_parser.StreamGFF3(self.org_config.gff)
+        gff_dct = self.parse_input('gff_dct', [self.org_config.gff], lambda: FeatureStore.from_contigs(gff_obj.contigs))
         return gff_dct
 
-    @property
+    @annotation_input
     def product_dct(self):
         if self.org_config.product is not None:
-            blast_dct = product_to_dictionary(self.org_config.product)
+            blast_dct = self.parse_input('product_dct', [self.org_config.product],
+                                         lambda: product_to_dictionary(self.org_config.product))
             return blast_dct
         else:
             return None
 
     def prepare_gal_model(self):
         # model_gff_dct = create_gal_model_dct(self.sequence_dct, self.gff_dct, self.product_dct)
-        model_gff_obj = ModelGFFDict(self.sequence_dct, self.gff_dct, self.product_dct)
+        model_gff_obj = ModelGFFDict(self.sequence_dct, self.gff_dct, self.product_dct, self.genetic_code,
+                                     self.workers)
         # print(json.dumps(self.gff_dct, indent=3))
         model_gff_dct = model_gff_obj.create_model_dct()
         return model_gff_dct
 
 
 class ModelGFFDict:
-    def __init__(self, sequence_dct, gff_dct, product_dct={}):
+    def __init__(self, sequence_dct, gff_dct, product_dct={}, genetic_code=None, workers=1):
+        """
+        parameters
+        ----------
+        sequence_dct: dict or IndexedFasta
+            contig sequences
+        gff_dct: dict or FeatureStore
+            feature model, the gene and protein sequences are added to it in place
+        product_dct: dict
+            rna id -> product name
+        genetic_code: str
+            genetic code for the protein translation, the standard code when it is None
+        workers: int
+            number of processes extracting the gene and protein sequences
+        """
         self.sequence_dct = sequence_dct
         self.gff_dct = gff_dct
         self.product_dct = product_dct
+        self.genetic_code = genetic_code or STANDARD_GENETIC_CODE
+        self.workers = workers
         self.model_dct = gff_dct # this dct is a placehoder for further processing
         self.delete_list = []
 
     def create_model_dct(self):
         # print(self.gff_dct)
-        for contig_id, sequence in self.sequence_dct.items():
-            if contig_id in self.gff_dct:
-                if 'gene' in self.gff_dct[contig_id]:
-                    for gene_id, gene_dct in self.gff_dct[contig_id]['gene'].items():
-                        if gene_id is None:
-                            self.delete_list.append([contig_id, 'gene', gene_id])
-                            continue
-                        else:
-                            self.process_gene_dict(contig_id, gene_id)
+        contig_ids = [contig_id for contig_id in self.sequence_dct
+                      if contig_id in self.gff_dct and 'gene' in self.gff_dct[contig_id]]
+
+        if self.workers > 1 and len(contig_ids) > 1:
+            _logger.info(f"Building the gene models of {len(contig_ids)} contigs with {self.workers} processes")
+            with ProcessPoolExecutor(max_workers=self.workers, initializer=init_model_worker,
+                                     initargs=(self.shared_sequences, self.genetic_code)) as executor:
+                # a contig is prepared when a worker is about to be free, at most MODEL_JOBS_PER_WORKER
+                # jobs of each worker are held at a time
+                pending = collections.deque()
+                for contig_id in contig_ids:
+                    _, job, targets = self.prepare_contig(contig_id)
+                    pending.append((targets, executor.submit(run_model_worker, self.sequence_job(contig_id, job))))
+                    if len(pending) >= self.workers * MODEL_JOBS_PER_WORKER:
+                        targets, future = pending.popleft()
+                        self.add_sequences(targets, *future.result())
+                while pending:
+                    targets, future = pending.popleft()
+                    self.add_sequences(targets, *future.result())
+        else:
+            for contig_id in contig_ids:
+                _, job, targets = self.prepare_contig(contig_id)
+                result = build_contig_sequences(self.sequence_dct[contig_id], *job, self.genetic_code)
+                self.add_sequences(targets, *result)
 
         for del_list in self.delete_list:
             del self.model_dct[del_list[0]][del_list[1]][del_list[2]]
 
         return self.model_dct
-    
-    def process_gene_dict(self, contig_id, gene_id):
-        gene_dct = self.gff_dct[contig_id]['gene'][gene_id]
-        gene_sequence, strand = get_gene_sequence(self.sequence_dct[contig_id], gene_dct['location'])
-
-        # Add gene sequence in the feature dictionary
-        self.model_dct[contig_id]['gene'][gene_id]['gene_sequence'] = gene_sequence
-       
+
+    @property
+    def shared_sequences(self):
+        """ sequences the worker processes open themselves, contig strings are sent with each job otherwise """
+        if isinstance(self.sequence_dct, IndexedFasta):
+            return self.sequence_dct
+        return None
+
+    def sequence_job(self, contig_id, job):
+        sequence = None if self.shared_sequences is not None else str(self.sequence_dct[contig_id])
+        return (contig_id, sequence) + job
+
+    def prepare_contig(self, contig_id):
+        """
+        adds the sequence independent values (product, exon, rna location) of a contig's genes.
+        returns
+        -------
+        contig_id, (gene locations, cds segments) to extract, (gene dictionaries, rna dictionaries) to update
+        """
+        gene_locations = []
+        cds_segments = []
+        gene_targets = []
+        rna_targets = []
+        for gene_id, gene_dct in self.gff_dct[contig_id]['gene'].items():
+            if gene_id is None:
+                self.delete_list.append([contig_id, 'gene', gene_id])
+                continue
+            start, end, strand = gene_dct['location'][0]
+            gene_locations.append(gene_dct['location'])
+            gene_targets.append(gene_dct)
+            for rna_dct, cds_segment in self.process_gene_dict(gene_dct, strand):
+                rna_targets.append(rna_dct)
+                cds_segments.append(cds_segment)
+        return contig_id, (gene_locations, cds_segments), (gene_targets, rna_targets)
+
+    def process_gene_dict(self, gene_dct, strand):
+        """ yields (rna_dct, (strand, cds starts, cds ends)) of the rnas which need a protein sequence """
         # filter rna keys
-        rna_keys =  [key_name for key_name in list(gene_dct.keys()) if key_name.endswith('rna')] 
+        rna_keys =  [key_name for key_name in gene_dct if key_name.endswith('rna')] 
         for rna_type in rna_keys:
             # for each mrna id
             for rna_id, rna_dct in gene_dct[rna_type].items():
@@ -81,25 +247,68 @@ class ModelGFFDict:
                         elif rna_type =="mrna":
                             product = "Hypothetical Protein"
 
-                        self.model_dct[contig_id]['gene'][gene_id][rna_type][rna_id]['product'] = product
+                        rna_dct['product'] = product
 
                 if 'cds' in rna_dct:
-                    location_list = rna_dct['cds']['location']
                     if 'protein_sequence' not in rna_dct:
-                        merged_cds = merge_cds_list(self.sequence_dct[contig_id], location_list, strand)
-                        protein_seq = translate(merged_cds)
-                        self.model_dct[contig_id]['gene'][gene_id][rna_type][rna_id]['protein_sequence'] = protein_seq
+                        starts, ends = cds_coordinates(rna_dct['cds'])
+                        yield rna_dct, (strand, starts, ends)
 
                 if 'exon' not in rna_dct:
-                    self.model_dct[contig_id]['gene'][gene_id][rna_type][rna_id]['exon'] = rna_dct['cds']
+                    if 'cds' not in rna_dct:
+                        # empty cds/exon entries, as the defaultdict model created them on lookup
+                        rna_dct['cds'] = {}
+                    rna_dct['exon'] = rna_dct['cds']
 
                 if 'location' not in rna_dct:
-                    if 'cds' in rna_dct:
+                    if 'cds' in rna_dct and 'location' in rna_dct['cds']:
                         location_list = rna_dct['cds']['location']
                         location = get_start_end_list(location_list, strand)
-                        self.model_dct[contig_id]['gene'][gene_id][rna_type][rna_id]['location'] = location
+                        rna_dct['location'] = location
                     else:
-                        self.model_dct[contig_id]['gene'][gene_id][rna_type][rna_id]['location'] = gene_dct['location']
+                        rna_dct['location'] = gene_dct['location']
+
+    @staticmethod
+    def add_sequences(targets, gene_sequences, protein_sequences):
+        gene_targets, rna_targets = targets
+        for gene_dct, gene_sequence in zip(gene_targets, gene_sequences):
+            # Add gene sequence in the feature dictionary
+            gene_dct['gene_sequence'] = gene_sequence
+        for rna_dct, protein_seq in zip(rna_targets, protein_sequences):
+            rna_dct['protein_sequence'] = protein_seq
+
+
+def build_contig_sequences(sequence, gene_locations, cds_segments, genetic_code):
+    """
+    gene sequences and translated CDSs of a contig
+    parameters
+    ----------
+    sequence: str or FastaContig
+        contig sequence
+    gene_locations: list
+        location list of each gene
+    cds_segments: list
+        (strand, sorted starts, ends) of each CDS
+    genetic_code: str
+    """
+    gene_sequences = [get_gene_sequence(sequence, location_list)[0] for location_list in gene_locations]
+    merged_cds_list = [assemble_segments(sequence, starts, ends, strand) for strand, starts, ends in cds_segments]
+    return gene_sequences, translate_batch(merged_cds_list, genetic_code)
+
+
+model_worker_state = {}
+
+
+def init_model_worker(shared_sequences, genetic_code):
+    model_worker_state['sequences'] = shared_sequences
+    model_worker_state['genetic_code'] = genetic_code
+
+
+def run_model_worker(job):
+    contig_id, sequence, gene_locations, cds_segments = job
+    if sequence is None:
+        sequence = model_worker_state['sequences'][contig_id]
+    return build_contig_sequences(sequence, gene_locations, cds_segments, model_worker_state['genetic_code'])
 
 
 def create_gal_model_dct(sequence_dct, gff_dct, blast_dct={}):
@@ -169,23 +378,55 @@ def get_start_end_list(location_list, strand):
 
 
 def merge_cds_list(sequence, location_list, strand):
-    sorted_location_list = sorted(location_list)
-    cds_sequence = ''
-    for i, location in enumerate(sorted_location_list):
-        if len(location) == 1:
-            start_cds = int(location[0])-1
-            end_cds = int(location[0]) - 1
-        else:
-            start_cds = int(location[0])-1
-            end_cds = int(location[1])-1
-
-        if start_cds < end_cds:
-            cds_sequence = cds_sequence + sequence[start_cds:end_cds]
-        else:
-            cds_sequence = cds_sequence + sequence[end_cds:start_cds]
+    starts, ends = location_coordinates(sorted(location_list))
+    return assemble_segments(sequence, starts, ends, strand)
+
+
+def location_coordinates(location_list):
+    """
+    start and end integer lists of [start, end] or [start] locations, end is start for the single ones
+    """
+    starts = [int(location[0]) for location in location_list]
+    ends = [int(location[1]) if len(location) > 1 else start for location, start in zip(location_list, starts)]
+    return starts, ends
+
+
+def cds_coordinates(cds_dct):
+    """
+    sorted start and end coordinates of the cds segments
+    parameters
+    ----------
+    cds_dct: dict or FeatureView
+        cds feature with a location list
+    """
+    if isinstance(cds_dct, FeatureView):
+        coordinates = cds_dct.sorted_segments()
+        if coordinates is not None:
+            return coordinates
+    return location_coordinates(sorted(cds_dct['location']))
+
+
+def assemble_segments(sequence, starts, ends, strand):
+    """
+    joins the segments of a contig into one sequence, reverse complemented for the '-' strand.
+    Every segment covers sequence[start - 1:end - 1] (reversed coordinates are swapped)
+    parameters
+    ----------
+    sequence: str or FastaContig
+        contig sequence
+    starts: list
+        sorted integer start coordinates
+    ends: list
+        integer end coordinates
+    strand: str
+    """
+    intervals = [(start - 1, end - 1) if start < end else (end - 1, start - 1) for start, end in zip(starts, ends)]
+    if isinstance(sequence, FastaContig):
+        cds_sequence = sequence.join_intervals(intervals)
+    else:
+        cds_sequence = ''.join([sequence[start:end] for start, end in intervals])
     if strand == '-':
         cds_sequence = reverse_complement(cds_sequence)
-
     return cds_sequence
 
 
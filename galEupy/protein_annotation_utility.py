@@ -1,10 +1,12 @@
 import logging
 from pathlib import Path
-from .dbtable_utility import TableStatusID
+from .dbtable_utility import IdBlockAllocator
 import re
 import csv
+import operator
 # from .BioFile.interproscan_parser import ParseInterproResult
 from .directory_utility import ProteinAnnotationFiles
+from .bulk_loader import PipelinedLoader
 # import time
 import pprint
 
@@ -13,6 +15,17 @@ import pprint
 
 _logger = logging.getLogger("galEupy.protein_annotation_utility")
 
+# eggNOG-mapper columns of the upload rows, the KEGG rows keep the columns from EC on
+EGGNOG_FIELDS = ['Description', 'COG_category', 'GOs', 'EC', 'KEGG_ko', 'KEGG_Pathway',
+                 'KEGG_Module', 'KEGG_Reaction', 'KEGG_rclass', 'BRITE', 'KEGG_TC', 'PFAMs']
+EGGNOG_COLUMNS = ['protein_instance_feature_ID', 'protein_instance_ID', 'feature_name', 'subclass_view', 'taxonomy_id',
+                  'strain_number', 'domain_name', 'prediction_id', 'go_id',
+                  'text1', 'text2', 'text3', 'text4', 'text5', 'text6', 'text7', 'text8', 'text9']
+# upload rows written to the upload file at a time
+EGGNOG_CHUNK_ROWS = 50000
+PROTEIN_FEATURE_TABLES = {'proteininstancefeature': ()}
+
+
 class TranscriptMap:
     def __init__(self, db_dots, taxonomy_id, org_version):
         self.db_dots = db_dots
@@ -96,10 +109,10 @@ SELECT gi.gene_instance_ID, mrna.name AS mrna_name, cds.name AS cds_name,
             _logger.error(f"Could not find transcript entry for '{transcript_name}'")
         return pid
 
-class BaseProteinAnnotations(ProteinAnnotationFiles, TableStatusID):
+class BaseProteinAnnotations(ProteinAnnotationFiles):
     def __init__(self, db_conn, path_config, org_config, random_str):
         ProteinAnnotationFiles.__init__(self, path_config.upload_dir, random_str)
-        TableStatusID.__init__(self, db_conn)
+        self.db_dots = db_conn
         self.db_conn = db_conn
         self.org_config = org_config
         self.path_config = path_config
@@ -126,10 +139,9 @@ class BaseProteinAnnotations(ProteinAnnotationFiles, TableStatusID):
                 header_text = f">{value['name']};gi='{value['gene_instance_id']}'\n{value['sequence']}\n"
                 fh.write(header_text)
 
-    @property
-    def table_status_dct(self):
-        table_info_dct = self.get_protein_feature_table_status()
-        return table_info_dct
+    def protein_feature_ids(self):
+        """ IdBlockAllocator of proteininstancefeature, concurrent uploads get disjoint blocks of IDs """
+        return IdBlockAllocator(self.db_conn, 'proteininstancefeature', 'protein_instance_feature_ID')
 
 class ProteinAnnotations(BaseProteinAnnotations, TranscriptMap):
     def __init__(self, db_conn, path_config, org_config, random_str, taxonomy_id, org_version):
@@ -138,73 +150,115 @@ class ProteinAnnotations(BaseProteinAnnotations, TranscriptMap):
         self.taxonomy_id = taxonomy_id  # Ensure these lines are present
         self.org_version = org_version
 
-    def parse_eggnog_result(self, parsed_file):
+    @staticmethod
+    def eggnog_field_getter(header):
+        """
+        accessor of the EGGNOG_FIELDS values of a row, built once for the header line of the file.
+        A column missing from the header reads as '-'
+        """
+        header_indices = {name: index for index, name in enumerate(header)}
+        indices = [header_indices.get(field_name) for field_name in EGGNOG_FIELDS]
+        for field_name, index in zip(EGGNOG_FIELDS, indices):
+            if index is None:
+                _logger.error(f"{field_name} doesn't exist")
+        if None not in indices:
+            return operator.itemgetter(*indices)
+        return lambda row: tuple('-' if index is None else row[index] for index in indices)
+
+    def parse_eggnog_result(self, parsed_file, loader=None, chunk_rows=EGGNOG_CHUNK_ROWS):
+        """
+        writes the upload rows of an eggNOG-mapper annotation file while it is read, at most chunk_rows rows
+        are held in memory
+
+        parameters
+        ----------
+        parsed_file: Path
+            .emapper.annotations file
+        loader: PipelinedLoader
+            loader of eggnog_loader(), each chunk is written to a segment file of its own and loaded
+            while the next one is parsed. Without a loader the chunks are written to the eggnog upload file
+        chunk_rows: int
+            upload rows of a chunk
+        """
         _logger.info("Parsing EGGNOG data: Initiated")
         _logger.info(f"taxonomy id is {self.taxonomy_id}")
 
-        eggnog_row_id = self.table_status_dct['protein_instance_feature_ID']
-        field_list = ['Description', 'COG_category', 'GOs', 'EC', 'KEGG_ko', 'KEGG_Pathway',
-                    'KEGG_Module', 'KEGG_Reaction', 'KEGG_rclass', 'BRITE', 'KEGG_TC', 'PFAMs']
+        id_allocator = self.protein_feature_ids()
+        feature_name = "EGGNOG"
+        field_getter = None
+        chunk = []
+        chunks = 0
+        rows = 0
+        if loader is None:
+            open(self.eggnog, 'w').close()
 
         with open(parsed_file, 'r') as file:
-            reader = csv.reader(file, delimiter='\t')
-            header_indices = {}
-            buffer = []
-
-            for idx, row in enumerate(reader):
-                if row[0].startswith('##'):
+            for row in csv.reader(file, delimiter='\t'):
+                if not row or row[0].startswith('##'):
                     continue
                 if row[0].startswith('#'):
-                    header = row
-                    header_indices = {name: index for index, name in enumerate(header) if name in field_list}
-                    for field_name in field_list:
-                        if field_name not in header_indices:
-                            _logger.error(f"{field_name} doesn't exist")
+                    field_getter = self.eggnog_field_getter(row)
+                    continue
+                if field_getter is None:
                     continue
 
-                if header_indices:
-                    protein_instance_id = self.find_transcript_entry(row[0])
-                    feature_name = "EGGNOG"
-                    subclass_dct = {}
-
-                    desc = row[header_indices.get('Description', '')]
-                    cog_cat = row[header_indices.get('COG_category', '')]
-                    gos = row[header_indices.get('GOs', '')]
-                    kegg_ko = row[header_indices.get('KEGG_ko', '')]
-                    pfams = row[header_indices.get('PFAMs', '')]
-
-                    if desc != '-':
-                        subclass_dct['COG'] = [desc, cog_cat] + [None] * 10
-                    if gos != '-':
-                        subclass_dct['GO'] = [None, None, gos] + [None] * 9
-                    if kegg_ko != '-':
-                        kegg_values = [row[header_indices.get(key, '')] if row[header_indices.get(key, '')] != '-' else None for key in field_list[3:]]
-                        subclass_dct['KEGG'] = [None, None, None] + kegg_values
-                    if pfams != '-':
-                        subclass_dct['Pfam'] = [None] * 11 + [pfams]
-
-                    for subclass_view, data_list in subclass_dct.items():
-                        eggnog_row_id += 1
-                        mapping_list = [eggnog_row_id, protein_instance_id, feature_name, subclass_view, self.taxonomy_id, self.org_version]
-                        columns_data = mapping_list + data_list
-                        buffer.append("\t".join(map(str, columns_data)) + '\n')
-
-        with open(self.eggnog, 'w') as eggnog_write_fh:
-            eggnog_write_fh.write("".join(buffer))
+                protein_instance_id = self.find_transcript_entry(row[0])
+                fields = field_getter(row)
+                desc, cog_cat, gos, kegg_ko, pfams = fields[0], fields[1], fields[2], fields[4], fields[11]
+                subclass_dct = {}
+                if desc != '-':
+                    subclass_dct['COG'] = [desc, cog_cat] + [None] * 10
+                if gos != '-':
+                    subclass_dct['GO'] = [None, None, gos] + [None] * 9
+                if kegg_ko != '-':
+                    subclass_dct['KEGG'] = [None, None, None] + [value if value != '-' else None
+                                                                 for value in fields[3:]]
+                if pfams != '-':
+                    subclass_dct['Pfam'] = [None] * 11 + [pfams]
+
+                for subclass_view, data_list in subclass_dct.items():
+                    eggnog_row_id = id_allocator.next_id
+                    id_allocator.move_to(eggnog_row_id + 1)
+                    mapping_list = [eggnog_row_id, protein_instance_id, feature_name, subclass_view,
+                                    self.taxonomy_id, self.org_version]
+                    chunk.append("\t".join(map(str, mapping_list + data_list)) + '\n')
+
+                if len(chunk) >= chunk_rows:
+                    self.write_eggnog_chunk(chunk, chunks, loader)
+                    rows += len(chunk)
+                    chunks += 1
+                    chunk = []
+
+        if chunk:
+            self.write_eggnog_chunk(chunk, chunks, loader)
+            rows += len(chunk)
+            chunks += 1
+        id_allocator.release()
+        _logger.info(f"Parsing EGGNOG data: Complete, {rows:,} rows in {chunks} chunks")
+
+    def write_eggnog_chunk(self, lines, chunk, loader=None):
+        if loader is None:
+            with open(self.eggnog, 'a') as eggnog_write_fh:
+                eggnog_write_fh.writelines(lines)
+            return
+        segment_file = self.feature_path.joinpath(f"{self.eggnog.stem}.{chunk}{self.eggnog.suffix}")
+        with open(segment_file, 'w') as eggnog_write_fh:
+            eggnog_write_fh.writelines(lines)
+        loader.add_segment({'proteininstancefeature': segment_file})
 
-        _logger.info("Parsing EGGNOG data: Complete")
+    @staticmethod
+    def eggnog_load_query(table_name, file_path):
+        return f"""LOAD DATA LOCAL INFILE '{file_path}' INTO TABLE {table_name} FIELDS
+        TERMINATED BY '\t' OPTIONALLY ENCLOSED BY '"' LINES
+        TERMINATED BY '\n' ({",".join(EGGNOG_COLUMNS)})"""
 
+    def eggnog_loader(self, load_slots=None):
+        """ loader of the eggnog chunks, one connection loads them in order inside one transaction """
+        return PipelinedLoader(self.db_conn, self.eggnog_load_query, connections=1, load_slots=load_slots,
+                               tables=PROTEIN_FEATURE_TABLES, label='EGGNOG upload')
 
     def upload_eggnog_data(self):
 
         _logger.info(f"Parsing EGGNOG data: Initiated with taxonomy_id={self.taxonomy_id}, strain_number={self.org_version}")
         _logger.info(f"Uploading EGGNOG data from {self.eggnog}")
-        column_list = ['protein_instance_feature_ID', 'protein_instance_ID', 'feature_name', 'subclass_view', 'taxonomy_id', 'strain_number',
-                    'domain_name', 'prediction_id', 'go_id',
-                    'text1', 'text2', 'text3', 'text4', 'text5', 'text6', 'text7', 'text8', 'text9']
-
-        query = f"""LOAD DATA LOCAL INFILE '{self.eggnog}' INTO TABLE proteininstancefeature FIELDS
-        TERMINATED BY '\t' OPTIONALLY ENCLOSED BY '"' LINES
-        TERMINATED BY '\n' ({",".join(column_list) })"""
-
-        self.db_conn.insert(query)
+        self.db_conn.insert(self.eggnog_load_query('proteininstancefeature', self.eggnog))
@@ -1,7 +1,11 @@
 import re
+import time
 import logging
+from .dbschema import OrganismPartitions
 _logger = logging.getLogger("galEupy.taxonomy")
 
+DELETE_CHUNK_ROWS = 10000
+
 
 class OrganismName:
     def __init__(self, org_name, org_version=1 ):
@@ -67,14 +71,31 @@ class CommonOrganismInfo(OrganismName):
 
     @property
     def taxonomy_id_sres(self):
-        sql_query = f"SELECT ncbi_taxon_ID FROM taxon where TAXON_NAME = '{self.org_name}'"
-        data = self.db_sres.query_one(sql_query)
+        sql_query = "SELECT ncbi_taxon_ID FROM taxon where TAXON_NAME = %s"
+        data = self.db_sres.query_one(sql_query, (self.org_name,))
         if data is not None:
             taxonomy_id = data['ncbi_taxon_ID']
             if taxonomy_id is None:
                 _logger.error(f"input name: {self.org_name}, Error : Organism Name has issue ")
             return taxonomy_id
 
+    @property
+    def genetic_code(self):
+        """
+        Returns the genetic code of the organism's taxon: 64 amino acids in the NCBI TCAG codon order,
+        None when the taxon or its genetic code is missing
+        """
+        taxonomy_id = self.taxonomy_id_sres
+        if taxonomy_id is None:
+            return None
+        sql_query = f"""SELECT gc.code FROM taxon AS t INNER JOIN geneticcode AS gc 
+        ON gc.geneticcode_ID = t.genetic_code_ID WHERE t.ncbi_taxon_ID = {taxonomy_id}"""
+        data = self.db_sres.query_one(sql_query)
+        if data is not None and data['code'] and len(data['code']) == 64:
+            return data['code']
+        _logger.warning(f"Genetic code is not available for taxon {taxonomy_id}, using the standard code")
+        return None
+
     def taxon_entries(self):
         _logger.info(f'Checking similar organism entries with {self.species}')
         sql_query = f"SELECT ncbi_taxon_ID, taxon_name FROM taxon where TAXON_NAME like '{self.species}%'"
@@ -164,10 +185,10 @@ class DotsOrganism(OrganismName):
 
     @property
     def taxonomy_hierarchy_dots(self):
-        sql_query = f"select * from organism where taxon_name = '{self.org_name}' and strain_number = {self.org_version}"
+        sql_query = "select * from organism where taxon_name = %s and strain_number = %s"
         taxonomy_dct = {}
 
-        result = self.db_dots.query_one(sql_query)
+        result = self.db_dots.query_one(sql_query, (self.org_name, self.org_version))
         if result is not None:
             taxonomy_dct = result
         taxonomy_dct = NoneDict(taxonomy_dct)
@@ -179,6 +200,7 @@ class DotsOrganism(OrganismName):
             return taxonomy_dct['taxon_ID']
 
     def remove_organism_record(self):
+        """ deletes the rows of the organism in chunks, an interrupted deletion is resumed by running it again """
         taxonomy_id = self.taxonomy_id_dots()
 
         if taxonomy_id is None:
@@ -186,73 +208,8 @@ class DotsOrganism(OrganismName):
         else:
             _logger.info(f"Deleting the organism records: \n\t\tOrganism name; {self.org_name}, strain_number: {self.org_version}")
 
-            sql_query_1 = f"""
-            DELETE nl FROM nalocation AS nl
-            INNER JOIN nafeatureimp AS nf ON nl.na_feature_ID = nf.na_feature_ID
-            INNER JOIN nasequenceimp AS ns ON nf.na_sequence_ID = ns.na_sequence_ID
-            WHERE ns.taxon_ID = {taxonomy_id}
-            AND ns.strain_number = {self.org_version}
-            AND ns.sequence_type_ID != 1
-            """
-            self.db_dots.insert(sql_query_1)
-
-            sql_query_2 = F"""
-            DELETE p FROM protein AS p
-            INNER JOIN geneinstance AS gi ON p.gene_instance_ID = gi.gene_instance_ID
-            INNER JOIN nafeatureimp AS nf ON gi.na_feature_ID = nf.na_feature_ID
-            INNER JOIN nasequenceimp AS ns ON nf.na_sequence_ID = ns.na_sequence_ID
-            WHERE ns.taxon_ID = {taxonomy_id} 
-            AND ns.strain_number = {self.org_version} 
-            AND ns.sequence_type_ID = 6
-            """
-            self.db_dots.insert(sql_query_2)
-
-            sql_query_3 = F"""
-            DELETE gi FROM geneinstance AS gi
-            INNER JOIN nafeatureimp AS nf ON gi.na_feature_ID = nf.na_feature_ID
-            INNER JOIN nasequenceimp AS ns ON nf.na_sequence_ID = ns.na_sequence_ID
-            WHERE ns.taxon_ID = {taxonomy_id} 
-            AND ns.strain_number = {self.org_version}
-            """
-            self.db_dots.insert(sql_query_3)
-
-            sql_query_4 = f"""
-            DELETE nf FROM nafeatureimp AS nf
-            INNER JOIN nasequenceimp AS ns ON nf.na_sequence_ID = ns.na_sequence_ID
-            WHERE ns.taxon_ID = {taxonomy_id}
-            AND ns.strain_number = {self.org_version}
-            """
-            self.db_dots.insert(sql_query_4)
-
-            sql_query_5 = F"""
-            DELETE ns FROM nasequenceimp AS ns 
-            WHERE ns.taxon_ID = {taxonomy_id} 
-            AND ns.strain_number = {self.org_version} 
-            AND ns.sequence_type_ID != 1
-            """
-            self.db_dots.insert(sql_query_5)
-
-            sql_query_6 = F"""
-            DELETE ns FROM nasequenceimp AS ns 
-            WHERE ns.taxon_ID = {taxonomy_id} 
-            AND ns.strain_number = {self.org_version}
-            """
-            self.db_dots.insert(sql_query_6)
-
-            #Step 5: Delete from organism
-            sql_query_7 = F"""
-            DELETE org FROM organism AS org 
-            WHERE org.taxon_ID = {taxonomy_id} 
-            AND org.strain_number = {self.org_version}
-            """
-            self.db_dots.insert(sql_query_7)
-
-            sql_query_8 = F"""
-            DELETE pi FROM proteininstancefeature AS pi 
-            WHERE pi.taxonomy_id = {taxonomy_id} 
-            AND pi.strain_number = {self.org_version}
-            """
-            self.db_dots.insert(sql_query_8)
+            deletion = OrganismDeletion(self.db_dots, taxonomy_id, self.org_version)
+            return deletion.run()
 
 
 
@@ -348,6 +305,138 @@ class DotsOrganism(OrganismName):
             # """)
 
 
+class OrganismDeletion:
+    """
+    Deletes the rows of an organism in chunks of primary keys. The primary keys of each table are read a page of
+    chunk_rows keys at a time and grouped into ranges of consecutive IDs, every DELETE removes the rows of a range
+    and is committed on its own, so the row locks are short and readers keep working.
+    Child tables are emptied before their parents and the organism row is deleted last, an interrupted
+    deletion leaves no orphans and the organism can be found and removed again.
+    In the partitioned schema the partition of the organism is dropped first, only the rows outside of it
+    are deleted by chunks
+    """
+    # table, primary key, the primary key expression and the FROM ... WHERE clause of the rows of the organism,
+    # children first
+    organism_tables = [
+        ('proteininstancefeature', 'protein_instance_feature_ID', 'pi.protein_instance_feature_ID',
+         """FROM proteininstancefeature AS pi
+         WHERE pi.taxonomy_id = %(taxon_id)s AND pi.strain_number = %(strain_number)s"""),
+        ('protein', 'protein_ID', 'p.protein_ID', """FROM protein AS p
+        INNER JOIN geneinstance AS gi ON p.gene_instance_ID = gi.gene_instance_ID
+        INNER JOIN nafeatureimp AS nf ON gi.na_feature_ID = nf.na_feature_ID
+        INNER JOIN nasequenceimp AS ns ON nf.na_sequence_ID = ns.na_sequence_ID
+        WHERE ns.taxon_ID = %(taxon_id)s AND ns.strain_number = %(strain_number)s"""),
+        ('geneinstance', 'gene_instance_ID', 'gi.gene_instance_ID', """FROM geneinstance AS gi
+        INNER JOIN nafeatureimp AS nf ON gi.na_feature_ID = nf.na_feature_ID
+        INNER JOIN nasequenceimp AS ns ON nf.na_sequence_ID = ns.na_sequence_ID
+        WHERE ns.taxon_ID = %(taxon_id)s AND ns.strain_number = %(strain_number)s"""),
+        ('nalocation', 'na_location_ID', 'nl.na_location_ID', """FROM nalocation AS nl
+        INNER JOIN nafeatureimp AS nf ON nl.na_feature_ID = nf.na_feature_ID
+        INNER JOIN nasequenceimp AS ns ON nf.na_sequence_ID = ns.na_sequence_ID
+        WHERE ns.taxon_ID = %(taxon_id)s AND ns.strain_number = %(strain_number)s"""),
+        # child features first, the partitioned schema has no ON DELETE CASCADE of parent_ID
+        ('nafeatureimp', 'na_feature_ID', 'nf.na_feature_ID', """FROM nafeatureimp AS nf
+        INNER JOIN nasequenceimp AS ns ON nf.na_sequence_ID = ns.na_sequence_ID
+        WHERE ns.taxon_ID = %(taxon_id)s AND ns.strain_number = %(strain_number)s AND nf.parent_ID IS NOT NULL"""),
+        ('nafeatureimp', 'na_feature_ID', 'nf.na_feature_ID', """FROM nafeatureimp AS nf
+        INNER JOIN nasequenceimp AS ns ON nf.na_sequence_ID = ns.na_sequence_ID
+        WHERE ns.taxon_ID = %(taxon_id)s AND ns.strain_number = %(strain_number)s"""),
+        # gene sequences reference their scaffold sequence (sequence type 1)
+        ('nasequenceimp', 'na_sequence_ID', 'ns.na_sequence_ID', """FROM nasequenceimp AS ns
+        WHERE ns.taxon_ID = %(taxon_id)s AND ns.strain_number = %(strain_number)s AND ns.sequence_type_ID != 1"""),
+        ('nasequenceimp', 'na_sequence_ID', 'ns.na_sequence_ID', """FROM nasequenceimp AS ns
+        WHERE ns.taxon_ID = %(taxon_id)s AND ns.strain_number = %(strain_number)s"""),
+        ('organism', 'organism_ID', 'org.organism_ID', """FROM organism AS org
+        WHERE org.taxon_ID = %(taxon_id)s AND org.strain_number = %(strain_number)s"""),
+    ]
+
+    def __init__(self, db_dots, taxonomy_id, strain_number, chunk_rows=DELETE_CHUNK_ROWS):
+        """
+        parameters
+        ----------
+        db_dots: Database
+            connection of the deletion
+        taxonomy_id: int
+            taxon of the organism
+        strain_number: int
+            strain number of the organism
+        chunk_rows: int
+            number of primary keys read at a time, the maximum number of rows of a DELETE
+        """
+        self.db_dots = db_dots
+        self.params = {'taxon_id': taxonomy_id, 'strain_number': strain_number}
+        self.chunk_rows = chunk_rows
+        self.partitions = OrganismPartitions(db_dots, taxonomy_id, strain_number)
+
+    def id_pages(self, id_expression, from_clause):
+        """
+        ranges (first, last) of consecutive primary keys of the organism, a list for each page of chunk_rows keys.
+        A page starts after the last key of the previous one, the rows deleted meanwhile do not move the pages.
+        None is yielded for a page that could not be read
+        """
+        query = f"""SELECT {id_expression} AS id {from_clause} AND {id_expression} > %(after_id)s
+        ORDER BY {id_expression} LIMIT {self.chunk_rows}"""
+        after_id = -1
+        while True:
+            rows = self.db_dots.query(query, dict(self.params, after_id=after_id))
+            if rows is None:
+                yield None
+                return
+            if not rows:
+                return
+            ranges = []
+            for row in rows:
+                value = row['id']
+                if ranges and value == ranges[-1][1] + 1:
+                    ranges[-1][1] = value
+                else:
+                    ranges.append([value, value])
+            yield ranges
+            after_id = rows[-1]['id']
+
+    def delete_table(self, table_name, id_column, id_expression, from_clause):
+        self.partitions.drop(table_name)
+        data = self.db_dots.query_one(f"SELECT COUNT(*) AS row_count {from_clause}", self.params)
+        if data is None:
+            _logger.error(f"{table_name}: the rows of the organism could not be counted")
+            return False
+        row_count = data['row_count']
+        if not row_count:
+            return True
+        _logger.info(f"{table_name}: deleting {row_count:,} rows in chunks of {self.chunk_rows:,}")
+        deleted = 0
+        last_report = time.perf_counter()
+        for ranges in self.id_pages(id_expression, from_clause):
+            if ranges is None:
+                _logger.error(f"{table_name}: the primary keys could not be read, deletion stopped after "
+                              f"{deleted:,} rows, remove the organism again to resume")
+                return False
+            for first_id, last_id in ranges:
+                chunk_rows = self.db_dots.execute(f"DELETE FROM {table_name} WHERE {id_column} BETWEEN %s AND %s",
+                                                  (first_id, last_id))
+                if chunk_rows is None:
+                    _logger.error(f"{table_name}: deletion stopped after {deleted:,} rows, "
+                                  f"remove the organism again to resume")
+                    return False
+                # rows deleted by the statement, rows removed by an ON DELETE CASCADE are not counted
+                deleted += chunk_rows
+            if time.perf_counter() - last_report > 10:
+                _logger.info(f"{table_name}: {deleted:,} of {row_count:,} rows deleted "
+                             f"({min(deleted / row_count, 1):.0%})")
+                last_report = time.perf_counter()
+        _logger.info(f"{table_name}: {deleted:,} of {row_count:,} rows deleted")
+        return True
+
+    def run(self):
+        """ True if all the rows of the organism were deleted """
+        start = time.perf_counter()
+        for table_name, id_column, id_expression, from_clause in self.organism_tables:
+            if not self.delete_table(table_name, id_column, id_expression, from_clause):
+                return False
+        _logger.info(f"Organism records removed in {time.perf_counter() - start:.1f} s")
+        return True
+
+
 class Taxonomy(CommonOrganismInfo, DotsOrganism):
     def __init__(self, db_connection, org_name, strain, assembly_version, org_version=1):
         CommonOrganismInfo.__init__(self, db_connection, org_name, org_version)
@@ -369,10 +458,10 @@ class Taxonomy(CommonOrganismInfo, DotsOrganism):
         family = taxonomy_dct['family']
         super_kingdom = taxonomy_dct['superkingdom']
 
-        query = f'''INSERT INTO organism(taxon_ID, taxon_name, species, strain, assembly_version, phylum, family, genus, orders, class, 
-        superkingdom, strain_number) VALUES ({taxonomy_id}, '{self.org_name}', '{self.species}', '{self.strain}', '{self.assembly_version}', '{phylum}',
-        '{family}', '{genus}', '{order}', '{class_name}', '{super_kingdom}', '{self.org_version}')'''
-        self.db_dots.insert(query)
+        query = '''INSERT INTO organism(taxon_ID, taxon_name, species, strain, assembly_version, phylum, family, genus,
+        orders, class, superkingdom, strain_number) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)'''
+        self.db_dots.execute(query, (taxonomy_id, self.org_name, self.species, self.strain, self.assembly_version, phylum,
+                                     family, genus, order, class_name, super_kingdom, self.org_version))
         _logger.info(" Organism Table update complete")
         return taxonomy_dct
 
@@ -386,8 +475,8 @@ class Taxonomy(CommonOrganismInfo, DotsOrganism):
             _logger.info(f'Organism: {self.org_name} strain number: {self.org_version}')
             taxonomy_id = self.taxonomy_id_sres
             if taxonomy_id:
-                sql_query = f"select * from organism where taxon_ID = {taxonomy_id} and strain_number = {self.org_version}"
-                row_count = self.db_dots.rowcount(sql_query)
+                sql_query = "select * from organism where taxon_ID = %s and strain_number = %s"
+                row_count = self.db_dots.rowcount(sql_query, (taxonomy_id, self.org_version))
                 if row_count == 1:
                     _logger.info("Info: Organism Name and same strain number already exists")
                     return True
@@ -0,0 +1,59 @@
+"""
+Shared fixtures, the synthetic input files are written by the generators of the benchmarks
+"""
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT.joinpath('benchmarks')))
+
+from gff_reader_benchmark import write_synthetic_gff  # noqa: E402
+from genbank_reader_benchmark import write_synthetic_genbank  # noqa: E402
+
+EXAMPLE_DIR = ROOT.joinpath('galEupy', 'data', 'ExampleFiles')
+
+
+@pytest.fixture
+def augustus_gff():
+    return EXAMPLE_DIR.joinpath('product_annotation', 'Augustus.gff')
+
+
+@pytest.fixture
+def synthetic_gff(tmp_path):
+    file_path = tmp_path.joinpath('synthetic.gff3')
+    write_synthetic_gff(file_path, 4000, genes_per_contig=50)
+    return file_path
+
+
+@pytest.fixture
+def interleaved_gff(synthetic_gff, tmp_path):
+    """ the synthetic file with the lines of every contig split in two parts, the second after the next contig """
+    with open(synthetic_gff) as fh:
+        header, *lines = fh.readlines()
+    contigs = {}
+    for line in lines:
+        contigs.setdefault(line.split('\t', 1)[0], []).append(line)
+    parts = []
+    for contig_lines in contigs.values():
+        gene_starts = [idx for idx, line in enumerate(contig_lines) if line.split('\t')[2] == 'gene']
+        middle = gene_starts[len(gene_starts) // 2]
+        parts.append((contig_lines[:middle], contig_lines[middle:]))
+    file_path = tmp_path.joinpath('interleaved.gff3')
+    with open(file_path, 'w') as fh:
+        fh.write(header)
+        for idx, (first, _) in enumerate(parts):
+            fh.writelines(first)
+            if idx:
+                fh.writelines(parts[idx - 1][1])
+        fh.writelines(parts[-1][1])
+    return file_path
+
+
+@pytest.fixture
+def synthetic_genbank(tmp_path):
+    file_path = tmp_path.joinpath('synthetic.gbff')
+    write_synthetic_genbank(file_path, 6, 20, isoforms=2)
+    return file_path
@@ -0,0 +1,64 @@
+import pytest
+
+from galEupy.bulk_writer import BulkRowWriter, escaped_line
+
+LOAD_DATA_ESCAPES = {'t': '\t', 'n': '\n', 'r': '\r', '0': '\0', 'b': '\b', 'Z': '\x1a'}
+
+ROWS = [
+    (1, 'plain', 2.5, None),
+    (2, 'tab\tinside', 'new\nline', 'carriage\rreturn'),
+    (3, '"quoted"', 'back\\slash', 'trailing\\'),
+    (4, '\\t is not a tab', '"', '\\'),
+    (5, 'ACGT' * 500, '', 'mixed\t"\\\n\r'),
+    (6, 'last', 'row', 0),
+]
+
+
+def read_load_data_file(file_path):
+    """ rows of a file as LOAD DATA reads it with FIELDS ESCAPED BY '\\' and LINES TERMINATED BY '\\n' """
+    rows = []
+    fields = []
+    field = []
+    text = file_path.read_bytes().decode()
+    idx = 0
+    while idx < len(text):
+        char = text[idx]
+        if char == '\\':
+            idx += 1
+            field.append(LOAD_DATA_ESCAPES.get(text[idx], text[idx]))
+        elif char == '\t':
+            fields.append(''.join(field))
+            field = []
+        elif char == '\n':
+            fields.append(''.join(field))
+            rows.append(tuple(fields))
+            fields, field = [], []
+        else:
+            field.append(char)
+        idx += 1
+    assert not fields and not field, 'the last line is not terminated'
+    return rows
+
+
+@pytest.mark.parametrize('chunk_rows, chunk_bytes', [(1, None), (3, None), (100, None), (100, 64)])
+def test_escaping_round_trips(tmp_path, chunk_rows, chunk_bytes):
+    file_path = tmp_path.joinpath('table.txt')
+    writer = BulkRowWriter(file_path, chunk_rows=chunk_rows, chunk_bytes=chunk_bytes)
+    writer.write_rows(ROWS)
+    writer.close(fsync=False)
+
+    assert writer.rows == len(ROWS)
+    assert writer.bytes_written == file_path.stat().st_size
+    assert read_load_data_file(file_path) == [tuple(map(str, fields)) for fields in ROWS]
+
+
+def test_clean_rows_are_not_escaped(tmp_path):
+    file_path = tmp_path.joinpath('table.txt')
+    writer = BulkRowWriter(file_path)
+    writer.write_rows([ROWS[0], ROWS[2], ROWS[5]])
+    writer.close(fsync=False)
+
+    lines = file_path.read_text().splitlines(keepends=True)
+    assert lines[0] == '1\tplain\t2.5\tNone\n'
+    assert lines[1] == escaped_line(ROWS[2]) == '3\t\\"quoted\\"\tback\\\\slash\ttrailing\\\\\n'
+    assert lines[2] == '6\tlast\trow\t0\n'
@@ -0,0 +1,23 @@
+import pytest
+
+from galEupy.BioFile.genbank_parser import get_data, get_data_parallel, locus_byte_ranges
+
+
+def to_plain_dict(dct):
+    if isinstance(dct, dict):
+        return {key: to_plain_dict(value) for key, value in dct.items()}
+    return dct
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_get_data_parallel_matches_get_data(synthetic_genbank, workers):
+    chunk_size = synthetic_genbank.stat().st_size // 4
+    assert len(locus_byte_ranges(synthetic_genbank, chunk_size)) > 1
+    with open(synthetic_genbank, 'rb') as fp_in:
+        locus_dct, sequence_dct = get_data(fp_in)
+    assert locus_dct
+
+    parallel_locus_dct, parallel_sequence_dct = get_data_parallel(synthetic_genbank, workers, chunk_size)
+    assert to_plain_dict(parallel_locus_dct) == to_plain_dict(locus_dct)
+    assert parallel_sequence_dct == sequence_dct
+    assert list(parallel_sequence_dct) == list(sequence_dct)
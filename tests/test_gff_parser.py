@@ -0,0 +1,37 @@
+import pickle
+
+import pytest
+
+from galEupy.BioFile.feature_store import FeatureStore
+from galEupy.BioFile.gff_parser import ReadGFF3, StreamGFF3
+
+
+def to_plain_dict(dct):
+    """ nested defaultdicts as plain dicts, without the empty branches the readers create on lookups """
+    if isinstance(dct, dict):
+        plain = {}
+        for key, value in dct.items():
+            value = to_plain_dict(value)
+            if value != {}:
+                plain[key] = value
+        return plain
+    return dct
+
+
+@pytest.mark.parametrize('gff_fixture', ['augustus_gff', 'synthetic_gff', 'interleaved_gff'])
+def test_stream_reader_matches_read_gff3(gff_fixture, request):
+    gff_file = request.getfixturevalue(gff_fixture)
+    expected = to_plain_dict(ReadGFF3(gff_file).reader())
+    assert expected
+    assert to_plain_dict(StreamGFF3(gff_file).reader()) == expected
+
+
+@pytest.mark.parametrize('gff_fixture', ['augustus_gff', 'synthetic_gff', 'interleaved_gff'])
+def test_feature_store_from_contigs_matches_from_dict(gff_fixture, request):
+    gff_file = request.getfixturevalue(gff_fixture)
+    expected = to_plain_dict(FeatureStore.from_dict(ReadGFF3(gff_file).reader()).to_dict())
+    assert expected
+    store = FeatureStore.from_contigs(StreamGFF3(gff_file).contigs)
+    assert to_plain_dict(store.to_dict()) == expected
+    restored = pickle.loads(pickle.dumps(store))
+    assert to_plain_dict(restored.to_dict()) == expected